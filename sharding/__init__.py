@@ -3,6 +3,7 @@ import pkg_resources
 from sharding.contracts.utils.smc_utils import (  # noqa: F401
     get_smc_source_code,
     get_smc_json,
+    get_smc_artifact,
 )
 
 from sharding.handler.log_handler import (  # noqa: F401
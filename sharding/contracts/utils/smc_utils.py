@@ -1,3 +1,4 @@
+import functools
 import json
 import os
 
@@ -6,6 +7,11 @@ from typing import (
     Dict,
 )
 
+from eth_utils import (
+    event_abi_to_log_topic,
+    function_abi_to_4byte_selector,
+)
+
 
 DIR = os.path.dirname(__file__)
 
@@ -16,7 +22,81 @@ def get_smc_source_code() -> str:
     return smc_source_code
 
 
-def get_smc_json() -> Dict[str, Any]:
+@functools.lru_cache(maxsize=None)
+def _load_smc_json() -> Dict[str, Any]:
     file_path = os.path.join(DIR, '../sharding_manager.json')
-    smc_json_str = open(file_path).read()
-    return json.loads(smc_json_str)
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def get_smc_json() -> Dict[str, Any]:
+    """Return the compiled SMC artifact.
+
+    The file is read and parsed only once per process. The returned dict is
+    shared between callers and must not be mutated.
+    """
+    return _load_smc_json()
+
+
+class SMCArtifact:
+    """Indexes over the compiled SMC artifact, built once per process.
+
+    Use `get_smc_artifact` instead of instantiating this directly.
+    """
+
+    def __init__(self, smc_json: Dict[str, Any]) -> None:
+        self.abi = smc_json['abi']
+        self.bytecode = smc_json['bytecode']  # type: str
+
+        self.event_abis = {}  # type: Dict[str, Dict[str, Any]]
+        self.event_topics = {}  # type: Dict[str, bytes]
+        self.event_abis_by_topic = {}  # type: Dict[bytes, Dict[str, Any]]
+        self.function_abis = {}  # type: Dict[str, Dict[str, Any]]
+        self.function_selectors = {}  # type: Dict[str, bytes]
+        self.function_gas = {}  # type: Dict[str, int]
+
+        for entry in self.abi:
+            if entry['type'] == 'event':
+                topic = event_abi_to_log_topic(entry)
+                self.event_abis[entry['name']] = entry
+                self.event_topics[entry['name']] = topic
+                self.event_abis_by_topic[topic] = entry
+            elif entry['type'] == 'function':
+                self.function_abis[entry['name']] = entry
+                self.function_selectors[entry['name']] = function_abi_to_4byte_selector(entry)
+                self.function_gas[entry['name']] = entry['gas']
+
+    def get_event_abi(self, event_name: str) -> Dict[str, Any]:
+        try:
+            return self.event_abis[event_name]
+        except KeyError:
+            raise ValueError("Event with name {} not found".format(event_name))
+
+    def get_event_topic(self, event_name: str) -> bytes:
+        try:
+            return self.event_topics[event_name]
+        except KeyError:
+            raise ValueError("Event with name {} not found".format(event_name))
+
+    def get_event_abi_by_topic(self, topic: bytes) -> Dict[str, Any]:
+        try:
+            return self.event_abis_by_topic[bytes(topic)]
+        except KeyError:
+            raise ValueError("Event with topic {} not found".format(topic))
+
+    def get_function_selector(self, function_name: str) -> bytes:
+        try:
+            return self.function_selectors[function_name]
+        except KeyError:
+            raise ValueError("Function with name {} not found".format(function_name))
+
+    def get_function_gas(self, function_name: str) -> int:
+        try:
+            return self.function_gas[function_name]
+        except KeyError:
+            raise ValueError("Function with name {} not found".format(function_name))
+
+
+@functools.lru_cache(maxsize=None)
+def get_smc_artifact() -> SMCArtifact:
+    return SMCArtifact(get_smc_json())
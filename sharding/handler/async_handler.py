@@ -0,0 +1,138 @@
+import asyncio
+from concurrent.futures import (
+    Executor,
+)
+import functools
+import inspect
+from typing import (
+    Any,
+    Callable,
+    List,
+)
+
+from web3 import Web3
+
+from sharding.handler.log_handler import (
+    LogHandler,
+)
+from sharding.handler.shard_tracker import (
+    ShardTracker,
+)
+from sharding.handler.smc_handler import (
+    SMC,
+    SMCBatch,
+)
+from sharding.handler.utils.web3_utils import (
+    get_endpoint_key,
+)
+
+
+# Default number of requests in flight per endpoint
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class EndpointLimiter:
+    """Limit the number of blocking calls in flight against each endpoint.
+
+    The calls run in `executor`, or in the default executor of the event loop,
+    and at most `max_concurrency` of them per endpoint at the same time. One
+    limiter can be shared by all the async handlers of an event loop, but not
+    across event loops.
+    """
+
+    def __init__(self,
+                 max_concurrency: int=DEFAULT_MAX_CONCURRENCY,
+                 executor: Executor=None) -> None:
+        if max_concurrency <= 0:
+            raise ValueError('max_concurrency should be a positive integer')
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self._semaphores = {}  # type: dict
+
+    def _get_semaphore(self, endpoint_key: str) -> asyncio.Semaphore:
+        # Created on first use, so that it belongs to the running event loop
+        if endpoint_key not in self._semaphores:
+            self._semaphores[endpoint_key] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[endpoint_key]
+
+    async def run(self, w3: Web3, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run `func` in the executor once the endpoint of `w3` has a free slot.
+        """
+        async with self._get_semaphore(get_endpoint_key(w3)):
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor,
+                functools.partial(func, *args, **kwargs),
+            )
+
+
+class BaseAsyncHandler:
+    """Async counterpart of a handler, with the same methods as coroutines.
+
+    Each method call runs the synchronous method in the executor of `limiter`.
+    Non-callable attributes are returned as is. Generator methods, like
+    `ShardTracker.follow_events`, are not available.
+    """
+
+    # Methods returned as is instead of being wrapped in coroutines
+    sync_methods = ()  # type: Any
+
+    def __init__(self, handler: Any, w3: Web3, limiter: EndpointLimiter=None) -> None:
+        self.handler = handler
+        self.w3 = w3
+        if limiter is None:
+            self.limiter = EndpointLimiter()
+        else:
+            self.limiter = limiter
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'handler':
+            # Not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        attr = getattr(self.handler, name)
+        if not callable(attr) or name in self.sync_methods:
+            return attr
+        if inspect.isgeneratorfunction(attr):
+            raise AttributeError(
+                "{} is a generator, use the synchronous {} instead".format(
+                    name,
+                    type(self.handler).__name__,
+                )
+            )
+
+        async def method(*args: Any, **kwargs: Any) -> Any:
+            return await self.limiter.run(self.w3, attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+
+class AsyncSMC(BaseAsyncHandler):
+    """Async counterpart of `SMC`.
+
+    `batch` returns a regular `SMCBatch`, to be sent with `execute_batch`.
+    """
+
+    sync_methods = ('batch',)
+
+    def __init__(self, smc_handler: SMC, limiter: EndpointLimiter=None) -> None:
+        super().__init__(smc_handler, smc_handler.web3, limiter)
+
+    async def execute_batch(self, batch: SMCBatch) -> List[Any]:
+        return await self.limiter.run(self.w3, batch.execute)
+
+
+class AsyncLogHandler(BaseAsyncHandler):
+    """Async counterpart of `LogHandler`.
+    """
+
+    def __init__(self, log_handler: LogHandler, limiter: EndpointLimiter=None) -> None:
+        super().__init__(log_handler, log_handler.w3, limiter)
+
+
+class AsyncShardTracker(BaseAsyncHandler):
+    """Async counterpart of `ShardTracker`.
+    """
+
+    def __init__(self, shard_tracker: ShardTracker, limiter: EndpointLimiter=None) -> None:
+        super().__init__(shard_tracker, shard_tracker.log_handler.w3, limiter)
@@ -0,0 +1,210 @@
+import logging
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+)
+
+from web3 import Web3
+
+from eth_typing import (
+    Hash32,
+)
+
+from sharding.handler.exceptions import (
+    NoCommonAncestorFound,
+)
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.utils.web3_utils import (
+    get_blocks,
+)
+
+
+# Default number of recent blocks kept
+DEFAULT_HISTORY_SIZE = 256
+# Number of blocks fetched by the first step back looking for the common
+# ancestor of a reorg, doubled at each further step
+INITIAL_WALK_BACK_SIZE = 8
+
+
+class ChainTracker:
+    """The hashes of the latest `history_size` blocks of the canonical chain.
+
+    Blocks are kept in ring buffers indexed by `block_number % history_size`,
+    with a hash -> position index, so lookups by number or by hash are O(1).
+    `update` only fetches the headers of the blocks not seen yet, in one batch
+    request, and walks back in batches of growing size only on a reorg, so it
+    costs O(reorg depth).
+    """
+
+    logger = logging.getLogger("sharding.handler.ChainTracker")
+
+    def __init__(self,
+                 w3: Web3,
+                 history_size: int=DEFAULT_HISTORY_SIZE,
+                 head_tracker: HeadTracker=None) -> None:
+        if history_size <= 0:
+            raise ValueError('history_size should be a positive integer')
+        self.w3 = w3
+        self.history_size = history_size
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(w3)
+        else:
+            self.head_tracker = head_tracker
+        self.head_number = None  # type: Optional[int]
+        self.tail_number = None  # type: Optional[int]
+        self._hashes = [None] * history_size  # type: list
+        self._parent_hashes = [None] * history_size  # type: list
+        # block hash -> position in the ring buffers
+        self._positions = {}  # type: Dict[bytes, int]
+
+    def __len__(self) -> int:
+        if self.head_number is None or self.tail_number is None:
+            return 0
+        return self.head_number - self.tail_number + 1
+
+    def __contains__(self, block_hash: Hash32) -> bool:
+        return bytes(block_hash) in self._positions
+
+    @property
+    def head_hash(self) -> Optional[Hash32]:
+        if self.head_number is None:
+            return None
+        return Hash32(self._hashes[self.head_number % self.history_size])
+
+    def _is_kept(self, block_number: int) -> bool:
+        if self.head_number is None or self.tail_number is None:
+            return False
+        return self.tail_number <= block_number <= self.head_number
+
+    def get_hash(self, block_number: int) -> Optional[Hash32]:
+        """Get the hash of the canonical block `block_number`, None if not kept.
+        """
+        if not self._is_kept(block_number):
+            return None
+        return Hash32(self._hashes[block_number % self.history_size])
+
+    def get_parent_hash(self, block_number: int) -> Optional[Hash32]:
+        if not self._is_kept(block_number):
+            return None
+        return Hash32(self._parent_hashes[block_number % self.history_size])
+
+    def get_block_number(self, block_hash: Hash32) -> Optional[int]:
+        """Get the number of the canonical block `block_hash`, None if not kept.
+        """
+        position = self._positions.get(bytes(block_hash))
+        if position is None:
+            return None
+        assert self.head_number is not None
+        # The block at `position` is the one in the last `history_size` blocks
+        return self.head_number - (self.head_number - position) % self.history_size
+
+    def _append(self, block: Dict[str, Any]) -> None:
+        block_number = block['number']
+        position = block_number % self.history_size
+        evicted_hash = self._hashes[position]
+        if evicted_hash is not None:
+            del self._positions[evicted_hash]
+        block_hash = bytes(block['hash'])
+        self._hashes[position] = block_hash
+        self._parent_hashes[position] = bytes(block['parentHash'])
+        self._positions[block_hash] = position
+
+        self.head_number = block_number
+        if self.tail_number is None:
+            self.tail_number = block_number
+        else:
+            self.tail_number = max(self.tail_number, block_number - self.history_size + 1)
+
+    def _extend(self, blocks: Iterable[Dict[str, Any]]) -> Tuple[Hash32, ...]:
+        """Append the blocks, in ascending order, as long as they link to the head.
+        """
+        added_hashes = []
+        for block in blocks:
+            if self.head_number is not None:
+                parent = (self.head_number, self.head_hash)
+                if (block['number'] - 1, bytes(block['parentHash'])) != parent:
+                    # Reorged while being fetched, picked up by the next update
+                    break
+            self._append(block)
+            added_hashes.append(Hash32(bytes(block['hash'])))
+        return tuple(added_hashes)
+
+    def _truncate(self, block_number: int) -> Tuple[Hash32, ...]:
+        """Drop the blocks after `block_number` and return their hashes in ascending order.
+        """
+        assert self.head_number is not None
+        revoked_hashes = []
+        for revoked_block_number in range(block_number + 1, self.head_number + 1):
+            position = revoked_block_number % self.history_size
+            revoked_hash = self._hashes[position]
+            del self._positions[revoked_hash]
+            self._hashes[position] = None
+            self._parent_hashes[position] = None
+            revoked_hashes.append(Hash32(revoked_hash))
+        self.head_number = block_number
+        return tuple(revoked_hashes)
+
+    def update(self) -> Tuple[Tuple[Hash32, ...], Tuple[Hash32, ...]]:
+        """Follow the canonical chain up to the head.
+
+        Returns the hashes of the blocks revoked by a reorg and of the blocks
+        added, both in ascending order. A head lower than the one tracked, on
+        the same chain, revokes nothing.
+        """
+        head_number = self.head_tracker.refresh()
+        if self.head_number is None:
+            start = max(0, head_number - self.history_size + 1)
+            blocks = get_blocks(self.w3, range(start, head_number + 1))
+            return (), self._extend(block for block in blocks if block is not None)
+        assert self.tail_number is not None
+
+        # Fetch from the current head, or the new head if lower, and walk back
+        # until a block matches the one kept, i.e. the common ancestor
+        end = head_number
+        start = min(self.head_number, head_number)
+        walk_back_size = INITIAL_WALK_BACK_SIZE
+        new_blocks = []  # type: list
+        while True:
+            blocks = get_blocks(self.w3, range(start, end + 1))
+            for block in reversed(blocks):
+                if block is None:
+                    # Not served by the node yet, and so the blocks after it
+                    new_blocks = []
+                    continue
+                if self.get_hash(block['number']) == bytes(block['hash']):
+                    common_ancestor_number = block['number']
+                    break
+                new_blocks.append(block)
+            else:
+                if start <= self.tail_number:
+                    raise NoCommonAncestorFound(
+                        "No common ancestor found in the last {} blocks".format(len(self))
+                    )
+                end = start - 1
+                start = max(self.tail_number, start - walk_back_size)
+                walk_back_size *= 2
+                continue
+            break
+
+        if common_ancestor_number == head_number < self.head_number:
+            # Same chain, the node is behind the blocks already seen
+            self.logger.debug(
+                "Node head %d behind the tracked head %d",
+                head_number,
+                self.head_number,
+            )
+            return (), ()
+        revoked_hashes = self._truncate(common_ancestor_number)
+        if revoked_hashes:
+            self.logger.info(
+                "Reorg of %d blocks after block %d",
+                len(revoked_hashes),
+                common_ancestor_number,
+            )
+        added_hashes = self._extend(reversed(new_blocks))
+        return revoked_hashes, added_hashes
@@ -0,0 +1,157 @@
+import collections
+import logging
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+)
+
+from evm.exceptions import BlockNotFound
+
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.notary_registry import (
+    NotaryRegistry,
+)
+from sharding.handler.smc_handler import (
+    SMC,
+)
+from sharding.handler.utils.committee_sampler_utils import (
+    get_committee_index,
+    get_committees,
+    get_entropy_block_number,
+)
+
+
+# Default number of periods whose committees are kept
+DEFAULT_CACHED_PERIODS = 4
+
+
+class CommitteeSampler:
+    """Committees of all shards in a period, sampled locally.
+
+    For each period the entropy block hash and the notary sample size are
+    fetched once, then all `SHARD_COUNT * COMMITTEE_SIZE` assignments are
+    computed locally, matching `get_member_of_committee` of the SMC. The sample
+    size is read from `notary_registry` if given, and from the SMC otherwise.
+
+    Committees are cached per period; a reorg of the entropy block is not
+    detected, call `clear` in that case.
+    """
+
+    logger = logging.getLogger("sharding.handler.CommitteeSampler")
+
+    def __init__(self,
+                 smc_handler: SMC,
+                 notary_registry: NotaryRegistry=None,
+                 head_tracker: HeadTracker=None,
+                 cached_periods: int=DEFAULT_CACHED_PERIODS) -> None:
+        self.smc_handler = smc_handler
+        self.w3 = smc_handler.web3
+        self.config = smc_handler.config
+        self.notary_registry = notary_registry
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(self.w3)
+        else:
+            self.head_tracker = head_tracker
+        self.cached_periods = cached_periods
+        self._committees = collections.OrderedDict()  # type: collections.OrderedDict
+        self._committee_indices = collections.OrderedDict()  # type: collections.OrderedDict
+
+    @property
+    def current_period(self) -> int:
+        return self.head_tracker.block_number // self.config['PERIOD_LENGTH']
+
+    def clear(self) -> None:
+        self._committees.clear()
+        self._committee_indices.clear()
+
+    def _get_notary_sample_size(self, period: int) -> int:
+        if self.notary_registry is not None:
+            return self.notary_registry.get_notary_sample_size(period)
+
+        # Same as in `get_member_of_committee`
+        updated_period = self.smc_handler.notary_sample_size_updated_period()
+        if updated_period < period:
+            return self.smc_handler.next_period_notary_sample_size()
+        elif updated_period == period:
+            return self.smc_handler.current_period_notary_sample_size()
+        else:
+            raise ValueError(
+                "Sample size of period {} is overwritten in period {}".format(
+                    period,
+                    updated_period,
+                )
+            )
+
+    def get_committees(self, period: int=None) -> Tuple[Tuple[int, ...], ...]:
+        """Get the notary pool indices sampled in `period`, indexed by shard id then
+        committee index. `period` defaults to the current period.
+        """
+        if period is None:
+            period = self.current_period
+        if period in self._committees:
+            return self._committees[period]
+
+        entropy_block_number = get_entropy_block_number(period, self.config['PERIOD_LENGTH'])
+        entropy_block = self.w3.eth.getBlock(entropy_block_number)
+        if entropy_block is None:
+            raise BlockNotFound(
+                "Entropy block {} of period {} is not mined yet".format(
+                    entropy_block_number,
+                    period,
+                )
+            )
+        committees = get_committees(
+            entropy_block['hash'],
+            self._get_notary_sample_size(period),
+            self.config['SHARD_COUNT'],
+            self.config['COMMITTEE_SIZE'],
+        )
+
+        self._committees[period] = committees
+        while len(self._committees) > self.cached_periods:
+            self._committees.popitem(last=False)
+        return committees
+
+    def get_committee(self, shard_id: int, period: int=None) -> Tuple[int, ...]:
+        return self.get_committees(period)[shard_id]
+
+    def get_member_of_committee(self, shard_id: int, index: int, period: int=None) -> int:
+        """Get the notary pool index of the committee member, same as the SMC getter.
+        """
+        return self.get_committees(period)[shard_id][index]
+
+    def get_committee_index(self, period: int=None) -> Dict[int, List[Tuple[int, int]]]:
+        """Get the `(shard_id, index)` assignments of every pool index sampled in `period`.
+
+        The index is built once per period from the committees.
+        """
+        if period is None:
+            period = self.current_period
+        if period in self._committee_indices:
+            return self._committee_indices[period]
+
+        committee_index = get_committee_index(self.get_committees(period))
+        self._committee_indices[period] = committee_index
+        while len(self._committee_indices) > self.cached_periods:
+            self._committee_indices.popitem(last=False)
+        return committee_index
+
+    def get_assignments(self, pool_index: int, period: int=None) -> List[Tuple[int, int]]:
+        """Get the `(shard_id, index)` committee seats of the notary at `pool_index`.
+        """
+        return self.get_committee_index(period).get(pool_index, [])
+
+    def get_assignments_of_notaries(self,
+                                    pool_indices: Iterable[int],
+                                    period: int=None) -> Dict[int, List[Tuple[int, int]]]:
+        """Get the committee seats of each of the notaries at `pool_indices`.
+        """
+        committee_index = self.get_committee_index(period)
+        return {
+            pool_index: committee_index.get(pool_index, [])
+            for pool_index in pool_indices
+        }
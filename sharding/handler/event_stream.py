@@ -0,0 +1,169 @@
+import collections
+import logging
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+)
+
+from web3 import Web3
+
+from eth_utils import (
+    encode_hex,
+)
+from eth_typing import (
+    Address,
+)
+
+from sharding.contracts.utils.config import (
+    get_sharding_config,
+)
+from sharding.handler.chain_tracker import (
+    ChainTracker,
+)
+from sharding.handler.log_handler import (
+    LogHandler,
+)
+from sharding.handler.utils.log_parser import (
+    decode_log,
+)
+from sharding.handler.utils.shard_tracker_utils import (
+    NOTARY_EVENT_NAMES,
+    SHARD_EVENT_NAMES,
+    get_event_signature_from_abi,
+)
+
+
+# Decoded SMC event with the position of its log in the chain
+StreamEvent = collections.namedtuple(
+    'StreamEvent',
+    (
+        'block_number',
+        'block_hash',
+        'transaction_index',
+        'log_index',
+        'event',
+    ),
+)
+
+# Events removed from and added to the canonical chain by one update. Removed
+# events are in reverse chain order, i.e. in the order to undo them, and added
+# events in chain order.
+EventBatch = collections.namedtuple('EventBatch', ('removed', 'added'))
+
+
+class SMCEventStream:
+    """SMC events of the canonical chain, following reorgs.
+
+    Each `update` follows the canonical chain with a `ChainTracker` and only
+    fetches the logs of the blocks it added. The events of the blocks revoked
+    by a reorg are emitted as removed, from the events emitted before, without
+    fetching them again, so consumers can undo them instead of rebuilding
+    their state from scratch.
+
+    Events are emitted from `from_block` on, or from the blocks mined after the
+    first update. Only reorgs within the history of the chain tracker are
+    followed.
+
+    NOTE: logs are fetched by block range, so the logs of a block reorged again
+    between `ChainTracker.update` and `eth_getLogs` are skipped. The block is
+    then revoked by the next update and its replacement fetched, unless the
+    chain switches back to it.
+    """
+
+    logger = logging.getLogger("sharding.handler.SMCEventStream")
+
+    def __init__(self,
+                 w3: Web3,
+                 config: Optional[Dict[str, Any]],
+                 smc_handler_address: Address,
+                 event_names: Iterable[str]=NOTARY_EVENT_NAMES + SHARD_EVENT_NAMES,
+                 from_block: int=None,
+                 chain_tracker: ChainTracker=None) -> None:
+        if config is None:
+            self.config = get_sharding_config()
+        else:
+            self.config = config
+        if chain_tracker is None:
+            self.chain_tracker = ChainTracker(w3)
+        else:
+            self.chain_tracker = chain_tracker
+        self.log_handler = LogHandler(
+            w3,
+            self.config['PERIOD_LENGTH'],
+            head_tracker=self.chain_tracker.head_tracker,
+        )
+        self.smc_handler_address = smc_handler_address
+        self.event_names = tuple(event_names)
+        # The first block whose events are not emitted yet
+        self.next_block = from_block
+        # block hash -> events emitted, for the blocks kept by the chain tracker
+        self._block_events = collections.OrderedDict()  # type: collections.OrderedDict
+
+    def _get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        return self.log_handler.get_logs_in_chunks(
+            address=self.smc_handler_address,
+            topics=[[
+                encode_hex(get_event_signature_from_abi(event_name))
+                for event_name in self.event_names
+            ]],
+            from_block=from_block,
+            to_block=to_block,
+        )
+
+    def update(self) -> EventBatch:
+        """Follow the canonical chain up to the head and get the events removed
+        and added since the last update.
+        """
+        revoked_hashes, added_hashes = self.chain_tracker.update()
+
+        removed_events = []  # type: List[StreamEvent]
+        for block_hash in reversed(revoked_hashes):
+            removed_events.extend(reversed(self._block_events.pop(bytes(block_hash), ())))
+        if removed_events:
+            self.logger.info(
+                "Removed %d events of %d revoked blocks",
+                len(removed_events),
+                len(revoked_hashes),
+            )
+
+        head_number = self.chain_tracker.head_number
+        # The chain tracker keeps at least the head once updated
+        assert head_number is not None
+        if self.next_block is None:
+            self.next_block = head_number + 1
+        elif revoked_hashes:
+            # The blocks after the common ancestor are fetched again
+            self.next_block = min(self.next_block, head_number - len(added_hashes) + 1)
+
+        added_events = []
+        if self.next_block <= head_number:
+            for log in self._get_logs(self.next_block, head_number):
+                block_hash = bytes(log['blockHash'])
+                if log['blockNumber'] >= self.chain_tracker.tail_number:
+                    if self.chain_tracker.get_hash(log['blockNumber']) != block_hash:
+                        # Log of a block already replaced by a reorg
+                        continue
+                    block_events = self._block_events.setdefault(block_hash, [])
+                else:
+                    block_events = []
+                stream_event = StreamEvent(
+                    log['blockNumber'],
+                    block_hash,
+                    log['transactionIndex'],
+                    log['logIndex'],
+                    decode_log(log),
+                )
+                block_events.append(stream_event)
+                added_events.append(stream_event)
+            self.next_block = head_number + 1
+
+        # Events of blocks out of the history can not be removed anymore
+        for block_hash in list(self._block_events):
+            if block_hash in self.chain_tracker:
+                break
+            del self._block_events[block_hash]
+
+        return EventBatch(tuple(removed_events), tuple(added_events))
@@ -1,2 +1,6 @@
 class LogParsingError(Exception):
     pass
+
+
+class NoCommonAncestorFound(Exception):
+    pass
@@ -0,0 +1,119 @@
+import collections
+import json
+import logging
+import os
+import threading
+from typing import (
+    Dict,
+)
+
+from sharding.handler.utils.gas_calibrator_utils import (
+    DEFAULT_CODE_PATH,
+)
+
+
+# Default factor applied to the highest recorded gas needed
+DEFAULT_GAS_MARGIN = 1.25
+# Default number of gas needed samples kept per function and code path
+DEFAULT_MAX_SAMPLES = 64
+
+
+class GasCalibrator:
+    """Gas limits of the SMC functions calibrated from the gas needed by mined
+    transactions.
+
+    The gas needed is what the execution takes before the refunds, i.e. the
+    lowest gas limit the transaction succeeds with, e.g. as `eth_estimateGas`
+    finds it, and not the gasUsed of the receipt.
+
+    The gas needed by the latest `max_samples` transactions is kept per function
+    and per code path, and the gas limit is the highest of them times `margin`,
+    capped by the static estimate. Without samples the static estimate, i.e.
+    `static_gas[function_name]`, is used.
+
+    If `path` is given, the samples are loaded from and saved to that file, so
+    that the calibration is kept across restarts.
+
+    The calibrator can be shared by threads sending and recording transactions.
+    """
+
+    logger = logging.getLogger("sharding.handler.GasCalibrator")
+
+    def __init__(self,
+                 static_gas: Dict[str, int],
+                 margin: float=DEFAULT_GAS_MARGIN,
+                 max_samples: int=DEFAULT_MAX_SAMPLES,
+                 path: str=None) -> None:
+        if margin < 1:
+            raise ValueError('margin should be at least 1')
+        if max_samples <= 0:
+            raise ValueError('max_samples should be a positive integer')
+        self.static_gas = static_gas
+        self.margin = margin
+        self.max_samples = max_samples
+        self.path = path
+        # (function_name, code_path) -> deque of gas needed
+        self._samples = {}  # type: dict
+        self._lock = threading.Lock()
+        # Held while saving, so that concurrent saves do not write the file at once
+        self._save_lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                saved_samples = json.load(f)['samples']
+            with self._lock:
+                for (key, samples) in saved_samples.items():
+                    function_name, code_path = key.split(':')
+                    self._get_samples(function_name, code_path).extend(samples)
+
+    def _get_samples(self, function_name: str, code_path: str) -> collections.deque:
+        # Must be called with the lock held
+        key = (function_name, code_path)
+        if key not in self._samples:
+            self._samples[key] = collections.deque(maxlen=self.max_samples)
+        return self._samples[key]
+
+    def needs_samples(self, function_name: str, code_path: str=DEFAULT_CODE_PATH) -> bool:
+        """Tell if fewer than `max_samples` samples are recorded yet.
+        """
+        with self._lock:
+            return len(self._samples.get((function_name, code_path), ())) < self.max_samples
+
+    def has_samples(self, function_name: str, code_path: str=DEFAULT_CODE_PATH) -> bool:
+        with self._lock:
+            return bool(self._samples.get((function_name, code_path)))
+
+    def get_gas(self, function_name: str, code_path: str=DEFAULT_CODE_PATH) -> int:
+        """Get the gas limit of a `function_name` transaction taking `code_path`.
+        """
+        static_gas = self.static_gas[function_name]
+        with self._lock:
+            samples = self._samples.get((function_name, code_path))
+            if not samples:
+                return static_gas
+            max_gas_needed = max(samples)
+        return min(int(max_gas_needed * self.margin), static_gas)
+
+    def record(self, function_name: str, code_path: str, gas_needed: int) -> None:
+        """Record the gas needed by a mined `function_name` transaction taking `code_path`.
+        """
+        with self._lock:
+            self._get_samples(function_name, code_path).append(gas_needed)
+        self.logger.debug("Recorded gas needed %d of %s (%s)", gas_needed, function_name, code_path)
+        if self.path is not None:
+            self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            raise ValueError('No path to save the calibration to')
+        tmp_path = self.path + '.tmp'
+        with self._save_lock:
+            # Snapshot under the save lock too, so that a later snapshot is never
+            # overwritten by an earlier one
+            with self._lock:
+                samples = {
+                    '{}:{}'.format(function_name, code_path): list(function_samples)
+                    for ((function_name, code_path), function_samples) in self._samples.items()
+                }
+            with open(tmp_path, 'w') as f:
+                json.dump({'samples': samples}, f)
+            os.replace(tmp_path, self.path)
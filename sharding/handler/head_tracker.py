@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from typing import (  # noqa: F401
+    Optional,
+)
+
+from web3 import Web3
+
+
+class HeadTracker:
+    """Cached head block number, shared by the handlers of one node.
+
+    `block_number` asks the node again only if the cached value is older than
+    `max_staleness` seconds, so the default of 0 always asks the node. The
+    cache can also be kept fresh by a background poll (`start`) or by any loop
+    that learns new block numbers (`update`, or `observe` for a block known to
+    be mined but maybe not the head). Callers that just got the head from the
+    node should pass it on instead of asking again.
+    """
+
+    logger = logging.getLogger("sharding.handler.HeadTracker")
+
+    def __init__(self, w3: Web3, max_staleness: float=0) -> None:
+        self.w3 = w3
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._block_number = None  # type: Optional[int]
+        self._updated_at = None  # type: Optional[float]
+        self._poll_thread = None  # type: Optional[threading.Thread]
+        self._stop_event = threading.Event()
+
+    @property
+    def block_number(self) -> int:
+        with self._lock:
+            block_number = self._block_number
+            updated_at = self._updated_at
+        if block_number is not None and updated_at is not None:
+            if time.monotonic() - updated_at <= self.max_staleness:
+                return block_number
+        return self.refresh()
+
+    def refresh(self) -> int:
+        """Ask the node for the head block number and cache it.
+        """
+        block_number = self.w3.eth.blockNumber
+        self.update(block_number)
+        return block_number
+
+    @property
+    def cached_block_number(self) -> Optional[int]:
+        """The head block number last seen, without asking the node.
+        """
+        with self._lock:
+            return self._block_number
+
+    def update(self, block_number: int) -> None:
+        with self._lock:
+            self._block_number = block_number
+            self._updated_at = time.monotonic()
+
+    def observe(self, block_number: int) -> None:
+        """Cache `block_number` if it is above the cached head, e.g. the block
+        of a new log.
+        """
+        with self._lock:
+            if self._block_number is None or block_number > self._block_number:
+                self._block_number = block_number
+                self._updated_at = time.monotonic()
+
+    def start(self, poll_interval: float) -> None:
+        """Refresh the head block number every `poll_interval` seconds in the background.
+        """
+        if self._poll_thread is not None:
+            raise ValueError("HeadTracker is already polling")
+        self._stop_event.clear()
+        self._poll_thread = threading.Thread(
+            target=self._poll,
+            args=(poll_interval,),
+            name="HeadTracker",
+            daemon=True,
+        )
+        self._poll_thread.start()
+
+    def stop(self) -> None:
+        if self._poll_thread is None:
+            return
+        self._stop_event.set()
+        self._poll_thread.join()
+        self._poll_thread = None
+
+    def _poll(self, poll_interval: float) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.warning("Failed to get head block number: %s", e)
+            self._stop_event.wait(poll_interval)
@@ -0,0 +1,223 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from eth_typing import (
+    Address,
+    Hash32,
+)
+from eth_utils import (
+    decode_hex,
+    encode_hex,
+    to_checksum_address,
+)
+from hexbytes import (
+    HexBytes,
+)
+try:
+    from web3.datastructures import (
+        AttributeDict,
+    )
+except ImportError:
+    # Older web3 versions keep the datastructures in web3.utils
+    from web3.utils.datastructures import (  # type: ignore
+        AttributeDict,
+    )
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {'__bytes__': encode_hex(value)}
+    elif isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    elif isinstance(value, dict):
+        return {key: _encode_value(item) for (key, item) in value.items()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if '__bytes__' in value:
+            return HexBytes(decode_hex(value['__bytes__']))
+        return AttributeDict({key: _decode_value(item) for (key, item) in value.items()})
+    elif isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+def _normalize_topic(topic: Union[bytes, str, None]) -> Optional[str]:
+    if topic is None:
+        return None
+    elif isinstance(topic, bytes):
+        return encode_hex(topic)
+    return topic.lower()
+
+
+def get_filter_key(address: Optional[Address],
+                   topics: Optional[List[Union[str, List[str], None]]]) -> str:
+    """Get the key identifying the logs matched by the given address and topics.
+    """
+    if address is not None:
+        address = to_checksum_address(address)
+    normalized_topics = []  # type: List[Any]
+    for topic in topics or []:
+        if isinstance(topic, (list, tuple)):
+            normalized_topics.append([_normalize_topic(item) for item in topic])
+        else:
+            normalized_topics.append(_normalize_topic(topic))
+    return json.dumps([address, normalized_topics])
+
+
+class LogCache:
+    """Local store of logs, keyed by filter and block range, backed by SQLite.
+
+    Each fetched block range is recorded as a span together with the hash of
+    its last block. Since a block hash commits to all of its ancestors, a span
+    whose last block is still canonical can be served locally; spans whose
+    last block hash changed are dropped by `invalidate`.
+    """
+
+    logger = logging.getLogger("sharding.handler.LogCache")
+
+    def __init__(self, path: str=':memory:') -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS spans ("
+                "filter_key TEXT NOT NULL, "
+                "from_block INTEGER NOT NULL, "
+                "to_block INTEGER NOT NULL, "
+                "to_block_hash BLOB NOT NULL, "
+                "PRIMARY KEY (filter_key, from_block))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS logs ("
+                "filter_key TEXT NOT NULL, "
+                "block_number INTEGER NOT NULL, "
+                "transaction_index INTEGER NOT NULL, "
+                "log_index INTEGER NOT NULL, "
+                "log TEXT NOT NULL, "
+                "PRIMARY KEY (filter_key, block_number, transaction_index, log_index))"
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get_latest_span(self, filter_key: str) -> Optional[Tuple[int, int, Hash32]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT from_block, to_block, to_block_hash FROM spans "
+                "WHERE filter_key = ? ORDER BY to_block DESC LIMIT 1",
+                (filter_key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return (row[0], row[1], Hash32(bytes(row[2])))
+
+    def get_uncovered_ranges(self,
+                             filter_key: str,
+                             from_block: int,
+                             to_block: int) -> List[Tuple[int, int]]:
+        """Get the block ranges within `from_block..to_block` not covered by any span.
+        """
+        with self._lock:
+            spans = self._db.execute(
+                "SELECT from_block, to_block FROM spans "
+                "WHERE filter_key = ? AND to_block >= ? AND from_block <= ? "
+                "ORDER BY from_block",
+                (filter_key, from_block, to_block),
+            ).fetchall()
+
+        uncovered = []
+        next_block = from_block
+        for (span_from, span_to) in spans:
+            if span_from > next_block:
+                uncovered.append((next_block, span_from - 1))
+            next_block = max(next_block, span_to + 1)
+        if next_block <= to_block:
+            uncovered.append((next_block, to_block))
+        return uncovered
+
+    def get_logs(self, filter_key: str, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT log FROM logs "
+                "WHERE filter_key = ? AND block_number >= ? AND block_number <= ? "
+                "ORDER BY block_number, transaction_index, log_index",
+                (filter_key, from_block, to_block),
+            ).fetchall()
+        return [_decode_value(json.loads(row[0])) for row in rows]
+
+    def add_span(self,
+                 filter_key: str,
+                 from_block: int,
+                 to_block: int,
+                 to_block_hash: Hash32,
+                 logs: List[Dict[str, Any]]) -> None:
+        """Record the logs of a block range fetched from the node.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?)",
+                (filter_key, from_block, to_block, bytes(to_block_hash)),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        filter_key,
+                        log['blockNumber'],
+                        log['transactionIndex'],
+                        log['logIndex'],
+                        json.dumps(_encode_value(dict(log))),
+                    )
+                    for log in logs
+                ],
+            )
+
+    def remove_span(self, filter_key: str, from_block: int, to_block: int) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM spans WHERE filter_key = ? AND from_block = ?",
+                (filter_key, from_block),
+            )
+            self._db.execute(
+                "DELETE FROM logs "
+                "WHERE filter_key = ? AND block_number >= ? AND block_number <= ?",
+                (filter_key, from_block, to_block),
+            )
+
+    def invalidate(self,
+                   filter_key: str,
+                   get_block_hash: Callable[[int], Optional[Hash32]]) -> None:
+        """Drop the spans of the filter whose last block is no longer canonical.
+
+        `get_block_hash` maps a block number to the current canonical hash, or
+        `None` if the block does not exist anymore. Spans are checked from the
+        latest one down and checking stops at the first span still canonical.
+        """
+        while True:
+            span = self.get_latest_span(filter_key)
+            if span is None:
+                return
+            from_block, to_block, to_block_hash = span
+            if get_block_hash(to_block) == to_block_hash:
+                return
+            self.logger.debug(
+                "Block %d is no longer canonical, dropping cached logs of blocks %d-%d",
+                to_block,
+                from_block,
+                to_block,
+            )
+            self.remove_span(filter_key, from_block, to_block)
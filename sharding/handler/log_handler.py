@@ -1,8 +1,19 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+import json
 import logging
+import os
+import time
 from typing import (
     Any,
     Dict,
+    Generator,
     List,
+    Optional,
+    Tuple,
     Union,
 )
 
@@ -12,45 +23,341 @@ from web3 import Web3
 
 from eth_typing import (
     Address,
+    Hash32,
+)
+
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.log_cache import (
+    LogCache,
+    get_filter_key,
 )
+from sharding.handler.utils.log_handler_utils import (
+    get_chunk_end,
+    is_too_large_range_error,
+    match_topics,
+    sort_logs,
+    split_block_range,
+    widen_topic_or_lists,
+)
+from sharding.handler.utils.web3_utils import (
+    get_logs,
+)
+
+
+# Default number of periods fetched by one `eth_getLogs` in chunked mode
+DEFAULT_PERIODS_PER_CHUNK = 100
+# Default number of `eth_getLogs` requests in flight in chunked mode
+DEFAULT_MAX_WORKERS = 4
+# Default number of seconds to wait for new blocks in follow mode
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class LogCursor:
+    """The block from which `LogHandler.follow` fetches the next logs.
+
+    If `path` is given, the cursor is loaded from and saved to that file, so
+    that following can resume where it stopped after a restart.
+    """
+
+    def __init__(self, next_block: int=None, path: str=None) -> None:
+        self.path = path
+        self.next_block = next_block
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.next_block = json.load(f)['next_block']
+
+    def advance(self, next_block: int) -> None:
+        self.next_block = next_block
+        if self.path is not None:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'next_block': next_block}, f)
+            os.replace(tmp_path, self.path)
 
 
 class LogHandler:
 
     logger = logging.getLogger("sharding.handler.LogHandler")
 
-    def __init__(self, w3: Web3, period_length: int) -> None:
+    def __init__(self,
+                 w3: Web3,
+                 period_length: int,
+                 log_cache: LogCache=None,
+                 head_tracker: HeadTracker=None) -> None:
         self.w3 = w3
         self.period_length = period_length
+        self.log_cache = log_cache
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(w3)
+        else:
+            self.head_tracker = head_tracker
+
+    def _decide_block_range(self,
+                            from_block: Union[int, str, None],
+                            to_block: Union[int, str, None]
+                            ) -> Tuple[int, Optional[int], int]:
+        """Resolve the block range of a query against the head block.
+
+        Returns the first block, the last block, or None for the latest block,
+        and the head block number.
+        """
+        if isinstance(from_block, str) or isinstance(to_block, str):
+            raise ValueError("Block tags are not supported, expect block numbers")
+        cached_block_number = self.head_tracker.cached_block_number
+        if from_block is not None and to_block is not None and cached_block_number is not None:
+            if max(from_block, to_block) <= cached_block_number:
+                # The range is below a head already seen, e.g. passed on by
+                # the caller, no need to ask the node again
+                return from_block, to_block, cached_block_number
+        current_block_number = self.head_tracker.block_number
+        if from_block is None:
+            # Search from the start of current period if from_block is not given
+            from_block = current_block_number - current_block_number % self.period_length
+        elif from_block > current_block_number:
+            # The cached head may be behind, ask the node before giving up
+            current_block_number = self.head_tracker.refresh()
+        if from_block > current_block_number:
+            raise BlockNotFound(
+                "Try to search from block number {} while current block number is {}".format(
+                    from_block,
+                    current_block_number
+                )
+            )
+
+        if to_block is not None:
+            to_block = min(current_block_number, to_block)
+
+        return from_block, to_block, current_block_number
 
     def get_logs(self,
                  address: Address=None,
-                 topics: List[Union[str, None]]=None,
+                 topics: List[Union[str, List[str], None]]=None,
                  from_block: Union[int, str]=None,
                  to_block: Union[int, str]=None) -> List[Dict[str, Any]]:
+        from_block, to_block, current_block_number = self._decide_block_range(
+            from_block,
+            to_block,
+        )
+        if self.log_cache is not None:
+            if to_block is None:
+                to_block = current_block_number
+            return self._get_logs_with_cache(self.log_cache, address, topics, from_block, to_block)
+
         filter_params = {
             'address': address,
             'topics': topics,
+            'fromBlock': from_block,
+            'toBlock': 'latest' if to_block is None else to_block,
         }  # type: Dict[str, Any]
 
-        current_block_number = self.w3.eth.blockNumber
-        if from_block is None:
-            # Search from the start of current period if from_block is not given
-            filter_params['fromBlock'] = current_block_number - \
-                current_block_number % self.period_length
-        else:
-            if from_block > current_block_number:
-                raise BlockNotFound(
-                    "Try to search from block number {} while current block number is {}".format(
-                        from_block,
-                        current_block_number
-                    )
-                )
-            filter_params['fromBlock'] = from_block
+        return get_logs(self.w3, filter_params)
+
+    def _get_block_hash(self, block_number: int) -> Optional[Hash32]:
+        block = self.w3.eth.getBlock(block_number)
+        if block is None:
+            return None
+        return block['hash']
+
+    def _get_logs_with_cache(self,
+                             log_cache: LogCache,
+                             address: Optional[Address],
+                             topics: Optional[List[Union[str, List[str], None]]],
+                             from_block: int,
+                             to_block: int) -> List[Dict[str, Any]]:
+        """Serve the logs from the local cache, fetching only the block ranges it lacks.
+        """
+        filter_key = get_filter_key(address, topics)
+        log_cache.invalidate(filter_key, self._get_block_hash)
+        for (start, end) in log_cache.get_uncovered_ranges(filter_key, from_block, to_block):
+            # Get the hash before the logs: if a reorg happens in between, the
+            # span fails the next validation instead of being trusted.
+            end_block_hash = self._get_block_hash(end)
+            if end_block_hash is None:
+                raise BlockNotFound("Block {} not found".format(end))
+            logs = get_logs(self.w3, {
+                'address': address,
+                'topics': topics,
+                'fromBlock': start,
+                'toBlock': end,
+            })
+            log_cache.add_span(filter_key, start, end, end_block_hash, logs)
+        return log_cache.get_logs(filter_key, from_block, to_block)
+
+    def get_logs_in_chunks(self,
+                           address: Address=None,
+                           topics: List[Union[str, List[str], None]]=None,
+                           from_block: Union[int, str]=None,
+                           to_block: Union[int, str]=None,
+                           periods_per_chunk: int=DEFAULT_PERIODS_PER_CHUNK,
+                           max_workers: int=DEFAULT_MAX_WORKERS) -> List[Dict[str, Any]]:
+        """Same as `get_logs`, but the block range is fetched in chunks concurrently.
 
+        Chunks start at `periods_per_chunk` periods and end on period boundaries.
+        When the node rejects a chunk as too large, the chunk is split in two and
+        the chunk size is halved; every successful chunk doubles it again, up to
+        `periods_per_chunk`. The merged result is in chain order.
+        """
+        if periods_per_chunk <= 0:
+            raise ValueError('periods_per_chunk should be a positive integer')
+        if max_workers <= 0:
+            raise ValueError('max_workers should be a positive integer')
+
+        from_block, to_block, current_block_number = self._decide_block_range(
+            from_block,
+            to_block,
+        )
         if to_block is None:
-            filter_params['toBlock'] = 'latest'
-        else:
-            filter_params['toBlock'] = min(current_block_number, to_block)
+            to_block = current_block_number
+        filter_params = {
+            'address': address,
+            'topics': topics,
+        }  # type: Dict[str, Any]
+
+        logs = []  # type: List[Dict[str, Any]]
+        window = periods_per_chunk
+        next_block = from_block
+        retry_ranges = []  # type: List[Tuple[int, int]]
+        pending = {}  # type: Dict[Any, Tuple[int, int]]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or retry_ranges or next_block <= to_block:
+                while len(pending) < max_workers and (retry_ranges or next_block <= to_block):
+                    if retry_ranges:
+                        chunk = retry_ranges.pop()
+                    else:
+                        chunk = (
+                            next_block,
+                            get_chunk_end(next_block, to_block, self.period_length, window),
+                        )
+                        next_block = chunk[1] + 1
+                    future = executor.submit(
+                        get_logs,
+                        self.w3,
+                        dict(filter_params, fromBlock=chunk[0], toBlock=chunk[1]),
+                    )
+                    pending[future] = chunk
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    try:
+                        logs.extend(future.result())
+                    except Exception as e:
+                        if start == end or not is_too_large_range_error(e):
+                            raise
+                        window = max(1, window // 2)
+                        self.logger.debug(
+                            "Block range %d-%d rejected, retrying in smaller chunks: %s",
+                            start,
+                            end,
+                            e,
+                        )
+                        retry_ranges.extend(split_block_range(start, end, self.period_length))
+                    else:
+                        window = min(periods_per_chunk, window * 2)
+
+        return sort_logs(logs)
+
+    def follow(self,
+               address: Address=None,
+               topics: List[Union[str, List[str], None]]=None,
+               from_block: int=None,
+               cursor: LogCursor=None,
+               poll_interval: float=DEFAULT_POLL_INTERVAL,
+               use_filter: bool=True) -> Generator[Dict[str, Any], None, None]:
+        """Yield the logs of new blocks as they arrive, forever.
+
+        Only blocks from the cursor on are fetched. The cursor starts from
+        `from_block`, or from the start of the current period, unless it already
+        holds a position. It is advanced once all logs of a batch are yielded,
+        so a consumer resuming from a persisted cursor sees every log at least once.
+
+        New logs are read with filter changes if the node supports filters, and
+        by polling the block range since the cursor otherwise.
+        """
+        if cursor is None:
+            cursor = LogCursor()
+        if cursor.next_block is None:
+            if from_block is None:
+                current_block_number = self.head_tracker.block_number
+                from_block = current_block_number - current_block_number % self.period_length
+            cursor.advance(from_block)
+        assert cursor.next_block is not None
+
+        filter_params = {
+            'address': address,
+            'topics': topics,
+        }  # type: Dict[str, Any]
+        # OR-lists of topics are widened in the installed filter and the logs
+        # matched locally, as not every node supports them
+        filter_topics = None if topics is None else widen_topic_or_lists(topics)
+        log_filter = None
+        try:
+            while True:
+                # Catch up by range. Once a filter is installed, this also
+                # covers the blocks mined while it was being installed.
+                current_block_number = self.head_tracker.refresh()
+                if cursor.next_block <= current_block_number:
+                    logs = get_logs(self.w3, dict(
+                        filter_params,
+                        fromBlock=cursor.next_block,
+                        toBlock=current_block_number,
+                    ))
+                    yield from sort_logs(logs)
+                    cursor.advance(current_block_number + 1)
+
+                if use_filter and log_filter is None:
+                    try:
+                        log_filter = self.w3.eth.filter(dict(
+                            filter_params,
+                            topics=filter_topics,
+                            fromBlock=cursor.next_block,
+                        ))
+                    except ValueError as e:
+                        self.logger.debug("Filters are not supported, polling by range: %s", e)
+                        use_filter = False
+                    else:
+                        continue
+
+                if log_filter is None:
+                    time.sleep(poll_interval)
+                    continue
+
+                yield from self._follow_filter(log_filter, topics, cursor, poll_interval)
+                # The node dropped the filter, catch up by range and install a new one
+                log_filter = None
+        finally:
+            if log_filter is not None:
+                try:
+                    self.w3.eth.uninstallFilter(log_filter.filter_id)
+                except ValueError:
+                    pass
 
-        return self.w3.eth.getLogs(filter_params)
+    def _follow_filter(self,
+                       log_filter: Any,
+                       topics: Optional[List[Union[str, List[str], None]]],
+                       cursor: LogCursor,
+                       poll_interval: float) -> Generator[Dict[str, Any], None, None]:
+        """Yield the logs from the filter changes until the filter fails.
+        """
+        while True:
+            try:
+                logs = self.w3.eth.getFilterChanges(log_filter.filter_id)
+            except ValueError as e:
+                self.logger.debug("Filter %s is gone: %s", log_filter.filter_id, e)
+                return
+            logs = [log for log in logs if match_topics(log, topics)]
+            # Skip the logs already yielded when catching up by range
+            new_logs = [
+                log for log in sort_logs(logs)
+                if log['blockNumber'] >= cursor.next_block and not log.get('removed')
+            ]
+            if new_logs:
+                # The blocks of the logs are mined, spare the other handlers a request
+                self.head_tracker.observe(new_logs[-1]['blockNumber'])
+            yield from new_logs
+            if new_logs:
+                cursor.advance(new_logs[-1]['blockNumber'] + 1)
+            time.sleep(poll_interval)
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from typing import (  # noqa: F401
+    Dict,
+    Set,
+    Union,
+)
+
+from web3 import Web3
+
+from eth_utils import (
+    to_checksum_address,
+)
+from eth_typing import (
+    Address,
+)
+
+
+# Default number of seconds after which a nonce handed out, that the node
+# still does not count, is taken as the nonce of a lost transaction
+DEFAULT_GAP_TIMEOUT = 60.0
+
+
+class NonceManager:
+    """Allocate the transaction nonces of accounts locally.
+
+    The nonce of an account is read from the chain once, including pending
+    transactions, then handed out locally under a lock, so transactions from
+    the same account can be sent concurrently without a round trip each.
+
+    The nonces handed out are tracked until the chain nonce counts them. If the
+    lowest of them is still not counted `gap_timeout` seconds after it was
+    handed out, its transaction is taken as lost, e.g. the sending timed out
+    before it reached the node, and the local nonce is rolled back to the chain
+    nonce, so that the next transaction fills the gap instead of every later
+    one being held back. The chain nonce is read again on `resync`, and by
+    `allocate` every `gap_timeout` seconds while nonces are in flight.
+    """
+
+    logger = logging.getLogger("sharding.handler.NonceManager")
+
+    def __init__(self, w3: Web3, gap_timeout: float=DEFAULT_GAP_TIMEOUT) -> None:
+        self.w3 = w3
+        self.gap_timeout = gap_timeout
+        self._lock = threading.Lock()
+        self._next_nonces = {}  # type: Dict[str, int]
+        # Nonces handed out but given back while later ones were in use
+        self._released_nonces = {}  # type: Dict[str, Set[int]]
+        # nonce -> time handed out, of the nonces not counted by the chain yet
+        self._in_flight_nonces = {}  # type: Dict[str, Dict[int, float]]
+        # Time the chain nonce was last read
+        self._synced_at = {}  # type: Dict[str, float]
+
+    def _get_chain_nonce(self, address: str) -> int:
+        return self.w3.eth.getTransactionCount(address, 'pending')
+
+    def allocate(self, address: Union[Address, str]) -> int:
+        """Get the nonce of the next transaction sent from `address`.
+
+        Released nonces are handed out again first, lowest first, so that they
+        do not leave a gap holding back the later transactions.
+        """
+        address = to_checksum_address(address)
+        with self._lock:
+            now = time.monotonic()
+            if address not in self._next_nonces:
+                self._sync(address, now)
+            elif (self._in_flight_nonces.get(address) and
+                    now - self._synced_at[address] >= self.gap_timeout):
+                # Check for a lost transaction holding back the ones in flight
+                self._sync(address, now)
+            released_nonces = self._released_nonces.get(address)
+            if released_nonces:
+                nonce = min(released_nonces)
+                released_nonces.remove(nonce)
+            else:
+                nonce = self._next_nonces[address]
+                self._next_nonces[address] = nonce + 1
+            self._in_flight_nonces.setdefault(address, {})[nonce] = now
+            return nonce
+
+    def release(self, address: Union[Address, str], nonce: int) -> None:
+        """Give back a nonce whose transaction was not sent.
+        """
+        address = to_checksum_address(address)
+        with self._lock:
+            self._in_flight_nonces.get(address, {}).pop(nonce, None)
+            released_nonces = self._released_nonces.setdefault(address, set())
+            if self._next_nonces.get(address) != nonce + 1:
+                released_nonces.add(nonce)
+                return
+            # Roll back over the released nonces right below it too
+            while nonce - 1 in released_nonces:
+                released_nonces.remove(nonce - 1)
+                nonce -= 1
+            self._next_nonces[address] = nonce
+
+    def resync(self, address: Union[Address, str]) -> int:
+        """Read the nonce of `address` from the chain again, e.g. after a nonce error.
+
+        The local nonce only moves forward, unless the lowest nonce in flight
+        is lost, see `NonceManager`: nodes which do not count pending
+        transactions would otherwise hand out the nonce of a pending
+        transaction again, which replaces it. Returns the chain nonce.
+        """
+        address = to_checksum_address(address)
+        with self._lock:
+            return self._sync(address, time.monotonic())
+
+    def _sync(self, address: str, now: float) -> int:
+        chain_nonce = self._get_chain_nonce(address)
+        self._synced_at[address] = now
+        in_flight_nonces = {
+            nonce: handed_out_at
+            for (nonce, handed_out_at) in self._in_flight_nonces.get(address, {}).items()
+            if nonce >= chain_nonce
+        }
+        next_nonce = max(self._next_nonces.get(address, chain_nonce), chain_nonce)
+        if in_flight_nonces:
+            lowest_nonce = min(in_flight_nonces)
+            if now - in_flight_nonces[lowest_nonce] >= self.gap_timeout:
+                self.logger.info(
+                    "Nonce %d of %s is still not counted by the chain, rolled back to %d",
+                    lowest_nonce,
+                    address,
+                    chain_nonce,
+                )
+                in_flight_nonces = {}
+                next_nonce = chain_nonce
+        self._in_flight_nonces[address] = in_flight_nonces
+        self._next_nonces[address] = next_nonce
+        # Released nonces below the chain nonce were used by other senders
+        released_nonces = self._released_nonces.get(address, set())
+        self._released_nonces[address] = {
+            released_nonce
+            for released_nonce in released_nonces
+            if chain_nonce <= released_nonce < next_nonce
+        }
+        return chain_nonce
@@ -0,0 +1,496 @@
+import argparse
+import collections
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from web3 import (
+    HTTPProvider,
+    Web3,
+)
+
+from eth_keys import (
+    datatypes,
+    keys,
+)
+from eth_utils import (
+    decode_hex,
+    encode_hex,
+    to_checksum_address,
+)
+from eth_typing import (
+    Address,
+    Hash32,
+)
+
+from sharding.contracts.utils.config import (
+    get_sharding_config,
+)
+from sharding.handler.committee_sampler import (
+    CommitteeSampler,
+)
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.log_handler import (
+    LogHandler,
+)
+from sharding.handler.notary_registry import (
+    NotaryRegistry,
+)
+from sharding.handler.period_clock import (
+    DEFAULT_TICK_INTERVAL,
+    PeriodClock,
+)
+from sharding.handler.receipt_watcher import (
+    MinedTransaction,
+    ReceiptWatcher,
+    is_successful,
+)
+from sharding.handler.smc_handler import (
+    SMC,
+)
+from sharding.handler.utils.log_handler_utils import (
+    sort_logs,
+)
+from sharding.handler.utils.log_parser import (
+    get_event_log_decoder,
+)
+from sharding.handler.utils.shard_tracker_utils import (
+    get_event_signature_from_abi,
+    to_log_topic_shard_id,
+)
+
+
+# Default number of threads sending votes at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Default number of periods whose timings are kept
+DEFAULT_KEPT_PERIODS = 16
+
+# Timings of the duties of one period, as `time.monotonic()` values:
+# - assigned_at: when the assignments of the managed keys were computed
+# - started_at: when the period start was seen
+# - header_seen_at: {shard_id: when its header was seen}
+# - votes_sent_at: {shard_id: when the votes on its header were sent}
+# - votes_mined_at: {(shard_id, index): when the vote was seen mined}
+# - failed_votes: [(shard_id, index)] of the votes not sent or reverted
+PeriodTimings = collections.namedtuple(
+    'PeriodTimings',
+    (
+        'period',
+        'assigned_at',
+        'started_at',
+        'header_seen_at',
+        'votes_sent_at',
+        'votes_mined_at',
+        'failed_votes',
+    ),
+)
+
+
+class NotaryDaemon:
+    """Vote on the collation headers of `shard_ids` with many notary keys.
+
+    The committee seats of the managed keys are computed by a `PeriodClock` as
+    soon as the entropy block of a period is mined, from a `NotaryRegistry`
+    synced up to the head on every round. If no `notary_registry` is given, one
+    syncing from block 0 is made. During the period, only the shards where the
+    keys have seats are queried for `AddHeader` logs, and once a header shows
+    up the votes of all its seats are sent in bulk by a pool of `max_workers`
+    threads, with the nonces allocated locally by the `NonceManager` of
+    `smc_handler`, and signed by the signing pool of `smc_handler` with
+    `signing_workers` processes, by default one per CPU. The votes the node
+    accepts are then followed by a `ReceiptWatcher`, and the mined ones
+    calibrate the vote gas limit of the `GasCalibrator` of `smc_handler`.
+
+    `run_once` does one round of it, `run` loops until `stop` is called. The
+    timings of the recent periods are available from `get_period_timings`.
+
+    NOTE: reorgs are not followed, a header replaced by a reorg is not voted
+    on again, and no vote is sent for a header seen in the last block of its
+    period, since it would be mined in the next one and fail.
+    """
+
+    logger = logging.getLogger("sharding.handler.NotaryDaemon")
+
+    def __init__(self,
+                 smc_handler: SMC,
+                 private_keys: Iterable[datatypes.PrivateKey],
+                 shard_ids: Optional[Iterable[int]]=None,
+                 max_workers: int=DEFAULT_MAX_WORKERS,
+                 signing_workers: Optional[int]=None,
+                 head_tracker: Optional[HeadTracker]=None,
+                 notary_registry: Optional[NotaryRegistry]=None) -> None:
+        self.smc_handler = smc_handler
+        self.signing_workers = signing_workers
+        self.w3 = smc_handler.web3
+        self.config = smc_handler.config
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(self.w3)
+        else:
+            self.head_tracker = head_tracker
+        self.private_keys = {
+            private_key.public_key.to_canonical_address(): private_key
+            for private_key in private_keys
+        }  # type: Dict[Address, datatypes.PrivateKey]
+        if not self.private_keys:
+            raise ValueError('At least one private key should be given')
+        if shard_ids is None:
+            self.shard_ids = frozenset(range(self.config['SHARD_COUNT']))
+        else:
+            self.shard_ids = frozenset(shard_ids)
+
+        if notary_registry is None:
+            self.notary_registry = NotaryRegistry(
+                self.w3,
+                self.config,
+                smc_handler.address,
+                head_tracker=self.head_tracker,
+            )
+        else:
+            self.notary_registry = notary_registry
+        self.committee_sampler = CommitteeSampler(
+            smc_handler,
+            notary_registry=self.notary_registry,
+            head_tracker=self.head_tracker,
+        )
+        self.period_clock = PeriodClock(
+            self.w3,
+            self.config,
+            head_tracker=self.head_tracker,
+            committee_sampler=self.committee_sampler,
+            notary_addresses=self.private_keys.keys(),
+        )
+        self.period_clock.add_assignment_hook(self._on_assignments)
+        self.period_clock.add_period_start_hook(self._on_period_start)
+        self.receipt_watcher = ReceiptWatcher(
+            self.w3,
+            smc_handler.address,
+            head_tracker=self.head_tracker,
+        )
+        self.log_handler = LogHandler(
+            self.w3,
+            self.config['PERIOD_LENGTH'],
+            head_tracker=self.head_tracker,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self._lock = threading.Lock()
+        # period -> {shard_id: [(index, private_key)]} of the watched shards
+        self._duties = collections.OrderedDict()  # type: collections.OrderedDict
+        # period -> PeriodTimings
+        self._timings = collections.OrderedDict()  # type: collections.OrderedDict
+        # The first block not searched for headers yet
+        self.next_block = None  # type: Optional[int]
+        self._vote_jobs = set()  # type: set
+        self._stop_event = threading.Event()
+
+    def _get_timings(self, period: int) -> PeriodTimings:
+        if period not in self._timings:
+            self._timings[period] = PeriodTimings(period, None, None, {}, {}, {}, [])
+            while len(self._timings) > DEFAULT_KEPT_PERIODS:
+                self._timings.popitem(last=False)
+        return self._timings[period]
+
+    def get_period_timings(self, period: int) -> PeriodTimings:
+        with self._lock:
+            if period not in self._timings:
+                raise KeyError("No timings of period {}".format(period))
+            return self._timings[period]
+
+    #
+    # Period clock hooks
+    #
+    def _on_assignments(self,
+                        period: int,
+                        assignments: Dict[Address, List[Tuple[int, int]]]) -> None:
+        duties = collections.defaultdict(list)  # type: Dict[int, List[Any]]
+        for (notary_address, seats) in assignments.items():
+            for (shard_id, index) in seats:
+                if shard_id in self.shard_ids:
+                    duties[shard_id].append((index, self.private_keys[notary_address]))
+        with self._lock:
+            self._duties[period] = dict(duties)
+            while len(self._duties) > 2:
+                self._duties.popitem(last=False)
+            timings = self._get_timings(period)
+            self._timings[period] = timings._replace(assigned_at=time.monotonic())
+        self.logger.info(
+            "%d seats in %d shards assigned in period %d",
+            sum(len(seats) for seats in duties.values()),
+            len(duties),
+            period,
+        )
+
+    def _on_period_start(self, period: int) -> None:
+        with self._lock:
+            timings = self._get_timings(period)
+            self._timings[period] = timings._replace(started_at=time.monotonic())
+            previous_timings = self._timings.get(period - 1)
+        start_block_number = period * self.config['PERIOD_LENGTH']
+        if self.next_block is None or self.next_block < start_block_number:
+            self.next_block = start_block_number
+        if previous_timings is not None:
+            self._log_timings(previous_timings)
+
+    def _log_timings(self, timings: PeriodTimings) -> None:
+        vote_delays = [
+            sent_at - timings.header_seen_at[shard_id]
+            for (shard_id, sent_at) in timings.votes_sent_at.items()
+        ]
+        self.logger.info(
+            "Period %d: %d headers voted on, %d votes mined, %d failed, "
+            "max %.3fs from header to votes sent",
+            timings.period,
+            len(timings.votes_sent_at),
+            len(timings.votes_mined_at),
+            len(timings.failed_votes),
+            max(vote_delays, default=0),
+        )
+
+    #
+    # Votes
+    #
+    def _get_new_headers(self, period: int, from_block: int, to_block: int) -> List[Any]:
+        with self._lock:
+            duties = self._duties.get(period, {})
+        if not duties:
+            return []
+        logs = self.log_handler.get_logs(
+            address=self.smc_handler.address,
+            topics=[
+                encode_hex(get_event_signature_from_abi('AddHeader')),
+                [encode_hex(to_log_topic_shard_id(shard_id)) for shard_id in sorted(duties)],
+            ],
+            from_block=from_block,
+            to_block=to_block,
+        )
+        decoder = get_event_log_decoder('AddHeader')
+        return [decoder(log) for log in sort_logs(logs)]
+
+    def _send_votes(self,
+                    period: int,
+                    shard_id: int,
+                    chunk_root: Hash32,
+                    duties: List[Tuple[int, datatypes.PrivateKey]]) -> None:
+        try:
+            results = self.smc_handler.send_transactions_in_bulk(
+                [
+                    (private_key, 'submit_vote', [shard_id, period, chunk_root, index])
+                    for (index, private_key) in duties
+                ],
+                max_workers=self.signing_workers,
+            )
+        except Exception:
+            self.logger.exception("Failed to send the votes of shard %d", shard_id)
+            with self._lock:
+                self._get_timings(period).failed_votes.extend(
+                    (shard_id, index) for (index, _) in duties
+                )
+            return
+
+        rejected_indices = [
+            index
+            for (result, (index, _)) in zip(results, duties)
+            if isinstance(result, Exception)
+        ]
+        with self._lock:
+            timings = self._get_timings(period)
+            if len(rejected_indices) < len(duties):
+                timings.votes_sent_at[shard_id] = time.monotonic()
+            timings.failed_votes.extend((shard_id, index) for index in rejected_indices)
+        for (result, (index, _)) in zip(results, duties):
+            if isinstance(result, Exception):
+                self.logger.warning("Vote %d of shard %d rejected: %s", index, shard_id, result)
+                continue
+            self.receipt_watcher.watch(
+                result,
+                callback=self._make_vote_callback(period, shard_id, index),
+            )
+
+    def _make_vote_callback(self,
+                            period: int,
+                            shard_id: int,
+                            index: int) -> Callable[[MinedTransaction], None]:
+        def on_vote_mined(mined_transaction: MinedTransaction) -> None:
+            with self._lock:
+                timings = self._get_timings(period)
+                if is_successful(mined_transaction):
+                    timings.votes_mined_at[(shard_id, index)] = time.monotonic()
+                else:
+                    timings.failed_votes.append((shard_id, index))
+            try:
+                self.smc_handler.record_gas_used(mined_transaction.receipt)
+            except Exception:
+                self.logger.exception("Failed to record the gas of a vote of shard %d", shard_id)
+        return on_vote_mined
+
+    def run_once(self) -> None:
+        """Fire the period clock, send the votes on the new headers, and follow
+        the votes sent.
+        """
+        head_block_number = self.head_tracker.refresh()
+        # The assignments are sampled from the registry, synced up to the head first
+        self.notary_registry.sync(head_block_number)
+        self.period_clock.tick(head_block_number)
+        period = self.period_clock.period
+        assert period is not None
+        if self.next_block is not None and self.next_block <= head_block_number:
+            headers = self._get_new_headers(period, self.next_block, head_block_number)
+            self.next_block = head_block_number + 1
+            # Votes sent in the last block of the period would be mined in the next one
+            is_last_block = (head_block_number + 1) % self.config['PERIOD_LENGTH'] == 0
+            for header in headers:
+                with self._lock:
+                    timings = self._get_timings(period)
+                    duties = self._duties.get(period, {}).get(header.shard_id)
+                    is_seen = header.shard_id in timings.header_seen_at
+                    if header.period != period or not duties or is_seen:
+                        continue
+                    timings.header_seen_at[header.shard_id] = time.monotonic()
+                    if is_last_block:
+                        timings.failed_votes.extend(
+                            (header.shard_id, index) for (index, _) in duties
+                        )
+                        continue
+                job = self._executor.submit(
+                    self._send_votes,
+                    period,
+                    header.shard_id,
+                    header.chunk_root,
+                    duties,
+                )
+                with self._lock:
+                    self._vote_jobs.add(job)
+                job.add_done_callback(self._discard_vote_job)
+        self.receipt_watcher.poll()
+
+    def _discard_vote_job(self, job: Future) -> None:
+        with self._lock:
+            self._vote_jobs.discard(job)
+
+    def wait_for_votes(self, timeout: Optional[float]=None) -> None:
+        """Wait until the votes on the headers seen so far are sent.
+        """
+        with self._lock:
+            vote_jobs = list(self._vote_jobs)
+        wait(vote_jobs, timeout=timeout)
+
+    def run(self, tick_interval: float=DEFAULT_TICK_INTERVAL) -> None:
+        """Run every `tick_interval` seconds until `stop` is called.
+        """
+        self._stop_event.clear()
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.warning("Failed to run the notary duties: %s", e)
+            self._stop_event.wait(tick_interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def close(self) -> None:
+        """Stop and wait for the votes being sent.
+        """
+        self.stop()
+        self._executor.shutdown(wait=True)
+
+
+def load_private_keys(path: str) -> List[datatypes.PrivateKey]:
+    """Read the hex encoded private keys of `path`, one per line. Empty lines
+    and lines starting with `#` are skipped.
+    """
+    with open(path) as f:
+        return [
+            keys.PrivateKey(decode_hex(line.strip()))
+            for line in f
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vote on collation headers with notary keys")
+    parser.add_argument("smc_address", type=str, help="the address of the SMC")
+    parser.add_argument("key_file", type=str, help="the file of the private keys, one per line")
+    parser.add_argument(
+        "--rpc",
+        type=str,
+        default="http://127.0.0.1:8545",
+        help="the JSON-RPC endpoint of the main chain node",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        action="append",
+        dest="shard_ids",
+        help="a shard to vote in, all shards if not given",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="the number of threads sending votes",
+    )
+    parser.add_argument(
+        "--signing-workers",
+        type=int,
+        default=None,
+        help="the number of processes signing votes, one per CPU if not given",
+    )
+    parser.add_argument(
+        "--tick-interval",
+        type=float,
+        default=DEFAULT_TICK_INTERVAL,
+        help="the seconds between two checks of the head block",
+    )
+    parser.add_argument("--log-level", type=str, default="INFO", help="the logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    w3 = Web3(HTTPProvider(args.rpc))
+    if hasattr(w3.eth, "enable_unaudited_features"):
+        w3.eth.enable_unaudited_features()
+    private_keys = load_private_keys(args.key_file)
+    if not private_keys:
+        parser.error("no private key in {}".format(args.key_file))
+
+    SMCFactory = w3.eth.contract(ContractFactoryClass=SMC)
+    smc_handler = SMCFactory(
+        address=to_checksum_address(args.smc_address),
+        default_priv_key=private_keys[0],
+        config=get_sharding_config(),
+    )
+    notary_daemon = NotaryDaemon(
+        smc_handler,
+        private_keys,
+        shard_ids=args.shard_ids,
+        max_workers=args.max_workers,
+        signing_workers=args.signing_workers,
+    )
+    try:
+        notary_daemon.run(args.tick_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        notary_daemon.close()
+        smc_handler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+import collections
+import logging
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from web3 import Web3
+
+from eth_utils import (
+    encode_hex,
+    to_canonical_address,
+)
+from eth_typing import (
+    Address,
+)
+
+from sharding.contracts.utils.config import (
+    get_sharding_config,
+)
+from sharding.handler.chain_tracker import (
+    DEFAULT_HISTORY_SIZE,
+)
+from sharding.handler.event_stream import (
+    EventBatch,
+    StreamEvent,
+)
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.log_cache import (
+    LogCache,
+)
+from sharding.handler.log_handler import (
+    LogHandler,
+)
+from sharding.handler.utils.log_parser import (
+    decode_log,
+)
+from sharding.handler.utils.shard_tracker_utils import (
+    NOTARY_EVENT_NAMES,
+    get_event_signature_from_abi,
+)
+
+
+ZERO_ADDRESS = Address(b'\x00' * 20)
+
+# Events folded into the mirror. `AddHeader` is only needed for the notary
+# sample size, which the SMC also updates when a header is added.
+REGISTRY_EVENT_NAMES = NOTARY_EVENT_NAMES + ('AddHeader',)
+
+# State overwritten by folding one event, restored to undo it
+UndoRecord = collections.namedtuple(
+    'UndoRecord',
+    (
+        'notary_pool_len',
+        'empty_slots_stack_top',
+        'current_period_notary_sample_size',
+        'next_period_notary_sample_size',
+        'notary_sample_size_updated_period',
+        'notary_pool_size',
+        'pool_index',
+        'notary_pool_entry',
+        'empty_slots_stack_size',
+        'empty_slots_stack_entry',
+        'notary',
+        'notary_registry_entry',
+    ),
+)
+
+
+class NotaryRegistry:
+    """Local mirror of the notary registry and notary pool of the SMC.
+
+    The mirror is built by folding the `RegisterNotary`, `DeregisterNotary`,
+    `ReleaseNotary` and `AddHeader` logs in order, the same way the SMC
+    updates its storage, and exposes the SMC getters as local lookups.
+    `sync` only fetches the logs of the blocks not folded yet.
+
+    Alternatively, the mirror can follow an `SMCEventStream` with
+    `apply_event_batch`, which undoes the events of reorged blocks from a
+    journal of the events folded in the last `journal_blocks` blocks. Use
+    either `sync` or an event stream, not both.
+
+    NOTE: `update_notary_sample_size` can also be called directly, which emits
+    no log. `current_period_notary_sample_size` and
+    `notary_sample_size_updated_period` may then lag behind the SMC, but the
+    sample size of a period returned by `get_notary_sample_size` is still exact.
+    """
+
+    logger = logging.getLogger("sharding.handler.NotaryRegistry")
+
+    def __init__(self,
+                 w3: Web3,
+                 config: Optional[Dict[str, Any]],
+                 smc_handler_address: Address,
+                 from_block: int=0,
+                 log_cache: LogCache=None,
+                 head_tracker: HeadTracker=None,
+                 journal_blocks: int=DEFAULT_HISTORY_SIZE) -> None:
+        if config is None:
+            self.config = get_sharding_config()
+        else:
+            self.config = config
+        self.log_handler = LogHandler(
+            w3,
+            self.config['PERIOD_LENGTH'],
+            log_cache=log_cache,
+            head_tracker=head_tracker,
+        )
+        self.head_tracker = self.log_handler.head_tracker
+        self.smc_handler_address = smc_handler_address
+        # The first block whose logs are not folded yet
+        self.next_block = from_block
+
+        self._notary_pool = []  # type: List[Address]
+        self._notary_pool_len = 0
+        # Like in the SMC, popped entries above the top are left in place
+        self._empty_slots_stack = []  # type: List[int]
+        self._empty_slots_stack_top = 0
+        # notary address -> (deregistered period, pool index)
+        self._notary_registry = {}  # type: Dict[Address, Tuple[int, int]]
+        self._current_period_notary_sample_size = 0
+        self._next_period_notary_sample_size = 0
+        self._notary_sample_size_updated_period = 0
+
+        self.journal_blocks = journal_blocks
+        # (block_number, block_hash, transaction_index, log_index, undo record)
+        # of the events folded from event batches, in chain order
+        self._journal = collections.deque()  # type: collections.deque
+
+    #
+    # Syncing
+    #
+    def sync(self, to_block: int=None) -> None:
+        """Fold the logs of the blocks from `next_block` to `to_block`, or to the head.
+        """
+        if to_block is None:
+            to_block = self.head_tracker.refresh()
+        if to_block < self.next_block:
+            return
+        logs = self.log_handler.get_logs_in_chunks(
+            address=self.smc_handler_address,
+            topics=[[
+                encode_hex(get_event_signature_from_abi(event_name))
+                for event_name in REGISTRY_EVENT_NAMES
+            ]],
+            from_block=self.next_block,
+            to_block=to_block,
+        )
+        for log in logs:
+            self.apply_log(log)
+        self.next_block = to_block + 1
+
+    def apply_log(self, log: Dict[str, Any]) -> None:
+        """Fold one SMC log. Logs must be applied in chain order.
+        """
+        self.apply_event(decode_log(log), log['blockNumber'])
+
+    def apply_event(self, event: Any, block_number: int) -> None:
+        period = block_number // self.config['PERIOD_LENGTH']
+        if event.event_name == 'RegisterNotary':
+            self._update_notary_sample_size(period)
+            self._register_notary(event.notary, event.index_in_notary_pool)
+        elif event.event_name == 'DeregisterNotary':
+            self._update_notary_sample_size(period)
+            self._deregister_notary(
+                event.notary,
+                event.index_in_notary_pool,
+                event.deregistered_period,
+            )
+        elif event.event_name == 'ReleaseNotary':
+            self._notary_registry.pop(event.notary, None)
+        elif event.event_name == 'AddHeader':
+            self._update_notary_sample_size(period)
+
+    def apply_event_batch(self, event_batch: EventBatch) -> None:
+        """Undo the removed events and fold the added events of an `SMCEventStream` update.
+
+        The removed events must be the latest events folded by this method.
+        """
+        for stream_event in event_batch.removed:
+            self.revert_event(stream_event)
+        for stream_event in event_batch.added:
+            if stream_event.event.event_name not in REGISTRY_EVENT_NAMES:
+                continue
+            undo_record = self._make_undo_record(stream_event.event)
+            self.apply_event(stream_event.event, stream_event.block_number)
+            self._journal.append((
+                stream_event.block_number,
+                stream_event.block_hash,
+                stream_event.transaction_index,
+                stream_event.log_index,
+                undo_record,
+            ))
+
+        # Events too old to be reorged can not be undone anymore
+        if self._journal:
+            oldest_block_number = self._journal[-1][0] - self.journal_blocks
+            while self._journal and self._journal[0][0] <= oldest_block_number:
+                self._journal.popleft()
+
+    def revert_event(self, stream_event: StreamEvent) -> None:
+        """Undo the last event folded by `apply_event_batch`.
+        """
+        if stream_event.event.event_name not in REGISTRY_EVENT_NAMES:
+            return
+        if not self._journal or self._journal[-1][1:4] != (
+            stream_event.block_hash,
+            stream_event.transaction_index,
+            stream_event.log_index,
+        ):
+            raise ValueError(
+                "Event at log {} of transaction {} of block {} is not the last event "
+                "folded".format(
+                    stream_event.log_index,
+                    stream_event.transaction_index,
+                    encode_hex(stream_event.block_hash),
+                )
+            )
+        self._undo(self._journal.pop()[4])
+
+    def _make_undo_record(self, event: Any) -> UndoRecord:
+        notary = getattr(event, 'notary', None)
+        pool_index = getattr(event, 'index_in_notary_pool', None)
+        return UndoRecord(
+            notary_pool_len=self._notary_pool_len,
+            empty_slots_stack_top=self._empty_slots_stack_top,
+            current_period_notary_sample_size=self._current_period_notary_sample_size,
+            next_period_notary_sample_size=self._next_period_notary_sample_size,
+            notary_sample_size_updated_period=self._notary_sample_size_updated_period,
+            notary_pool_size=len(self._notary_pool),
+            pool_index=pool_index,
+            notary_pool_entry=None if pool_index is None else self.notary_pool(pool_index),
+            empty_slots_stack_size=len(self._empty_slots_stack),
+            empty_slots_stack_entry=self.empty_slots_stack(self._empty_slots_stack_top),
+            notary=notary,
+            notary_registry_entry=self._notary_registry.get(notary),
+        )
+
+    def _undo(self, undo_record: UndoRecord) -> None:
+        self._notary_pool_len = undo_record.notary_pool_len
+        self._current_period_notary_sample_size = undo_record.current_period_notary_sample_size
+        self._next_period_notary_sample_size = undo_record.next_period_notary_sample_size
+        self._notary_sample_size_updated_period = undo_record.notary_sample_size_updated_period
+
+        del self._notary_pool[undo_record.notary_pool_size:]
+        if undo_record.pool_index is not None and undo_record.pool_index < len(self._notary_pool):
+            self._notary_pool[undo_record.pool_index] = undo_record.notary_pool_entry
+
+        # Only the slot at the old top can have been overwritten
+        del self._empty_slots_stack[undo_record.empty_slots_stack_size:]
+        self._empty_slots_stack_top = undo_record.empty_slots_stack_top
+        if self._empty_slots_stack_top < len(self._empty_slots_stack):
+            self._empty_slots_stack[self._empty_slots_stack_top] = (
+                undo_record.empty_slots_stack_entry
+            )
+
+        if undo_record.notary is not None:
+            if undo_record.notary_registry_entry is None:
+                self._notary_registry.pop(undo_record.notary, None)
+            else:
+                self._notary_registry[undo_record.notary] = undo_record.notary_registry_entry
+
+    def _update_notary_sample_size(self, period: int) -> None:
+        if self._notary_sample_size_updated_period >= period:
+            return
+        self._current_period_notary_sample_size = self._next_period_notary_sample_size
+        self._notary_sample_size_updated_period = period
+
+    def _register_notary(self, notary: Address, pool_index: int) -> None:
+        if self._empty_slots_stack_top > 0:
+            self._empty_slots_stack_top -= 1
+        if pool_index >= len(self._notary_pool):
+            self._notary_pool.extend([ZERO_ADDRESS] * (pool_index + 1 - len(self._notary_pool)))
+        self._notary_pool[pool_index] = notary
+        self._notary_pool_len += 1
+
+        if pool_index >= self._next_period_notary_sample_size:
+            self._next_period_notary_sample_size = pool_index + 1
+
+        self._notary_registry[notary] = (0, pool_index)
+
+    def _deregister_notary(self,
+                           notary: Address,
+                           pool_index: int,
+                           deregistered_period: int) -> None:
+        if self._empty_slots_stack_top < len(self._empty_slots_stack):
+            self._empty_slots_stack[self._empty_slots_stack_top] = pool_index
+        else:
+            self._empty_slots_stack.append(pool_index)
+        self._empty_slots_stack_top += 1
+        self._notary_pool[pool_index] = ZERO_ADDRESS
+        self._notary_pool_len -= 1
+
+        self._notary_registry[notary] = (deregistered_period, pool_index)
+
+    #
+    # SMC getters
+    #
+    def does_notary_exist(self, notary_address: Address) -> bool:
+        return to_canonical_address(notary_address) in self._notary_registry
+
+    def get_notary_info(self, notary_address: Address) -> Tuple[int, int]:
+        return self._notary_registry.get(to_canonical_address(notary_address), (0, 0))
+
+    def notary_pool_len(self) -> int:
+        return self._notary_pool_len
+
+    def notary_pool(self, pool_index: int) -> Address:
+        if pool_index < len(self._notary_pool):
+            return self._notary_pool[pool_index]
+        return ZERO_ADDRESS
+
+    def get_notary_pool_list(self) -> List[Address]:
+        """Get the notary pool up to the next period sample size, empty slots included.
+        """
+        return self._notary_pool[:self._next_period_notary_sample_size]
+
+    def empty_slots_stack_top(self) -> int:
+        return self._empty_slots_stack_top
+
+    def empty_slots_stack(self, stack_index: int) -> int:
+        if stack_index < len(self._empty_slots_stack):
+            return self._empty_slots_stack[stack_index]
+        return 0
+
+    def current_period_notary_sample_size(self) -> int:
+        return self._current_period_notary_sample_size
+
+    def next_period_notary_sample_size(self) -> int:
+        return self._next_period_notary_sample_size
+
+    def notary_sample_size_updated_period(self) -> int:
+        return self._notary_sample_size_updated_period
+
+    def get_notary_sample_size(self, period: int) -> int:
+        """Get the notary sample size used by `get_member_of_committee` in `period`.
+
+        The mirror must be synced up to the start of `period` at least. Only the
+        sample size of periods since the last update is known.
+        """
+        if period < self._notary_sample_size_updated_period:
+            raise ValueError(
+                "Sample size of period {} is overwritten in period {}".format(
+                    period,
+                    self._notary_sample_size_updated_period,
+                )
+            )
+        elif period == self._notary_sample_size_updated_period:
+            return self._current_period_notary_sample_size
+        else:
+            return self._next_period_notary_sample_size
@@ -0,0 +1,251 @@
+import collections
+import logging
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from web3 import Web3
+
+from eth_utils import (
+    to_canonical_address,
+)
+from eth_typing import (
+    Address,
+)
+
+from sharding.handler.committee_sampler import (
+    CommitteeSampler,
+)
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.smc_handler import (
+    SMC,
+)
+
+
+# Default number of seconds between two ticks in the background
+DEFAULT_TICK_INTERVAL = 1.0
+
+
+class PeriodClock:
+    """Fire hooks at the period boundaries of the main chain.
+
+    Each `tick` looks at the head block and fires, in chain order:
+
+    - the entropy block hooks of a period, with the period, once its entropy
+      block, i.e. the last block of the previous period, is mined;
+    - the period start hooks, with the period, once the head is in a new period.
+
+    If a `committee_sampler` is given, the committee assignments of the
+    notaries at `notary_addresses` are computed as soon as the entropy block of
+    a period is mined, i.e. one block before the period starts, and passed to
+    the assignment hooks as a `{notary_address: [(shard_id, index), ...]}`
+    dict. Notaries not in the notary pool have no assignments.
+
+    Periods skipped between two ticks are not fired. Hooks are called from the
+    thread calling `tick`, an exception in a hook is logged and the other hooks
+    are still called.
+
+    The pool indices of the notaries are read from the `NotaryRegistry` of the
+    committee sampler if any, and from the SMC in two batch requests otherwise.
+
+    NOTE: with a `NotaryRegistry` in the committee sampler, the registry must be
+    synced up to the head before each tick. Assignments are not recomputed if
+    the entropy block is replaced by a reorg.
+    """
+
+    logger = logging.getLogger("sharding.handler.PeriodClock")
+
+    def __init__(self,
+                 w3: Web3,
+                 config: Dict[str, Any],
+                 head_tracker: Optional[HeadTracker]=None,
+                 committee_sampler: Optional[CommitteeSampler]=None,
+                 notary_addresses: Iterable[Address]=()) -> None:
+        self.w3 = w3
+        self.config = config
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(w3)
+        else:
+            self.head_tracker = head_tracker
+        self.committee_sampler = committee_sampler
+        self.notary_addresses = tuple(
+            to_canonical_address(notary_address)
+            for notary_address in notary_addresses
+        )
+        # The head block number seen by the latest tick
+        self.block_number = None  # type: Optional[int]
+        # The latest period started, and the latest period whose entropy block is mined
+        self.period = None  # type: Optional[int]
+        self.entropy_period = None  # type: Optional[int]
+        self.period_start_hooks = []  # type: List[Callable[[int], Any]]
+        self.entropy_block_hooks = []  # type: List[Callable[[int], Any]]
+        self.assignment_hooks = []  # type: List[Callable[[int, Dict[Address, Any]], Any]]
+        # period -> assignments of the notaries, for the latest periods
+        self._assignments = collections.OrderedDict()  # type: collections.OrderedDict
+        self._tick_thread = None  # type: Optional[threading.Thread]
+        self._stop_event = threading.Event()
+
+    def add_period_start_hook(self, hook: Callable[[int], Any]) -> None:
+        self.period_start_hooks.append(hook)
+
+    def add_entropy_block_hook(self, hook: Callable[[int], Any]) -> None:
+        self.entropy_block_hooks.append(hook)
+
+    def add_assignment_hook(self, hook: Callable[[int, Dict[Address, Any]], Any]) -> None:
+        self.assignment_hooks.append(hook)
+
+    def _fire(self, hooks: List[Callable[..., Any]], *args: Any) -> None:
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception:
+                self.logger.exception("Hook %r failed for %r", hook, args)
+
+    def get_assignments(self, period: int) -> Dict[Address, List[Tuple[int, int]]]:
+        """Get the committee assignments of the notaries in `period`, computed
+        once its entropy block is mined.
+        """
+        if period not in self._assignments:
+            raise KeyError("Assignments of period {} are not computed".format(period))
+        return self._assignments[period]
+
+    def _get_pool_indices(self, committee_sampler: CommitteeSampler) -> Dict[Address, int]:
+        notary_registry = committee_sampler.notary_registry
+        if notary_registry is None:
+            return self._get_pool_indices_from_smc(committee_sampler.smc_handler)
+        pool_indices = {}
+        for notary_address in self.notary_addresses:
+            if not notary_registry.does_notary_exist(notary_address):
+                continue
+            _, pool_index = notary_registry.get_notary_info(notary_address)
+            # Deregistered notaries are removed from the pool
+            if notary_registry.notary_pool(pool_index) == notary_address:
+                pool_indices[notary_address] = pool_index
+        return pool_indices
+
+    def _get_pool_indices_from_smc(self, smc_handler: SMC) -> Dict[Address, int]:
+        """Same as `_get_pool_indices`, with the SMC getters sent in two batch
+        requests for all the notaries.
+        """
+        with smc_handler.batch() as batch:
+            for notary_address in self.notary_addresses:
+                batch.does_notary_exist(notary_address)
+                batch.get_notary_info(notary_address)
+        results = batch.results
+        assert results is not None
+        candidates = [
+            (notary_address, pool_index)
+            for (notary_address, does_exist, (_, pool_index)) in zip(
+                self.notary_addresses,
+                results[0::2],
+                results[1::2],
+            )
+            if does_exist
+        ]
+
+        with smc_handler.batch() as batch:
+            for (_, pool_index) in candidates:
+                batch.notary_pool(pool_index)
+        results = batch.results
+        assert results is not None
+        # Deregistered notaries are removed from the pool
+        return {
+            notary_address: pool_index
+            for ((notary_address, pool_index), pool_address) in zip(candidates, results)
+            if pool_address == notary_address
+        }
+
+    def _compute_assignments(self, committee_sampler: CommitteeSampler, period: int) -> None:
+        pool_indices = self._get_pool_indices(committee_sampler)
+        assignments_of_notaries = committee_sampler.get_assignments_of_notaries(
+            pool_indices.values(),
+            period,
+        )
+        assignments = {
+            notary_address: assignments_of_notaries.get(pool_indices[notary_address], [])
+            if notary_address in pool_indices else []
+            for notary_address in self.notary_addresses
+        }
+        self._assignments[period] = assignments
+        while len(self._assignments) > committee_sampler.cached_periods:
+            self._assignments.popitem(last=False)
+        self._fire(self.assignment_hooks, period, assignments)
+
+    def _on_entropy_block(self, period: int) -> None:
+        self.entropy_period = period
+        committee_sampler = self.committee_sampler
+        if committee_sampler is not None:
+            try:
+                self._compute_assignments(committee_sampler, period)
+            except Exception:
+                self.logger.exception("Failed to compute the assignments of period %d", period)
+        self._fire(self.entropy_block_hooks, period)
+
+    def _is_entropy_block_fired(self, period: int) -> bool:
+        return self.entropy_period is not None and self.entropy_period >= period
+
+    def tick(self, block_number: int=None) -> None:
+        """Fire the hooks of the period boundaries reached by the head block.
+
+        `block_number` is the head block number, if the caller already fetched it.
+        """
+        if block_number is None:
+            block_number = self.head_tracker.refresh()
+        self.block_number = block_number
+        period_length = self.config['PERIOD_LENGTH']
+        current_period = block_number // period_length
+
+        # Period 0 has no entropy block
+        if current_period > 0 and not self._is_entropy_block_fired(current_period):
+            self._on_entropy_block(current_period)
+        if self.period is None or self.period < current_period:
+            if self.period is not None and current_period > self.period + 1:
+                self.logger.debug(
+                    "Skipped periods %d to %d",
+                    self.period + 1,
+                    current_period - 1,
+                )
+            self.period = current_period
+            self._fire(self.period_start_hooks, current_period)
+        # The last block of the period is the entropy block of the next one
+        is_last_block = (block_number + 1) % period_length == 0
+        if is_last_block and not self._is_entropy_block_fired(current_period + 1):
+            self._on_entropy_block(current_period + 1)
+
+    def start(self, tick_interval: float=DEFAULT_TICK_INTERVAL) -> None:
+        """Tick every `tick_interval` seconds in the background.
+        """
+        if self._tick_thread is not None:
+            raise ValueError("PeriodClock is already ticking")
+        self._stop_event.clear()
+        self._tick_thread = threading.Thread(
+            target=self._tick,
+            args=(tick_interval,),
+            name="PeriodClock",
+            daemon=True,
+        )
+        self._tick_thread.start()
+
+    def stop(self) -> None:
+        if self._tick_thread is None:
+            return
+        self._stop_event.set()
+        self._tick_thread.join()
+        self._tick_thread = None
+
+    def _tick(self, tick_interval: float) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                self.logger.warning("Failed to get head block number: %s", e)
+            self._stop_event.wait(tick_interval)
@@ -0,0 +1,221 @@
+import collections
+from concurrent.futures import (
+    Future,
+)
+import logging
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+from web3 import Web3
+
+from eth_utils import (
+    decode_hex,
+    is_same_address,
+)
+from eth_typing import (
+    Address,
+    Hash32,
+)
+
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.utils.log_parser import (
+    decode_log,
+)
+from sharding.handler.utils.web3_utils import (
+    get_blocks,
+    get_transaction_receipts,
+)
+
+
+# Receipt of a mined transaction, with its SMC logs decoded into event records
+MinedTransaction = collections.namedtuple('MinedTransaction', ('receipt', 'events'))
+
+
+def is_successful(mined_transaction: MinedTransaction) -> bool:
+    """Tell if a mined transaction succeeded.
+
+    Receipts before Byzantium have no status, the transaction is then taken as
+    successful if it emitted an SMC log, as all the SMC functions sending
+    transactions, but `update_notary_sample_size`, emit one.
+    """
+    status = mined_transaction.receipt.get('status')
+    if status is None:
+        return bool(mined_transaction.events)
+    return bool(status)
+
+
+class ReceiptWatcher:
+    """Wait for the receipts of many in-flight transactions at once.
+
+    Instead of polling a receipt per transaction, each new block is checked
+    once for all the watched transactions: the new blocks are fetched in one
+    batch request, and the receipts of the watched transactions found in them
+    in another. Transactions watched since the last `poll` also have their
+    receipts fetched directly, in case they were mined before being watched.
+
+    The futures returned by `watch` are resolved with a `MinedTransaction`.
+    `poll` can be called from any loop, e.g. once per block, or by a background
+    thread with `start`.
+
+    NOTE: a transaction re-mined by a reorg in a block number already checked
+    is only found if it is watched again.
+    """
+
+    logger = logging.getLogger("sharding.handler.ReceiptWatcher")
+
+    def __init__(self,
+                 w3: Web3,
+                 smc_handler_address: Address,
+                 head_tracker: HeadTracker=None) -> None:
+        self.w3 = w3
+        self.smc_handler_address = smc_handler_address
+        if head_tracker is None:
+            self.head_tracker = HeadTracker(w3)
+        else:
+            self.head_tracker = head_tracker
+        self.next_block = None  # type: Optional[int]
+        self._lock = threading.Lock()
+        # tx_hash -> futures waiting for its receipt
+        self._pending = {}  # type: Dict[bytes, List[Future]]
+        # Transactions watched since the last poll
+        self._new_tx_hashes = set()  # type: set
+        self._poll_thread = None  # type: Optional[threading.Thread]
+        self._stop_event = threading.Event()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def watch(self,
+              tx_hash: Union[Hash32, str],
+              callback: Callable[[MinedTransaction], Any]=None) -> Future:
+        """Watch the transaction `tx_hash` until it is mined.
+
+        `callback`, if given, is called with the `MinedTransaction` by the
+        thread which resolves the future.
+        """
+        if isinstance(tx_hash, str):
+            tx_hash = decode_hex(tx_hash)
+        tx_hash = bytes(tx_hash)
+        future = Future()  # type: Future
+        if callback is not None:
+            mined_callback = callback
+            future.add_done_callback(lambda done_future: mined_callback(done_future.result()))
+        with self._lock:
+            if tx_hash not in self._pending:
+                self._pending[tx_hash] = []
+                self._new_tx_hashes.add(tx_hash)
+            self._pending[tx_hash].append(future)
+        return future
+
+    def _decode_events(self, receipt: Dict[str, Any]) -> List[Any]:
+        return [
+            decode_log(log)
+            for log in receipt['logs']
+            if is_same_address(log['address'], self.smc_handler_address)
+        ]
+
+    def _resolve(self, receipts: List[Optional[Dict[str, Any]]]) -> int:
+        num_resolved = 0
+        for receipt in receipts:
+            if receipt is None:
+                continue
+            with self._lock:
+                futures = self._pending.pop(bytes(receipt['transactionHash']), [])
+            if not futures:
+                continue
+            mined_transaction = MinedTransaction(receipt, self._decode_events(receipt))
+            for future in futures:
+                future.set_result(mined_transaction)
+            num_resolved += 1
+        return num_resolved
+
+    def poll(self) -> int:
+        """Check the blocks mined since the last poll, and return the number of
+        transactions found mined.
+        """
+        head_block_number = self.head_tracker.refresh()
+        with self._lock:
+            new_tx_hashes = [
+                tx_hash for tx_hash in self._new_tx_hashes
+                if tx_hash in self._pending
+            ]
+            self._new_tx_hashes.clear()
+        try:
+            num_resolved = self._resolve(get_transaction_receipts(self.w3, new_tx_hashes))
+        except Exception:
+            with self._lock:
+                self._new_tx_hashes.update(new_tx_hashes)
+            raise
+
+        if self.next_block is None:
+            # Transactions mined up to the head are found by their receipts above
+            self.next_block = head_block_number + 1
+            return num_resolved
+        if head_block_number < self.next_block:
+            return num_resolved
+
+        block_numbers = range(self.next_block, head_block_number + 1)
+        blocks = get_blocks(self.w3, block_numbers)
+        mined_tx_hashes = []  # type: List[bytes]
+        next_block = self.next_block
+        with self._lock:
+            for (block_number, block) in zip(block_numbers, blocks):
+                if block is None:
+                    # Not served by the node yet, check it again in the next poll
+                    break
+                mined_tx_hashes.extend(
+                    bytes(tx_hash)
+                    for tx_hash in block['transactions']
+                    if bytes(tx_hash) in self._pending
+                )
+                next_block = block_number + 1
+        receipts = get_transaction_receipts(self.w3, mined_tx_hashes)
+        num_resolved += self._resolve(receipts)
+        with self._lock:
+            # Receipts not served by the node yet are fetched directly in the next poll
+            self._new_tx_hashes.update(
+                tx_hash
+                for (tx_hash, receipt) in zip(mined_tx_hashes, receipts)
+                if receipt is None
+            )
+        self.next_block = next_block
+        return num_resolved
+
+    def start(self, poll_interval: float) -> None:
+        """Poll every `poll_interval` seconds in the background.
+        """
+        if self._poll_thread is not None:
+            raise ValueError("ReceiptWatcher is already polling")
+        self._stop_event.clear()
+        self._poll_thread = threading.Thread(
+            target=self._poll,
+            args=(poll_interval,),
+            name="ReceiptWatcher",
+            daemon=True,
+        )
+        self._poll_thread.start()
+
+    def stop(self) -> None:
+        if self._poll_thread is None:
+            return
+        self._stop_event.set()
+        self._poll_thread.join()
+        self._poll_thread = None
+
+    def _poll(self, poll_interval: float) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.warning("Failed to check pending transactions: %s", e)
+            self._stop_event.wait(poll_interval)
@@ -4,6 +4,7 @@ from typing import (
     Any,
     Dict,
     Generator,
+    Iterable,
     List,
     Optional,
     Union,
@@ -22,13 +23,33 @@ from eth_typing import (
 from sharding.contracts.utils.config import (
     get_sharding_config,
 )
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.log_cache import (
+    LogCache,
+)
 from sharding.handler.log_handler import (
+    LogCursor,
     LogHandler,
 )
-from sharding.handler.utils.log_parser import LogParser
+from sharding.handler.utils.log_handler_utils import (
+    sort_logs,
+)
+from sharding.handler.utils.log_parser import (
+    LogParser,
+    decode_log,
+    get_event_log_decoder,
+)
 from sharding.handler.utils.shard_tracker_utils import (
-    to_log_topic_address,
+    NOTARY_EVENT_NAMES,
+    SHARD_EVENT_NAMES,
+    PeriodSummary,
+    decide_period_block_number,
     get_event_signature_from_abi,
+    summarize_periods,
+    to_log_topic_address,
+    to_log_topic_shard_id,
 )
 
 
@@ -40,13 +61,21 @@ class ShardTracker:
                  w3: Web3,
                  config: Optional[Dict[str, Any]],
                  shard_id: int,
-                 smc_handler_address: Address) -> None:
+                 smc_handler_address: Address,
+                 log_cache: LogCache=None,
+                 head_tracker: HeadTracker=None) -> None:
         if config is None:
             self.config = get_sharding_config()
         else:
             self.config = config
         self.shard_id = shard_id
-        self.log_handler = LogHandler(w3, self.config['PERIOD_LENGTH'])
+        self.log_handler = LogHandler(
+            w3,
+            self.config['PERIOD_LENGTH'],
+            log_cache=log_cache,
+            head_tracker=head_tracker,
+        )
+        self.head_tracker = self.log_handler.head_tracker
         self.smc_handler_address = smc_handler_address
 
     def _get_logs_by_shard_id(self,
@@ -59,7 +88,7 @@ class ShardTracker:
             address=self.smc_handler_address,
             topics=[
                 encode_hex(get_event_signature_from_abi(event_name)),
-                encode_hex(self.shard_id.to_bytes(32, byteorder='big')),
+                encode_hex(to_log_topic_shard_id(self.shard_id)),
             ],
             from_block=from_block,
             to_block=to_block,
@@ -86,21 +115,26 @@ class ShardTracker:
             to_block=to_block,
         )
 
+    @property
+    def current_period(self) -> int:
+        return self.head_tracker.block_number // self.config['PERIOD_LENGTH']
+
+    @property
+    def _all_event_topics(self) -> List[str]:
+        return [
+            encode_hex(get_event_signature_from_abi(event_name))
+            for event_name in NOTARY_EVENT_NAMES + SHARD_EVENT_NAMES
+        ]
+
+    def _is_tracked_event(self, event: Any) -> bool:
+        # Header and vote events of the other shards are not tracked
+        return event.event_name not in SHARD_EVENT_NAMES or event.shard_id == self.shard_id
+
     def _decide_period_block_number(self,
                                     from_period: Union[int, None],
                                     to_period: Union[int, None]
                                     ) -> Tuple[Union[int, None], Union[int, None]]:
-        if from_period is None:
-            from_block = None
-        else:
-            from_block = from_period * self.config['PERIOD_LENGTH']
-
-        if to_period is None:
-            to_block = None
-        else:
-            to_block = (to_period + 1) * self.config['PERIOD_LENGTH'] - 1
-
-        return from_block, to_block
+        return decide_period_block_number(from_period, to_period, self.config['PERIOD_LENGTH'])
 
     #
     # Basic functions to get emitted logs
@@ -177,6 +211,50 @@ class ShardTracker:
         for log in logs:
             yield LogParser(event_name='SubmitVote', log=log)
 
+    @to_list
+    def get_all_events(self,
+                       from_period: int=None,
+                       to_period: int=None) -> Generator[Any, None, None]:
+        """Get the events of all kinds with a single query, in chain order.
+
+        Notary registry events are returned for every notary, while header and
+        vote events are only returned for the tracked shard. Each event is a
+        record decoded by `decode_log`, e.g. `AddHeader(period, shard_id, chunk_root)`.
+        """
+        from_block, to_block = self._decide_period_block_number(from_period, to_period)
+        logs = self.log_handler.get_logs(
+            address=self.smc_handler_address,
+            topics=[self._all_event_topics],
+            from_block=from_block,
+            to_block=to_block,
+        )
+        for log in sort_logs(logs):
+            event = decode_log(log)
+            if self._is_tracked_event(event):
+                yield event
+
+    def follow_events(self,
+                      from_period: int=None,
+                      cursor: LogCursor=None,
+                      **kwargs: Any) -> Generator[Any, None, None]:
+        """Yield the events of all kinds as new blocks arrive, forever.
+
+        The events are the same as the ones of `get_all_events`. See
+        `LogHandler.follow` for the cursor and the keyword arguments.
+        """
+        from_block, _ = self._decide_period_block_number(from_period, None)
+        logs = self.log_handler.follow(
+            address=self.smc_handler_address,
+            topics=[self._all_event_topics],
+            from_block=from_block,
+            cursor=cursor,
+            **kwargs
+        )
+        for log in logs:
+            event = decode_log(log)
+            if self._is_tracked_event(event):
+                yield event
+
     #
     # Functions for user to check the status of registration or votes
     #
@@ -227,3 +305,179 @@ class ShardTracker:
             to_block=(period + 1) * self.config['PERIOD_LENGTH'] - 1,
         )
         return False if not logs else len(logs) >= self.config['QUORUM_SIZE']
+
+    def get_period_summaries(self,
+                             from_period: int,
+                             to_period: int=None) -> Dict[int, PeriodSummary]:
+        """Get the header and vote tally of every period in `from_period..to_period`.
+
+        All headers and votes of the range are fetched by one query. `to_period`
+        defaults to the current period.
+        """
+        if to_period is None:
+            to_period = self.current_period
+        from_block, to_block = self._decide_period_block_number(from_period, to_period)
+        logs = self.log_handler.get_logs(
+            address=self.smc_handler_address,
+            topics=[
+                [
+                    encode_hex(get_event_signature_from_abi(event_name))
+                    for event_name in SHARD_EVENT_NAMES
+                ],
+                encode_hex(to_log_topic_shard_id(self.shard_id)),
+            ],
+            from_block=from_block,
+            to_block=to_block,
+        )
+        return summarize_periods(
+            (decode_log(log) for log in sort_logs(logs)),
+            from_period,
+            to_period,
+            self.config['QUORUM_SIZE'],
+        )
+
+
+class MultiShardTracker:
+    """Track emitted logs of a set of shards.
+
+    Each query fetches the logs of all the tracked shards at once, with the
+    shard ids as an OR-list in the second topic, and the results are split
+    per shard locally. Logs are decoded into records, e.g.
+    `AddHeader(period, shard_id, chunk_root)`.
+    """
+
+    def __init__(self,
+                 w3: Web3,
+                 config: Optional[Dict[str, Any]],
+                 shard_ids: Iterable[int],
+                 smc_handler_address: Address,
+                 log_cache: LogCache=None,
+                 head_tracker: HeadTracker=None) -> None:
+        if config is None:
+            self.config = get_sharding_config()
+        else:
+            self.config = config
+        self.shard_ids = tuple(sorted(set(shard_ids)))
+        if not self.shard_ids:
+            raise ValueError('At least one shard id should be given')
+        if set(self.shard_ids) == set(range(self.config['SHARD_COUNT'])):
+            # Every shard is tracked, no need to filter by shard id
+            self._shard_id_topics = None  # type: Optional[List[str]]
+        else:
+            self._shard_id_topics = [
+                encode_hex(to_log_topic_shard_id(shard_id))
+                for shard_id in self.shard_ids
+            ]
+        self.log_handler = LogHandler(
+            w3,
+            self.config['PERIOD_LENGTH'],
+            log_cache=log_cache,
+            head_tracker=head_tracker,
+        )
+        self.head_tracker = self.log_handler.head_tracker
+        self.smc_handler_address = smc_handler_address
+
+    @property
+    def current_period(self) -> int:
+        return self.head_tracker.block_number // self.config['PERIOD_LENGTH']
+
+    def _get_logs_by_shard_ids(self,
+                               event_name: str,
+                               from_block: Union[int, str]=None,
+                               to_block: Union[int, str]=None) -> List[Dict[str, Any]]:
+        """Search logs of all the tracked shards.
+        """
+        return self.log_handler.get_logs(
+            address=self.smc_handler_address,
+            topics=[
+                encode_hex(get_event_signature_from_abi(event_name)),
+                self._shard_id_topics,
+            ],
+            from_block=from_block,
+            to_block=to_block,
+        )
+
+    def _get_events_per_shard(self,
+                              event_name: str,
+                              from_block: Union[int, str]=None,
+                              to_block: Union[int, str]=None) -> Dict[int, List[Any]]:
+        logs = self._get_logs_by_shard_ids(event_name, from_block=from_block, to_block=to_block)
+        decoder = get_event_log_decoder(event_name)
+        events = {shard_id: [] for shard_id in self.shard_ids}  # type: Dict[int, List[Any]]
+        for log in sort_logs(logs):
+            event = decoder(log)
+            if event.shard_id in events:
+                events[event.shard_id].append(event)
+        return events
+
+    def get_add_header_logs(self,
+                            from_period: int=None,
+                            to_period: int=None) -> Dict[int, List[Any]]:
+        from_block, to_block = decide_period_block_number(
+            from_period,
+            to_period,
+            self.config['PERIOD_LENGTH'],
+        )
+        return self._get_events_per_shard('AddHeader', from_block=from_block, to_block=to_block)
+
+    def get_submit_vote_logs(self,
+                             from_period: int=None,
+                             to_period: int=None) -> Dict[int, List[Any]]:
+        from_block, to_block = decide_period_block_number(
+            from_period,
+            to_period,
+            self.config['PERIOD_LENGTH'],
+        )
+        return self._get_events_per_shard('SubmitVote', from_block=from_block, to_block=to_block)
+
+    def is_new_header_added(self, period: int) -> Dict[int, bool]:
+        headers = self.get_add_header_logs(from_period=period, to_period=period)
+        return {shard_id: bool(events) for (shard_id, events) in headers.items()}
+
+    def has_enough_vote(self, period: int) -> Dict[int, bool]:
+        votes = self.get_submit_vote_logs(from_period=period, to_period=period)
+        return {
+            shard_id: len(events) >= self.config['QUORUM_SIZE']
+            for (shard_id, events) in votes.items()
+        }
+
+    def get_period_summaries(self,
+                             from_period: int,
+                             to_period: int=None) -> Dict[int, Dict[int, PeriodSummary]]:
+        """Same as `ShardTracker.get_period_summaries`, for every tracked shard.
+
+        All headers and votes of the range are fetched by one query.
+        """
+        if to_period is None:
+            to_period = self.current_period
+        from_block, to_block = decide_period_block_number(
+            from_period,
+            to_period,
+            self.config['PERIOD_LENGTH'],
+        )
+        logs = self.log_handler.get_logs(
+            address=self.smc_handler_address,
+            topics=[
+                [
+                    encode_hex(get_event_signature_from_abi(event_name))
+                    for event_name in SHARD_EVENT_NAMES
+                ],
+                self._shard_id_topics,
+            ],
+            from_block=from_block,
+            to_block=to_block,
+        )
+        events = {shard_id: [] for shard_id in self.shard_ids}  # type: Dict[int, List[Any]]
+        for log in sort_logs(logs):
+            event = decode_log(log)
+            if event.shard_id in events:
+                events[event.shard_id].append(event)
+        return {
+            shard_id: summarize_periods(
+                shard_events,
+                from_period,
+                to_period,
+                self.config['QUORUM_SIZE'],
+            )
+            for (shard_id, shard_events) in events.items()
+        }
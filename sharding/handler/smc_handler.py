@@ -1,10 +1,30 @@
+import collections
+from concurrent.futures import (  # noqa: F401
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import (
+    BrokenProcessPool,
+)
+import functools
 import logging
+import os
+import threading
+from types import (
+    TracebackType,
+)
 from typing import (
     Any,
+    Callable,
     Dict,
     Iterable,
     List,
+    Optional,
+    Sequence,
     Tuple,
+    Type,
+    Union,
 )
 
 from web3.contract import (
@@ -12,15 +32,50 @@ from web3.contract import (
 )
 from eth_utils import (
     decode_hex,
-    to_canonical_address,
+    encode_hex,
+    is_same_address,
+    keccak,
 )
 
+from sharding.handler.gas_calibrator import (
+    GasCalibrator,
+)
+from sharding.handler.nonce_manager import (
+    NonceManager,
+)
+from sharding.handler.utils.gas_calibrator_utils import (
+    CALIBRATED_FUNCTION_NAMES,
+    DEFAULT_CODE_PATH,
+    SAMPLE_SIZE_UPDATE_EVENT_NAMES,
+    WORST_CASE_CODE_PATHS,
+    get_code_path,
+    get_function_name,
+)
 from sharding.handler.utils.smc_handler_utils import (
+    is_calldata_encodable,
+    is_known_transaction_error,
+    is_nonce_error,
+    is_result_decodable,
     make_call_context,
+    make_calldata_encoder,
+    make_result_decoder,
     make_transaction_context,
+    sign_transaction,
+)
+from sharding.handler.utils.log_parser import (
+    decode_log,
+)
+from sharding.handler.utils.shard_tracker_utils import (
+    get_event_signature_from_abi,
+    to_log_topic_shard_id,
+)
+from sharding.handler.utils.web3_utils import (
+    get_logs,
+    has_eth_tester_provider,
+    make_batch_request,
 )
 from sharding.contracts.utils.smc_utils import (
-    get_smc_json,
+    get_smc_artifact,
 )
 
 from eth_keys import (
@@ -32,123 +87,331 @@ from eth_typing import (
 )
 
 
-smc_json = get_smc_json()
+smc_artifact = get_smc_artifact()
+
+# Highest number of gas estimates of sent transactions kept for `record_gas_used`
+MAX_PENDING_GAS_ESTIMATES = 1024
+# Number of threads estimating the gas needed by transactions while they are sent
+GAS_ESTIMATE_WORKERS = 4
+
+
+# Getter of `SMC` -> name of the SMC function
+GETTER_FUNCTIONS = {
+    'does_notary_exist': 'does_notary_exist',
+    'get_notary_info': 'get_notary_info',
+    'notary_pool_len': 'notary_pool_len',
+    'notary_pool': 'notary_pool',
+    'empty_slots_stack_top': 'empty_slots_stack_top',
+    'empty_slots_stack': 'empty_slots_stack',
+    'current_period_notary_sample_size': 'current_period_notary_sample_size',
+    'next_period_notary_sample_size': 'next_period_notary_sample_size',
+    'notary_sample_size_updated_period': 'notary_sample_size_updated_period',
+    'records_updated_period': 'records_updated_period',
+    'head_collation_period': 'head_collation_period',
+    'get_member_of_committee': 'get_member_of_committee',
+    'get_collation_chunk_root': 'collation_records__chunk_root',
+    'get_collation_proposer': 'collation_records__proposer',
+    'get_collation_is_elected': 'collation_records__is_elected',
+    'current_vote': 'current_vote',
+    'get_vote_count': 'get_vote_count',
+    'has_notary_voted': 'has_notary_voted',
+}  # type: Dict[str, str]
+
+
+class SMCBatch:
+    """Getter calls of `SMC` collected and sent as one JSON-RPC batch request.
+
+    Every getter of `SMC` can be called on the batch with the same arguments;
+    the calls are only recorded. `execute` sends them all at once and returns
+    the results in call order, with the same types as the `SMC` getters. Used
+    as a context manager, the batch is executed on exit and the results are
+    available as `results`.
+    """
+
+    def __init__(self, smc_handler: 'SMC') -> None:
+        self.smc_handler = smc_handler
+        self._calls = []  # type: List[Tuple[str, bytes]]
+        self.results = None  # type: Optional[List[Any]]
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        if name not in GETTER_FUNCTIONS:
+            raise AttributeError("SMC has no getter {}".format(name))
+        return functools.partial(self._add_call, name)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __enter__(self) -> 'SMCBatch':
+        return self
+
+    def __exit__(self,
+                 exc_type: Optional[Type[BaseException]],
+                 exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        if exc_type is None:
+            self.execute()
+
+    def _add_call(self, getter_name: str, *args: Any) -> None:
+        function_name = GETTER_FUNCTIONS[getter_name]
+        data = self.smc_handler._calldata_encoders[function_name](args)
+        self._calls.append((function_name, data))
+
+    def execute(self) -> List[Any]:
+        call_context = self.smc_handler.getter_call_context
+        raw_results = make_batch_request(
+            self.smc_handler.web3,
+            [
+                ('eth_call', [dict(call_context, data=encode_hex(data)), 'latest'])
+                for (_, data) in self._calls
+            ],
+        )
+
+        results = []
+        for ((function_name, _), raw_result) in zip(self._calls, raw_results):
+            if isinstance(raw_result, str):
+                raw_result = decode_hex(raw_result)
+            results.append(self.smc_handler._result_decoders[function_name](raw_result))
+        self._calls = []
+        self.results = results
+        return results
 
 
 class SMC(Contract):
 
     logger = logging.getLogger("sharding.SMC")
-    abi = smc_json["abi"]
-    bytecode = decode_hex(smc_json["bytecode"])
+    abi = smc_artifact.abi
+    bytecode = decode_hex(smc_artifact.bytecode)
 
     default_priv_key = None  # type: datatypes.PrivateKey
     default_sender_address = None  # type: Address
     config = None  # type: Dict[str, Any]
+    nonce_manager = None  # type: NonceManager
+    gas_calibrator = None  # type: GasCalibrator
+
+    _estimate_gas_dict = dict(smc_artifact.function_gas)  # type: Dict[str, int]
 
-    _estimate_gas_dict = {
-        entry['name']: entry['gas']
-        for entry in smc_json["abi"]
-        if entry['type'] == 'function'
-    }  # type: Dict[str, int]
+    # Calldata encoders and return data decoders of the SMC functions, which skip
+    # web3's contract function machinery
+    _calldata_encoders = {
+        function_name: make_calldata_encoder(
+            smc_artifact.function_selectors[function_name],
+            input_types,
+        )
+        for (function_name, input_types) in (
+            (function_name, [item['type'] for item in function_abi['inputs']])
+            for (function_name, function_abi) in smc_artifact.function_abis.items()
+        )
+        if is_calldata_encodable(input_types)
+    }  # type: Dict[str, Callable[[Sequence[Any]], bytes]]
+    _result_decoders = {
+        function_name: make_result_decoder(output_types)
+        for (function_name, output_types) in (
+            (function_name, [item['type'] for item in function_abi['outputs']])
+            for (function_name, function_abi) in smc_artifact.function_abis.items()
+            if function_abi['constant']
+        )
+        if is_result_decodable(output_types)
+    }  # type: Dict[str, Callable[[bytes], Any]]
 
     def __init__(self,
                  *args: Any,
                  default_priv_key: datatypes.PrivateKey,
                  config: Dict[str, Any],
+                 nonce_manager: NonceManager=None,
+                 gas_calibrator: GasCalibrator=None,
                  **kwargs: Any) -> None:
         self.default_priv_key = default_priv_key
         self.default_sender_address = self.default_priv_key.public_key.to_canonical_address()
         self.config = config
+        if nonce_manager is None:
+            self.nonce_manager = NonceManager(self.web3)
+        else:
+            self.nonce_manager = nonce_manager
+        if gas_calibrator is None:
+            self.gas_calibrator = GasCalibrator(self._estimate_gas_dict)
+        else:
+            self.gas_calibrator = gas_calibrator
+        # tx hash -> (gas needed, number of the block it was estimated on)
+        # estimated when sent, until `record_gas_used`
+        self._gas_needed = collections.OrderedDict()  # type: collections.OrderedDict
+        self._gas_needed_lock = threading.Lock()
+        self._gas_estimate_executor = ThreadPoolExecutor(max_workers=GAS_ESTIMATE_WORKERS)
+        # number of processes -> pool signing transactions sent in bulk, kept
+        # until `close`
+        self._signing_pools = {}  # type: Dict[int, ProcessPoolExecutor]
+        self._signing_pools_lock = threading.Lock()
 
         super().__init__(*args, **kwargs)
 
+        self._basic_call_context = make_call_context(
+            sender_address=self.default_sender_address,
+        )
+        self._getter_call_context = dict(self._basic_call_context, to=self.address)
+
     #
     # property
     #
     @property
     def basic_call_context(self) -> Dict[str, Any]:
-        return make_call_context(
-            sender_address=self.default_sender_address,
-        )
+        return self._basic_call_context
+
+    @property
+    def getter_call_context(self) -> Dict[str, Any]:
+        return self._getter_call_context
+
+    def _call(self, function_name: str, *args: Any) -> Any:
+        """Call a constant SMC function, encoding the calldata and decoding the
+        return data directly.
+        """
+        return_data = self.web3.eth.call(dict(
+            self._getter_call_context,
+            data=encode_hex(self._calldata_encoders[function_name](args)),
+        ))
+        if isinstance(return_data, str):
+            return_data = decode_hex(return_data)
+        return self._result_decoders[function_name](return_data)
+
+    def close(self) -> None:
+        """Shut down the pools of the handler, once their jobs are done.
+        """
+        self._gas_estimate_executor.shutdown(wait=True)
+        with self._signing_pools_lock:
+            signing_pools = list(self._signing_pools.values())
+            self._signing_pools.clear()
+        for signing_pool in signing_pools:
+            signing_pool.shutdown(wait=True)
+
+    def batch(self) -> SMCBatch:
+        """Collect getter calls to send them as one batch request, see `SMCBatch`.
+        """
+        return SMCBatch(self)
 
     #
     # Public variable getter functions
     #
     def does_notary_exist(self, notary_address: Address) -> bool:
-        return self.functions.does_notary_exist(notary_address).call(self.basic_call_context)
+        return self._call('does_notary_exist', notary_address)
 
     def get_notary_info(self, notary_address: Address) -> Tuple[int, int]:
-        return self.functions.get_notary_info(notary_address).call(self.basic_call_context)
+        return self._call('get_notary_info', notary_address)
 
     def notary_pool_len(self) -> int:
-        return self.functions.notary_pool_len().call(self.basic_call_context)
+        return self._call('notary_pool_len')
 
     def notary_pool(self, pool_index: int) -> List[Address]:
-        notary_address = self.functions.notary_pool(pool_index).call(self.basic_call_context)
-        return to_canonical_address(notary_address)
+        return self._call('notary_pool', pool_index)
 
     def empty_slots_stack_top(self) -> int:
-        return self.functions.empty_slots_stack_top().call(self.basic_call_context)
+        return self._call('empty_slots_stack_top')
 
     def empty_slots_stack(self, stack_index: int) -> List[int]:
-        return self.functions.empty_slots_stack(stack_index).call(self.basic_call_context)
+        return self._call('empty_slots_stack', stack_index)
 
     def current_period_notary_sample_size(self) -> int:
-        return self.functions.current_period_notary_sample_size().call(self.basic_call_context)
+        return self._call('current_period_notary_sample_size')
 
     def next_period_notary_sample_size(self) -> int:
-        return self.functions.next_period_notary_sample_size().call(self.basic_call_context)
+        return self._call('next_period_notary_sample_size')
 
     def notary_sample_size_updated_period(self) -> int:
-        return self.functions.notary_sample_size_updated_period().call(self.basic_call_context)
+        return self._call('notary_sample_size_updated_period')
 
     def records_updated_period(self, shard_id: int) -> int:
-        return self.functions.records_updated_period(shard_id).call(self.basic_call_context)
+        return self._call('records_updated_period', shard_id)
 
     def head_collation_period(self, shard_id: int) -> int:
-        return self.functions.head_collation_period(shard_id).call(self.basic_call_context)
+        return self._call('head_collation_period', shard_id)
 
     def get_member_of_committee(self, shard_id: int, index: int) -> Address:
-        notary_address = self.functions.get_member_of_committee(
-            shard_id,
-            index,
-        ).call(self.basic_call_context)
-        return to_canonical_address(notary_address)
+        return self._call('get_member_of_committee', shard_id, index)
 
     def get_collation_chunk_root(self, shard_id: int, period: int) -> Hash32:
-        return self.functions.collation_records__chunk_root(
-            shard_id,
-            period,
-        ).call(self.basic_call_context)
+        return self._call('collation_records__chunk_root', shard_id, period)
 
     def get_collation_proposer(self, shard_id: int, period: int) -> Address:
-        proposer_address = self.functions.collation_records__proposer(
-            shard_id,
-            period,
-        ).call(self.basic_call_context)
-        return to_canonical_address(proposer_address)
+        return self._call('collation_records__proposer', shard_id, period)
 
     def get_collation_is_elected(self, shard_id: int, period: int) -> bool:
-        return self.functions.collation_records__is_elected(
-            shard_id,
-            period,
-        ).call(self.basic_call_context)
+        return self._call('collation_records__is_elected', shard_id, period)
 
     def current_vote(self, shard_id: int) -> bytes:
-        return self.functions.current_vote(
-            shard_id,
-        ).call(self.basic_call_context)
+        return self._call('current_vote', shard_id)
 
     def get_vote_count(self, shard_id: int) -> int:
-        return self.functions.get_vote_count(
-            shard_id,
-        ).call(self.basic_call_context)
+        return self._call('get_vote_count', shard_id)
 
     def has_notary_voted(self, shard_id: int, index: int) -> bool:
-        return self.functions.has_notary_voted(
-            shard_id,
-            index,
-        ).call(self.basic_call_context)
+        return self._call('has_notary_voted', shard_id, index)
+
+    def _build_transaction(self,
+                           *,
+                           func_name: str,
+                           args: Iterable[Any],
+                           nonce: int,
+                           chain_id: int=None,
+                           gas: int=None,
+                           value: int=0,
+                           gas_price: int=None,
+                           data: bytes=None) -> Dict[str, Any]:
+        if data is None and func_name in self._calldata_encoders:
+            # Fast path: same transaction as `buildTransaction` builds
+            transaction = make_transaction_context(
+                nonce=nonce,
+                gas=gas,
+                chain_id=chain_id,
+                value=value,
+                gas_price=gas_price,
+                data=encode_hex(self._calldata_encoders[func_name](list(args))),
+            )
+            transaction['to'] = self.address
+            if gas_price is None:
+                transaction['gasPrice'] = self.web3.eth.gasPrice
+            if value is None:
+                transaction['value'] = 0
+            return transaction
+
+        build_transaction_detail = make_transaction_context(
+            nonce=nonce,
+            gas=gas,
+            chain_id=chain_id,
+            value=value,
+            gas_price=gas_price,
+            data=data,
+        )
+        func_instance = getattr(self.functions, func_name)
+        return func_instance(*args).buildTransaction(
+            transaction=build_transaction_detail,
+        )
+
+    def _send_signed_transaction(self, signed_transaction_dict: Dict[str, Any]) -> Hash32:
+        try:
+            return self.web3.eth.sendRawTransaction(signed_transaction_dict['rawTransaction'])
+        except ValueError as e:
+            if not is_known_transaction_error(e):
+                raise
+        # The node already has this very transaction, e.g. it was sent again
+        # after a timeout, so it is sent
+        return signed_transaction_dict['hash']
+
+    def _estimate_and_send_transaction(self,
+                                       func_name: str,
+                                       unsigned_transaction: Dict[str, Any],
+                                       private_key: datatypes.PrivateKey,
+                                       code_path: str=None) -> Hash32:
+        """Send the transaction, estimating its gas needed at the same time while
+        the gas calibrator needs samples of the code path it is sent for.
+        """
+        signed_transaction_dict = self.web3.eth.account.signTransaction(
+            unsigned_transaction,
+            private_key.to_hex(),
+        )
+        if self._needs_gas_samples(func_name, code_path):
+            self._start_gas_estimates(
+                [unsigned_transaction],
+                {0: (func_name, private_key.public_key.to_checksum_address())},
+                [Hash32(bytes(signed_transaction_dict['hash']))],
+            )
+        return self._send_signed_transaction(signed_transaction_dict)
 
     def _send_transaction(self,
                           *,
@@ -160,39 +423,435 @@ class SMC(Contract):
                           gas: int=None,
                           value: int=0,
                           gas_price: int=None,
-                          data: bytes=None) -> Hash32:
+                          data: bytes=None,
+                          code_path: str=None) -> Hash32:
         if gas_price is None:
             gas_price = self.config['GAS_PRICE']
         if private_key is None:
-            private_key = self.private_key
-        if nonce is None:
-            nonce = self.web3.eth.getTransactionCount(private_key.public_key.to_checksum_address())
-        build_transaction_detail = make_transaction_context(
-            nonce=nonce,
-            gas=gas,
-            chain_id=chain_id,
-            value=value,
-            gas_price=gas_price,
-            data=data,
+            private_key = self.default_priv_key
+        transaction_kwargs = {
+            'func_name': func_name,
+            'args': args,
+            'chain_id': chain_id,
+            'gas': gas,
+            'value': value,
+            'gas_price': gas_price,
+            'data': data,
+        }  # type: Dict[str, Any]
+        if nonce is not None:
+            return self._estimate_and_send_transaction(
+                func_name,
+                self._build_transaction(nonce=nonce, **transaction_kwargs),
+                private_key,
+                code_path,
+            )
+
+        return self._send_with_local_nonce(
+            func_name,
+            transaction_kwargs,
+            private_key,
+            code_path,
         )
-        func_instance = getattr(self.functions, func_name)
-        unsigned_transaction = func_instance(*args).buildTransaction(
-            transaction=build_transaction_detail,
+
+    def _send_with_local_nonce(self,
+                               func_name: str,
+                               transaction_kwargs: Dict[str, Any],
+                               private_key: datatypes.PrivateKey,
+                               code_path: Optional[str],
+                               retries_stale_nonce: bool=True) -> Hash32:
+        """Send a transaction with a nonce allocated by the nonce manager.
+
+        The nonce is released if the transaction is not built or the node rejects
+        it. If the sending fails otherwise, e.g. on a timeout, the node may have
+        accepted the transaction, so the nonce is kept in flight and resynced
+        instead, see `NonceManager`. If the nonce turns out to be used already,
+        whatever the type of the error, the transaction is sent again once with
+        a new one.
+        """
+        sender_address = private_key.public_key.to_checksum_address()
+        nonce = self.nonce_manager.allocate(sender_address)
+        try:
+            unsigned_transaction = self._build_transaction(nonce=nonce, **transaction_kwargs)
+        except Exception:
+            self.nonce_manager.release(sender_address, nonce)
+            raise
+        try:
+            return self._estimate_and_send_transaction(
+                func_name,
+                unsigned_transaction,
+                private_key,
+                code_path,
+            )
+        except Exception as e:
+            # e.g. eth-tester raises the validation errors of py-evm
+            if not is_nonce_error(e):
+                if isinstance(e, ValueError):
+                    # The node answered with an error, the transaction is rejected
+                    self.nonce_manager.release(sender_address, nonce)
+                else:
+                    self.nonce_manager.resync(sender_address)
+                raise
+            if self.nonce_manager.resync(sender_address) <= nonce:
+                # The nonce is not used yet, e.g. it is ahead of the chain
+                self.nonce_manager.release(sender_address, nonce)
+                raise
+            if not retries_stale_nonce:
+                raise
+            self.logger.debug("Nonce %d of %s is stale, resynced: %s", nonce, sender_address, e)
+
+        # Retry once with a nonce after the ones used on chain
+        return self._send_with_local_nonce(
+            func_name,
+            transaction_kwargs,
+            private_key,
+            code_path,
+            retries_stale_nonce=False,
         )
-        signed_transaction_dict = self.web3.eth.account.signTransaction(
-            unsigned_transaction,
-            private_key.to_hex(),
+
+    def _get_sent_code_path(self, func_name: str, code_path: Optional[str]) -> str:
+        """Get the code path a `func_name` transaction is sent for, i.e. `code_path`
+        if the caller knows it, and the most expensive one otherwise as the code
+        path can not be told before mining.
+        """
+        if code_path is not None:
+            return code_path
+        return WORST_CASE_CODE_PATHS.get(func_name, DEFAULT_CODE_PATH)
+
+    def _get_gas(self, func_name: str, code_path: str=None) -> int:
+        """Get the gas limit of a `func_name` transaction, for the code path it
+        is sent for.
+        """
+        return self.gas_calibrator.get_gas(
+            func_name,
+            self._get_sent_code_path(func_name, code_path),
         )
-        tx_hash = self.web3.eth.sendRawTransaction(signed_transaction_dict['rawTransaction'])
-        return tx_hash
+
+    def _needs_gas_samples(self, func_name: str, code_path: str=None) -> bool:
+        # Only the transactions emitting a log can be recorded
+        return func_name in CALIBRATED_FUNCTION_NAMES and self.gas_calibrator.needs_samples(
+            func_name,
+            self._get_sent_code_path(func_name, code_path),
+        )
+
+    def _make_estimate_gas_params(self,
+                                  unsigned_transaction: Dict[str, Any],
+                                  sender_address: str) -> Dict[str, Any]:
+        return {
+            'from': sender_address,
+            'to': unsigned_transaction['to'],
+            'data': unsigned_transaction['data'],
+            'value': hex(unsigned_transaction['value']),
+        }
+
+    def _keep_gas_needed(self, tx_hash: Hash32, gas_needed: int, block_number: int) -> None:
+        with self._gas_needed_lock:
+            self._gas_needed[bytes(tx_hash)] = (gas_needed, block_number)
+            while len(self._gas_needed) > MAX_PENDING_GAS_ESTIMATES:
+                self._gas_needed.popitem(last=False)
+
+    def record_gas_used(self, receipt: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+        """Record the gas needed by a mined SMC transaction in the gas calibrator.
+
+        The gas needed is the `eth_estimateGas` of the transaction made while it
+        was sent, as the gasUsed of the receipt is net of the refunds and lower
+        than the gas limit the execution needs. Transactions are only estimated
+        while the calibrator `needs_samples` of the code path they are sent for.
+
+        The function and the code path of the transaction are told from its log
+        and the SMC logs of its period, only fetched for estimated transactions.
+        Returns them if recorded, or None, e.g. if the transaction is not mined
+        yet, was not estimated, was estimated on a block it was already mined in
+        or emitted no SMC log, i.e. it failed.
+        """
+        if receipt is None:
+            return None
+        with self._gas_needed_lock:
+            gas_estimate = self._gas_needed.pop(bytes(receipt['transactionHash']), None)
+        if gas_estimate is None:
+            return None
+        (gas_needed, estimated_block_number) = gas_estimate
+        if receipt['blockNumber'] <= estimated_block_number:
+            # Estimated as sent again on top of itself, i.e. on another code path
+            return None
+        logs = [
+            log for log in receipt['logs']
+            if is_same_address(log['address'], self.address)
+        ]
+        if not logs:
+            return None
+        log = logs[0]
+        func_name = get_function_name(log)
+
+        if func_name not in WORST_CASE_CODE_PATHS:
+            code_path = DEFAULT_CODE_PATH
+        else:
+            if func_name == 'submit_vote':
+                # Votes on the same shard
+                topics = [
+                    encode_hex(get_event_signature_from_abi('SubmitVote')),
+                    encode_hex(to_log_topic_shard_id(decode_log(log).shard_id)),
+                ]  # type: List[Any]
+            else:
+                topics = [[
+                    encode_hex(get_event_signature_from_abi(event_name))
+                    for event_name in SAMPLE_SIZE_UPDATE_EVENT_NAMES
+                ]]
+            period_length = self.config['PERIOD_LENGTH']
+            period_logs = get_logs(self.web3, {
+                'address': self.address,
+                'topics': topics,
+                'fromBlock': receipt['blockNumber'] // period_length * period_length,
+                'toBlock': receipt['blockNumber'],
+            })
+            code_path = get_code_path(log, period_logs, self.config['QUORUM_SIZE'])
+
+        # An estimate below the gasUsed was made on a cheaper code path than
+        # the one taken, e.g. the state changed before the transaction was mined
+        if gas_needed < receipt['gasUsed']:
+            return None
+        self.gas_calibrator.record(func_name, code_path, gas_needed)
+        return func_name, code_path
+
+    def _get_transaction_value(self, func_name: str) -> int:
+        if func_name == 'register_notary':
+            return self.config['NOTARY_DEPOSIT']
+        return 0
+
+    def _estimate_gas_in_bulk(self,
+                              unsigned_transactions: Sequence[Dict[str, Any]],
+                              estimated_transactions: Dict[int, Tuple[str, str]],
+                              ) -> Dict[int, Tuple[int, int]]:
+        """Estimate the gas needed by the `{index: (func_name, sender_address)}`
+        transactions of `unsigned_transactions` in one batch request.
+
+        Returns `{index: (gas_needed, block_number)}`, with the number of the
+        block the transaction was estimated on. Transactions whose estimate
+        fails, e.g. they would fail, are left out.
+        """
+        indices = sorted(estimated_transactions)
+        try:
+            block_number = self.web3.eth.blockNumber
+            # The estimates are pinned to a block, so that `record_gas_used` can
+            # tell the ones made once the transaction was mined. eth-tester takes
+            # no block and estimates on the latest one, see `_start_gas_estimates`.
+            if has_eth_tester_provider(self.web3):
+                block_params = []  # type: List[Any]
+            else:
+                block_params = [hex(block_number)]
+            results = make_batch_request(
+                self.web3,
+                [
+                    ('eth_estimateGas', [self._make_estimate_gas_params(
+                        unsigned_transactions[index],
+                        estimated_transactions[index][1],
+                    )] + block_params)
+                    for index in indices
+                ],
+                return_errors=True,
+            )
+        except Exception as e:
+            self.logger.debug("Failed to estimate the gas of the transactions: %s", e)
+            return {}
+
+        gas_estimates = {}  # type: Dict[int, Tuple[int, int]]
+        for (index, result) in zip(indices, results):
+            if isinstance(result, Exception):
+                self.logger.debug("Failed to estimate the gas of transaction %d: %s", index, result)
+                continue
+            gas_needed = int(result, 16) if isinstance(result, str) else result
+            gas_estimates[index] = (gas_needed, block_number)
+        return gas_estimates
+
+    def _start_gas_estimates(self,
+                             unsigned_transactions: Sequence[Dict[str, Any]],
+                             estimated_transactions: Dict[int, Tuple[str, str]],
+                             tx_hashes: Sequence[Hash32]) -> None:
+        """Estimate the gas needed by transactions about to be sent, see
+        `_estimate_gas_in_bulk`, and keep the estimates by tx hash once done.
+
+        The estimates run on the estimate executor, not to delay the sending.
+        eth-tester runs in process, so there is no round trip to save, and it can
+        only estimate on the latest block, which may already have the
+        transaction once sent, so the estimates are made before sending instead.
+        """
+        if has_eth_tester_provider(self.web3):
+            self._keep_gas_estimates(
+                tx_hashes,
+                self._estimate_gas_in_bulk(unsigned_transactions, estimated_transactions),
+            )
+            return
+        try:
+            estimate = self._gas_estimate_executor.submit(
+                self._estimate_gas_in_bulk,
+                unsigned_transactions,
+                estimated_transactions,
+            )
+        except RuntimeError:
+            # The handler is closed
+            return
+        estimate.add_done_callback(functools.partial(self._on_gas_estimated, tx_hashes))
+
+    def _on_gas_estimated(self, tx_hashes: Sequence[Hash32], estimate: Future) -> None:
+        self._keep_gas_estimates(tx_hashes, estimate.result())
+
+    def _keep_gas_estimates(self,
+                            tx_hashes: Sequence[Hash32],
+                            gas_estimates: Dict[int, Tuple[int, int]]) -> None:
+        # Estimates of transactions the node rejects are never recorded, and
+        # dropped past `MAX_PENDING_GAS_ESTIMATES`
+        for (index, (gas_needed, block_number)) in gas_estimates.items():
+            self._keep_gas_needed(tx_hashes[index], gas_needed, block_number)
+
+    def _get_signing_pool(self, num_workers: int) -> ProcessPoolExecutor:
+        with self._signing_pools_lock:
+            if num_workers not in self._signing_pools:
+                self._signing_pools[num_workers] = ProcessPoolExecutor(max_workers=num_workers)
+            return self._signing_pools[num_workers]
+
+    def _sign_transactions(self,
+                           unsigned_transactions: Sequence[Dict[str, Any]],
+                           private_keys: Sequence[bytes],
+                           max_workers: Optional[int]) -> List[bytes]:
+        num_workers = max_workers or os.cpu_count() or 1
+        if num_workers == 1 or len(unsigned_transactions) <= 1:
+            return list(map(sign_transaction, unsigned_transactions, private_keys))
+        signing_pool = self._get_signing_pool(num_workers)
+        try:
+            return list(signing_pool.map(
+                sign_transaction,
+                unsigned_transactions,
+                private_keys,
+                chunksize=max(1, len(unsigned_transactions) // (num_workers * 4)),
+            ))
+        except BrokenProcessPool:
+            # A worker died, the next call starts a new pool
+            with self._signing_pools_lock:
+                if self._signing_pools.get(num_workers) is signing_pool:
+                    del self._signing_pools[num_workers]
+            raise
+
+    def send_transactions_in_bulk(self,
+                                  transactions: Iterable[Tuple[datatypes.PrivateKey,
+                                                               str,
+                                                               Sequence[Any]]],
+                                  gas_price: int=None,
+                                  max_workers: int=None,
+                                  code_path: str=None) -> List[Union[Hash32, Exception]]:
+        """Send many `(private_key, func_name, args)` transactions at once.
+
+        Nonces are allocated locally in the given order, the transactions are
+        signed in parallel on a process pool of `max_workers` processes (by
+        default one per CPU, no pool if 1), kept until `close`, and then sent as
+        one batch request.
+
+        Returns, in the given order, the hash of each transaction the node
+        accepted, or the error it was not sent with. The nonces of the rejected
+        transactions are given back, or resynced if they turn out to be used
+        already. If anything fails before sending, the nonces allocated are
+        given back and the error is raised. If the batch request fails as a
+        whole, e.g. on a timeout, the node may have some of the transactions, so
+        the nonces are kept in flight and resynced, see `NonceManager`, and the
+        error is raised.
+
+        `code_path` is the code path the transactions are known to take, if any,
+        see `_get_gas`.
+        """
+        if gas_price is None:
+            gas_price = self.config['GAS_PRICE']
+        transactions = list(transactions)
+        # (sender_address, nonce) allocated, in order
+        allocated_nonces = []  # type: List[Tuple[str, int]]
+        is_sending = False
+        try:
+            unsigned_transactions = []
+            private_keys = []
+            # index -> (func_name, sender_address) of the transactions to estimate
+            estimated_transactions = {}  # type: Dict[int, Tuple[str, str]]
+            for (index, (private_key, func_name, args)) in enumerate(transactions):
+                sender_address = private_key.public_key.to_checksum_address()
+                nonce = self.nonce_manager.allocate(sender_address)
+                allocated_nonces.append((sender_address, nonce))
+                if self._needs_gas_samples(func_name, code_path):
+                    estimated_transactions[index] = (func_name, sender_address)
+                unsigned_transactions.append(self._build_transaction(
+                    func_name=func_name,
+                    args=args,
+                    nonce=nonce,
+                    gas=self._get_gas(func_name, code_path),
+                    value=self._get_transaction_value(func_name),
+                    gas_price=gas_price,
+                ))
+                private_keys.append(private_key.to_bytes())
+
+            raw_transactions = self._sign_transactions(
+                unsigned_transactions,
+                private_keys,
+                max_workers,
+            )
+            if estimated_transactions:
+                self._start_gas_estimates(
+                    unsigned_transactions,
+                    estimated_transactions,
+                    [Hash32(keccak(raw_transaction)) for raw_transaction in raw_transactions],
+                )
+
+            is_sending = True
+            results = make_batch_request(
+                self.web3,
+                [
+                    ('eth_sendRawTransaction', [encode_hex(raw_transaction)])
+                    for raw_transaction in raw_transactions
+                ],
+                return_errors=True,
+            )
+        except Exception:
+            if not is_sending:
+                for (sender_address, nonce) in reversed(allocated_nonces):
+                    self.nonce_manager.release(sender_address, nonce)
+            else:
+                for sender_address in set(sender for (sender, _) in allocated_nonces):
+                    self.nonce_manager.resync(sender_address)
+            raise
+
+        tx_hashes = [None] * len(results)  # type: List[Union[Hash32, Exception]]
+        failed = []  # type: List[int]
+        for (index, (result, raw_transaction)) in enumerate(zip(results, raw_transactions)):
+            if not isinstance(result, Exception):
+                tx_hashes[index] = (
+                    Hash32(decode_hex(result)) if isinstance(result, str) else result
+                )
+            elif is_known_transaction_error(result):
+                # The node already has this very transaction, so it is sent
+                tx_hashes[index] = Hash32(keccak(raw_transaction))
+            else:
+                tx_hashes[index] = result
+                failed.append(index)
+        # Given back in reverse order, so that the latest ones roll back the local nonce
+        for index in reversed(failed):
+            (sender_address, nonce) = allocated_nonces[index]
+            self._on_failed_send(sender_address, nonce, results[index])
+        return tx_hashes
+
+    def _on_failed_send(self, sender_address: str, nonce: int, error: Exception) -> None:
+        """Give back the nonce of a transaction the node rejected, unless it is
+        used already, or resync it if the node may have the transaction.
+        """
+        if is_nonce_error(error):
+            if self.nonce_manager.resync(sender_address) <= nonce:
+                self.nonce_manager.release(sender_address, nonce)
+        elif isinstance(error, ValueError):
+            self.nonce_manager.release(sender_address, nonce)
+        else:
+            self.nonce_manager.resync(sender_address)
 
     #
     # Transactions
     #
     def register_notary(self,
                         private_key: datatypes.PrivateKey=None,
-                        gas_price: int=None) -> Hash32:
-        gas = self._estimate_gas_dict['register_notary']
+                        gas_price: int=None,
+                        code_path: str=None) -> Hash32:
+        gas = self._get_gas('register_notary', code_path)
         tx_hash = self._send_transaction(
             func_name='register_notary',
             args=[],
@@ -200,26 +859,29 @@ class SMC(Contract):
             value=self.config['NOTARY_DEPOSIT'],
             gas=gas,
             gas_price=gas_price,
+            code_path=code_path,
         )
         return tx_hash
 
     def deregister_notary(self,
                           private_key: datatypes.PrivateKey=None,
-                          gas_price: int=None) -> Hash32:
-        gas = self._estimate_gas_dict['deregister_notary']
+                          gas_price: int=None,
+                          code_path: str=None) -> Hash32:
+        gas = self._get_gas('deregister_notary', code_path)
         tx_hash = self._send_transaction(
             func_name='deregister_notary',
             args=[],
             private_key=private_key,
             gas=gas,
             gas_price=gas_price,
+            code_path=code_path,
         )
         return tx_hash
 
     def release_notary(self,
                        private_key: datatypes.PrivateKey=None,
                        gas_price: int=None) -> Hash32:
-        gas = self._estimate_gas_dict['release_notary']
+        gas = self._get_gas('release_notary')
         tx_hash = self._send_transaction(
             func_name='release_notary',
             args=[],
@@ -235,18 +897,21 @@ class SMC(Contract):
                    period: int,
                    chunk_root: Hash32,
                    private_key: datatypes.PrivateKey=None,
-                   gas_price: int=None) -> Hash32:
-        gas = self._estimate_gas_dict['add_header']
+                   gas_price: int=None,
+                   code_path: str=None) -> Hash32:
+        args = [
+            shard_id,
+            period,
+            chunk_root,
+        ]
+        gas = self._get_gas('add_header', code_path)
         tx_hash = self._send_transaction(
             func_name='add_header',
-            args=[
-                shard_id,
-                period,
-                chunk_root,
-            ],
+            args=args,
             private_key=private_key,
             gas=gas,
             gas_price=gas_price,
+            code_path=code_path,
         )
         return tx_hash
 
@@ -257,18 +922,21 @@ class SMC(Contract):
                     chunk_root: Hash32,
                     index: int,
                     private_key: datatypes.PrivateKey=None,
-                    gas_price: int=None) -> Hash32:
-        gas = self._estimate_gas_dict['submit_vote']
+                    gas_price: int=None,
+                    code_path: str=None) -> Hash32:
+        args = [
+            shard_id,
+            period,
+            chunk_root,
+            index,
+        ]
+        gas = self._get_gas('submit_vote', code_path)
         tx_hash = self._send_transaction(
             func_name='submit_vote',
-            args=[
-                shard_id,
-                period,
-                chunk_root,
-                index,
-            ],
+            args=args,
             private_key=private_key,
             gas=gas,
             gas_price=gas_price,
+            code_path=code_path,
         )
         return tx_hash
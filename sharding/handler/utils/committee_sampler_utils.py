@@ -0,0 +1,78 @@
+from typing import (
+    Dict,
+    List,
+    Sequence,
+    Tuple,
+)
+
+from eth_utils import (
+    keccak,
+)
+from eth_typing import (
+    Hash32,
+)
+
+
+def get_entropy_block_number(period: int, period_length: int) -> int:
+    """Get the block whose hash seeds the committee sampling of `period`.
+    """
+    if period <= 0:
+        raise ValueError("There is no entropy block for period {}".format(period))
+    return period * period_length - 1
+
+
+def get_committee(entropy_block_hash: Hash32,
+                  shard_id: int,
+                  sample_size: int,
+                  committee_size: int) -> Tuple[int, ...]:
+    """Get the notary pool index sampled for each committee index of one shard.
+
+    This is the same sampling as `get_member_of_committee` in the SMC, i.e.
+    `keccak(entropy_block_hash + bytes32(shard_id) + bytes32(index)) % sample_size`.
+    """
+    if sample_size <= 0:
+        raise ValueError("Can not sample from an empty notary pool")
+    prefix = bytes(entropy_block_hash) + shard_id.to_bytes(32, byteorder='big')
+    return tuple(
+        int.from_bytes(keccak(prefix + index.to_bytes(32, byteorder='big')), 'big') % sample_size
+        for index in range(committee_size)
+    )
+
+
+def get_committees(entropy_block_hash: Hash32,
+                   sample_size: int,
+                   shard_count: int,
+                   committee_size: int) -> Tuple[Tuple[int, ...], ...]:
+    """Get the committees of all shards, indexed by shard id then committee index.
+    """
+    if sample_size <= 0:
+        raise ValueError("Can not sample from an empty notary pool")
+    entropy_block_hash = bytes(entropy_block_hash)
+    index_suffixes = tuple(
+        index.to_bytes(32, byteorder='big')
+        for index in range(committee_size)
+    )
+    committees = []
+    for shard_id in range(shard_count):
+        prefix = entropy_block_hash + shard_id.to_bytes(32, byteorder='big')
+        committees.append(tuple(
+            int.from_bytes(keccak(prefix + suffix), 'big') % sample_size
+            for suffix in index_suffixes
+        ))
+    return tuple(committees)
+
+
+def get_committee_index(committees: Sequence[Sequence[int]]) -> Dict[int, List[Tuple[int, int]]]:
+    """Invert the committees into the `(shard_id, index)` assignments of each pool index.
+
+    Pool indices not sampled in any committee are not in the result. The
+    assignments of a pool index are in (shard_id, index) order.
+    """
+    committee_index = {}  # type: Dict[int, List[Tuple[int, int]]]
+    for (shard_id, committee) in enumerate(committees):
+        for (index, pool_index) in enumerate(committee):
+            if pool_index in committee_index:
+                committee_index[pool_index].append((shard_id, index))
+            else:
+                committee_index[pool_index] = [(shard_id, index)]
+    return committee_index
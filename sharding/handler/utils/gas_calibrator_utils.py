@@ -0,0 +1,91 @@
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+)
+
+from sharding.handler.utils.log_handler_utils import (
+    get_log_position,
+)
+from sharding.handler.utils.log_parser import (
+    decode_log,
+)
+
+
+DEFAULT_CODE_PATH = 'default'
+# `register_notary`, `deregister_notary` or `add_header` updating the notary
+# sample size, i.e. the first of them in a period
+FIRST_IN_PERIOD_CODE_PATH = 'first_in_period'
+# `submit_vote` reaching the quorum and electing the collation
+QUORUM_VOTE_CODE_PATH = 'quorum_vote'
+
+# Most expensive code path of the functions with more than one, assumed when
+# the code path of a transaction can not be predicted
+WORST_CASE_CODE_PATHS = {
+    'register_notary': FIRST_IN_PERIOD_CODE_PATH,
+    'deregister_notary': FIRST_IN_PERIOD_CODE_PATH,
+    'add_header': FIRST_IN_PERIOD_CODE_PATH,
+    'submit_vote': QUORUM_VOTE_CODE_PATH,
+}  # type: Dict[str, str]
+
+# SMC function emitting each event
+EVENT_FUNCTION_NAMES = {
+    'RegisterNotary': 'register_notary',
+    'DeregisterNotary': 'deregister_notary',
+    'ReleaseNotary': 'release_notary',
+    'AddHeader': 'add_header',
+    'SubmitVote': 'submit_vote',
+}  # type: Dict[str, str]
+
+# SMC functions whose gas can be calibrated, i.e. whose transactions emit a log
+CALIBRATED_FUNCTION_NAMES = frozenset(EVENT_FUNCTION_NAMES.values())
+
+# Events of the functions which update the notary sample size
+SAMPLE_SIZE_UPDATE_EVENT_NAMES = ('RegisterNotary', 'DeregisterNotary', 'AddHeader')
+
+
+def get_function_name(log: Dict[str, Any]) -> str:
+    """Get the SMC function whose transaction emitted `log`.
+    """
+    return EVENT_FUNCTION_NAMES[decode_log(log).event_name]
+
+
+def get_code_path(log: Dict[str, Any],
+                  period_logs: Iterable[Dict[str, Any]],
+                  quorum_size: int) -> str:
+    """Get the code path taken by the transaction which emitted `log`.
+
+    `period_logs` are the SMC logs emitted in the period of `log` up to its
+    block: the `SAMPLE_SIZE_UPDATE_EVENT_NAMES` logs for the sample size
+    updating functions and the `SubmitVote` logs of the shard for votes. Logs
+    after `log` are ignored.
+
+    NOTE: a direct call to `update_notary_sample_size` emits no log, so a
+    transaction after it in the same period is taken as the first one.
+    """
+    event = decode_log(log)
+    function_name = EVENT_FUNCTION_NAMES[event.event_name]
+    position = get_log_position(log)
+    earlier_events = [
+        decode_log(period_log)
+        for period_log in period_logs
+        if get_log_position(period_log) < position
+    ]
+
+    if function_name == 'submit_vote':
+        vote_count = 1 + sum(
+            1 for earlier_event in earlier_events
+            if earlier_event.event_name == 'SubmitVote'
+            if (earlier_event.shard_id, earlier_event.period) == (event.shard_id, event.period)
+        )
+        # The collation is elected by the vote reaching the quorum
+        if vote_count == quorum_size:
+            return QUORUM_VOTE_CODE_PATH
+    elif function_name in WORST_CASE_CODE_PATHS:
+        is_first_in_period = not any(
+            earlier_event.event_name in SAMPLE_SIZE_UPDATE_EVENT_NAMES
+            for earlier_event in earlier_events
+        )
+        if is_first_in_period:
+            return FIRST_IN_PERIOD_CODE_PATH
+    return DEFAULT_CODE_PATH
@@ -0,0 +1,169 @@
+import collections
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from requests.exceptions import (
+    Timeout,
+)
+
+from eth_utils import (
+    decode_hex,
+)
+
+
+# Fragments of the error messages returned by nodes that refuse to serve a
+# block range because the query is too expensive.
+TOO_LARGE_RANGE_ERROR_MESSAGES = (
+    'query returned more than',
+    'query timeout exceeded',
+    'log response size exceeded',
+    'block range is too large',
+    'block range is too wide',
+    'exceed maximum block range',
+)
+
+
+def is_too_large_range_error(error: Exception) -> bool:
+    """Check if the error means the node rejected the block range as too large.
+    """
+    if isinstance(error, Timeout):
+        return True
+    if not isinstance(error, ValueError) or not error.args:
+        return False
+    rpc_error = error.args[0]
+    if isinstance(rpc_error, dict):
+        message = str(rpc_error.get('message', ''))
+    else:
+        message = str(rpc_error)
+    message = message.lower()
+    return any(fragment in message for fragment in TOO_LARGE_RANGE_ERROR_MESSAGES)
+
+
+# JSON-RPC error code of invalid method parameters
+INVALID_PARAMS_ERROR_CODE = -32602
+# Fragments of the error messages returned by nodes that refuse the parameters
+# of a query, e.g. OR-lists of topics they do not support.
+INVALID_PARAMS_ERROR_MESSAGES = (
+    'invalid argument',
+    'invalid params',
+    'invalid topic',
+    'cannot unmarshal array',
+)
+
+
+def is_invalid_params_error(error: Exception) -> bool:
+    """Check if the error means the node rejected the parameters of the query.
+    """
+    if not isinstance(error, ValueError) or not error.args:
+        return False
+    rpc_error = error.args[0]
+    if isinstance(rpc_error, dict):
+        if rpc_error.get('code') == INVALID_PARAMS_ERROR_CODE:
+            return True
+        message = str(rpc_error.get('message', ''))
+    else:
+        message = str(rpc_error)
+    message = message.lower()
+    return any(fragment in message for fragment in INVALID_PARAMS_ERROR_MESSAGES)
+
+
+def get_chunk_end(start: int, to_block: int, period_length: int, num_periods: int) -> int:
+    """Get the last block of the chunk starting at `start`.
+
+    The chunk ends on a period boundary, `num_periods` periods later, unless
+    `to_block` comes first.
+    """
+    return min(to_block, (start // period_length + num_periods) * period_length - 1)
+
+
+def split_block_range(start: int, end: int, period_length: int) -> Tuple[Tuple[int, int], ...]:
+    """Split a block range in two, on a period boundary if it spans several periods.
+    """
+    first_period = start // period_length
+    last_period = end // period_length
+    if first_period < last_period:
+        middle = ((first_period + last_period + 1) // 2) * period_length - 1
+    else:
+        middle = (start + end) // 2
+    return ((start, middle), (middle + 1, end))
+
+
+def get_log_position(log: Dict[str, Any]) -> Tuple[int, int, int]:
+    # Some nodes, e.g. eth-tester, number logs per transaction instead of per
+    # block, so the transaction index comes before the log index
+    return (log['blockNumber'], log['transactionIndex'], log['logIndex'])
+
+
+def sort_logs(logs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sort logs in chain order, i.e. by block number, transaction index then
+    log index.
+    """
+    return sorted(logs, key=get_log_position)
+
+
+def has_topic_or_lists(topics: Optional[Sequence[Union[str, List[str], None]]]) -> bool:
+    if not topics:
+        return False
+    return any(isinstance(topic, (list, tuple)) for topic in topics)
+
+
+def widen_topic_or_lists(topics: Sequence[Union[str, List[str], None]]
+                         ) -> List[Optional[str]]:
+    """Replace the OR-lists of a topic filter by any topic.
+    """
+    return [None if isinstance(topic, (list, tuple)) else topic for topic in topics]
+
+
+def split_topic_filter(topics: Sequence[Union[str, List[str], None]]
+                       ) -> List[List[Optional[str]]]:
+    """Split a topic filter with OR-lists into filters without them.
+
+    Not every node supports OR-lists of topics, e.g. eth-tester reads a nested
+    list as a list of whole filters. There is one filter per alternative of the
+    first topic, and the OR-lists of the other topics are widened to any
+    topic, so the logs must then be checked with `match_topics`.
+    """
+    other_topics = widen_topic_or_lists(topics[1:])
+    first_topic = topics[0]
+    if not isinstance(first_topic, (list, tuple)):
+        first_topics = [first_topic]  # type: List[Optional[str]]
+    elif None in first_topic:
+        first_topics = [None]
+    else:
+        # Duplicates would fetch the same logs twice
+        first_topics = list(collections.OrderedDict.fromkeys(first_topic))
+    return [[topic] + other_topics for topic in first_topics]
+
+
+def _to_topic_bytes(topic: Union[bytes, str]) -> bytes:
+    if isinstance(topic, str):
+        return decode_hex(topic)
+    return bytes(topic)
+
+
+def match_topics(log: Dict[str, Any],
+                 topics: Optional[Sequence[Union[str, List[str], None]]]) -> bool:
+    """Check if the topics of `log` match the topic filter `topics`.
+    """
+    if not topics:
+        return True
+    log_topics = [_to_topic_bytes(topic) for topic in log['topics']]
+    if len(log_topics) < len(topics):
+        return False
+    for (log_topic, topic) in zip(log_topics, topics):
+        if topic is None:
+            continue
+        if isinstance(topic, (list, tuple)):
+            if None not in topic and log_topic not in [_to_topic_bytes(item) for item in topic]:
+                return False
+        elif log_topic != _to_topic_bytes(topic):
+            return False
+    return True
@@ -1,7 +1,13 @@
+import array
+import collections
+import functools
+import sys
 from typing import (
     Any,
+    Callable,
     Dict,
     List,
+    Sequence,
     Tuple,
     Union,
 )
@@ -16,66 +22,219 @@ from eth_typing import (
 )
 
 from sharding.contracts.utils.smc_utils import (
-    get_smc_json,
+    get_smc_artifact,
 )
 from sharding.handler.exceptions import (
     LogParsingError,
 )
 
 
-class LogParser(object):
-    def __init__(self, *, event_name: str, log: Dict[str, Any]) -> None:
-        event_abi = self._extract_event_abi(event_name=event_name)
+# Decoders of the event inputs, with the position of the input
+FieldDecoders = List[Tuple[int, Callable[[bytes], Any]]]
 
-        topics = []
-        data = []
-        for item in event_abi["inputs"]:
-            if item['indexed'] is True:
-                topics.append((item['name'], item['type']))
-            else:
-                data.append((item['name'], item['type']))
 
-        self._set_topic_value(topics=topics, log=log)
-        self._set_data_value(data=data, log=log)
+def _to_bytes(val: Union[bytes, str]) -> bytes:
+    if isinstance(val, str):
+        return decode_hex(val)
+    return val
 
-    def _extract_event_abi(self, *, event_name: str) -> Dict[str, Any]:
-        for func in get_smc_json()['abi']:
-            if func['name'] == event_name and func['type'] == 'event':
-                return func
-        raise LogParsingError("Can not find event {}".format(event_name))
 
-    def _set_topic_value(self, *, topics: List[Tuple[str, Any]], log: Dict[str, Any]) -> None:
-        if len(topics) != len(log['topics'][1:]):
+def _decode_bool(val: bytes) -> bool:
+    return bool(big_endian_to_int(val))
+
+
+def _decode_address(val: bytes) -> Address:
+    return to_canonical_address(val[-20:])
+
+
+def _decode_bytes32(val: bytes) -> bytes:
+    return bytes(val)
+
+
+def _get_value_decoder(val_type: str) -> Callable[[bytes], Any]:
+    if val_type == 'bool':
+        return _decode_bool
+    elif val_type == 'address':
+        return _decode_address
+    elif val_type == 'bytes32':
+        return _decode_bytes32
+    elif 'int' in val_type:
+        return big_endian_to_int
+    else:
+        raise LogParsingError(
+            "Error parsing the type of given value. Expect bool/address/bytes32/int*"
+            "but get {}.".format(val_type)
+        )
+
+
+def _decode_int_column(words: bytes, num_words: int) -> Sequence[int]:
+    # Every value must fit in 64 bits, so the low 8 bytes of all words are
+    # joined and loaded into an array in one go.
+    high_bytes = b''.join(words[i * 32: i * 32 + 24] for i in range(num_words))
+    if high_bytes.count(0) != len(high_bytes):
+        raise LogParsingError(
+            "Error parsing log integers, values do not fit in 64 bits, "
+            "decode them with packed=False instead."
+        )
+    column = array.array('Q', b''.join(words[i * 32 + 24: (i + 1) * 32] for i in range(num_words)))
+    if sys.byteorder == 'little':
+        column.byteswap()
+    return column
+
+
+def _decode_column(val_type: str, words: bytes, num_words: int, packed: bool) -> Sequence[Any]:
+    if val_type == 'bool':
+        return [words[i * 32: (i + 1) * 32].count(0) != 32 for i in range(num_words)]
+    elif val_type == 'address':
+        return [words[i * 32 + 12: (i + 1) * 32] for i in range(num_words)]
+    elif val_type == 'bytes32':
+        return [words[i * 32: (i + 1) * 32] for i in range(num_words)]
+    elif 'int' in val_type:
+        if packed:
+            return _decode_int_column(words, num_words)
+        return [big_endian_to_int(words[i * 32: (i + 1) * 32]) for i in range(num_words)]
+    else:
+        raise LogParsingError(
+            "Error parsing the type of given value. Expect bool/address/bytes32/int*"
+            "but get {}.".format(val_type)
+        )
+
+
+def _make_event_record_type(event_name: str, field_names: Tuple[str, ...]) -> type:
+    base = collections.namedtuple(event_name, field_names)  # type: ignore
+    return type(event_name, (base,), {'__slots__': (), 'event_name': event_name})
+
+
+class EventLogDecoder:
+    """Decoder of one SMC event, compiled from the event ABI once.
+
+    Calling the decoder on a raw log returns an immutable record whose fields
+    are the event inputs in ABI order, e.g. ``AddHeader(period, shard_id, chunk_root)``.
+    """
+
+    def __init__(self, event_abi: Dict[str, Any]) -> None:
+        self.event_name = event_abi['name']  # type: str
+        field_names = tuple(item['name'] for item in event_abi['inputs'])
+        self.record_type = _make_event_record_type(self.event_name, field_names)
+
+        topic_decoders = []  # type: FieldDecoders
+        data_decoders = []  # type: FieldDecoders
+        column_specs = []
+        for (position, item) in enumerate(event_abi['inputs']):
+            decoder = (position, _get_value_decoder(item['type']))
+            if item['indexed'] is True:
+                column_specs.append((item['name'], item['type'], True, len(topic_decoders)))
+                topic_decoders.append(decoder)
+            else:
+                column_specs.append((item['name'], item['type'], False, len(data_decoders)))
+                data_decoders.append(decoder)
+        self._column_specs = tuple(column_specs)
+        self._topic_decoders = tuple(topic_decoders)
+        self._data_decoders = tuple(data_decoders)
+        self._num_fields = len(field_names)
+        self._data_size = len(data_decoders) * 32
+
+    def __call__(self, log: Dict[str, Any]) -> Any:
+        topics = log['topics']
+        if len(self._topic_decoders) != len(topics) - 1:
             raise LogParsingError(
                 "Error parsing log topics, expect"
-                "{} topics but get {}.".format(len(topics), len(log['topics'][1:]))
+                "{} topics but get {}.".format(len(self._topic_decoders), len(topics[1:]))
             )
-        for (i, topic) in enumerate(topics):
-            val = self._parse_value(val_type=topic[1], val=log['topics'][i + 1])
-            setattr(self, topic[0], val)
-
-    def _set_data_value(self, *, data: List[Tuple[str, Any]], log: Dict[str, Any]) -> None:
-        data_bytes = decode_hex(log['data'])
-        if len(data) * 32 != len(data_bytes):
+        data_bytes = _to_bytes(log['data'])
+        if self._data_size != len(data_bytes):
             raise LogParsingError(
                 "Error parsing log data, expect"
-                "{} data but get {}.".format(len(data), len(data_bytes))
-            )
-        for (i, (name, type_)) in enumerate(data):
-            val = self._parse_value(val_type=type_, val=data_bytes[i * 32: (i + 1) * 32])
-            setattr(self, name, val)
-
-    def _parse_value(self, *, val_type: str, val: bytes) -> Union[bool, Address, bytes, int]:
-        if val_type == 'bool':
-            return bool(big_endian_to_int(val))
-        elif val_type == 'address':
-            return to_canonical_address(val[-20:])
-        elif val_type == 'bytes32':
-            return val
-        elif 'int' in val_type:
-            return big_endian_to_int(val)
-        else:
-            raise LogParsingError(
-                "Error parsing the type of given value. Expect bool/address/bytes32/int*"
-                "but get {}.".format(val_type)
+                "{} data but get {}.".format(len(self._data_decoders), len(data_bytes))
             )
+
+        values = [None] * self._num_fields
+        for (i, (position, decoder)) in enumerate(self._topic_decoders):
+            values[position] = decoder(_to_bytes(topics[i + 1]))
+        for (i, (position, decoder)) in enumerate(self._data_decoders):
+            values[position] = decoder(data_bytes[i * 32: (i + 1) * 32])
+        return self.record_type(*values)
+
+    def decode_columns(self,
+                       logs: Sequence[Dict[str, Any]],
+                       packed: bool=True) -> Dict[str, Sequence[Any]]:
+        """Decode a batch of logs into one column per event input.
+
+        Integer columns are `array.array('Q')`, so their values must fit in
+        64 bits, or `LogParsingError` is raised. With `packed=False` they are
+        lists of ints instead, for larger values. Integers are decoded unsigned,
+        as by `decode_log`. Address columns hold 20-byte values and bytes32
+        columns 32-byte values.
+        The data of all logs is decoded as one contiguous buffer instead of
+        building a record per log.
+        """
+        num_logs = len(logs)
+        num_topics = len(self._topic_decoders)
+        for log in logs:
+            if num_topics != len(log['topics']) - 1:
+                raise LogParsingError(
+                    "Error parsing log topics, expect"
+                    "{} topics but get {}.".format(num_topics, len(log['topics'][1:]))
+                )
+
+        data_chunks = [_to_bytes(log['data']) for log in logs]
+        for data_bytes in data_chunks:
+            if self._data_size != len(data_bytes):
+                raise LogParsingError(
+                    "Error parsing log data, expect"
+                    "{} data but get {}.".format(len(self._data_decoders), len(data_bytes))
+                )
+        data_buffer = b''.join(data_chunks)
+        stride = self._data_size
+
+        columns = {}  # type: Dict[str, Sequence[Any]]
+        for (name, val_type, is_indexed, index) in self._column_specs:
+            if is_indexed:
+                words = b''.join(_to_bytes(log['topics'][index + 1]) for log in logs)
+            else:
+                words = b''.join(
+                    data_buffer[offset: offset + 32]
+                    for offset in range(index * 32, len(data_buffer), stride)
+                )
+            columns[name] = _decode_column(val_type, words, num_logs, packed)
+        return columns
+
+
+@functools.lru_cache(maxsize=None)
+def get_event_log_decoder(event_name: str) -> EventLogDecoder:
+    try:
+        event_abi = get_smc_artifact().event_abis[event_name]
+    except KeyError:
+        raise LogParsingError("Can not find event {}".format(event_name))
+    return EventLogDecoder(event_abi)
+
+
+def get_event_log_decoder_by_topic(topic: bytes) -> EventLogDecoder:
+    try:
+        event_abi = get_smc_artifact().event_abis_by_topic[bytes(topic)]
+    except KeyError:
+        raise LogParsingError("Can not find event with topic {}".format(topic))
+    return get_event_log_decoder(event_abi['name'])
+
+
+def decode_log_columns(event_name: str,
+                       logs: Sequence[Dict[str, Any]],
+                       packed: bool=True) -> Dict[str, Sequence[Any]]:
+    """Decode the logs of one event, e.g. a whole `get_logs` result, into columns.
+    """
+    return get_event_log_decoder(event_name).decode_columns(logs, packed)
+
+
+def decode_log(log: Dict[str, Any]) -> Any:
+    """Decode a log of any SMC event, dispatching on its first topic.
+    """
+    if not log['topics']:
+        raise LogParsingError("Error parsing log topics, anonymous logs are not supported.")
+    return get_event_log_decoder_by_topic(_to_bytes(log['topics'][0]))(log)
+
+
+class LogParser(object):
+    def __init__(self, *, event_name: str, log: Dict[str, Any]) -> None:
+        record = get_event_log_decoder(event_name)(log)
+        for (name, value) in zip(record._fields, record):
+            setattr(self, name, value)
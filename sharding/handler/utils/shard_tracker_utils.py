@@ -1,9 +1,14 @@
+import collections
 from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
     Union,
 )
 
 from eth_utils import (
-    event_abi_to_log_topic,
     to_checksum_address,
 )
 from eth_typing import (
@@ -11,7 +16,27 @@ from eth_typing import (
 )
 
 from sharding.contracts.utils.smc_utils import (
-    get_smc_json,
+    get_smc_artifact,
+)
+
+
+# Events of the notary registry, indexed by notary address
+NOTARY_EVENT_NAMES = ('RegisterNotary', 'DeregisterNotary', 'ReleaseNotary')
+# Events of collations, indexed by shard id
+SHARD_EVENT_NAMES = ('AddHeader', 'SubmitVote')
+
+
+# Header and votes of one shard in one period
+PeriodSummary = collections.namedtuple(
+    'PeriodSummary',
+    (
+        'period',
+        'is_new_header_added',
+        'chunk_root',
+        'vote_count',
+        'voters',
+        'has_enough_vote',
+    ),
 )
 
 
@@ -20,7 +45,60 @@ def to_log_topic_address(address: Union[Address, str]) -> str:
 
 
 def get_event_signature_from_abi(event_name: str) -> bytes:
-    for function in get_smc_json()['abi']:
-        if function['name'] == event_name and function['type'] == 'event':
-            return event_abi_to_log_topic(function)
-    raise ValueError("Event with name {} not found".format(event_name))
+    return get_smc_artifact().get_event_topic(event_name)
+
+
+def to_log_topic_shard_id(shard_id: int) -> bytes:
+    return shard_id.to_bytes(32, byteorder='big')
+
+
+def decide_period_block_number(from_period: Optional[int],
+                               to_period: Optional[int],
+                               period_length: int) -> Tuple[Optional[int], Optional[int]]:
+    """Get the first block of `from_period` and the last block of `to_period`.
+    """
+    if from_period is None:
+        from_block = None
+    else:
+        from_block = from_period * period_length
+
+    if to_period is None:
+        to_block = None
+    else:
+        to_block = (to_period + 1) * period_length - 1
+
+    return from_block, to_block
+
+
+def summarize_periods(events: Iterable[Any],
+                      from_period: int,
+                      to_period: int,
+                      quorum_size: int) -> Dict[int, PeriodSummary]:
+    """Tally the `AddHeader` and `SubmitVote` events of one shard per period.
+
+    Every period in `from_period..to_period` is in the result, with
+    `chunk_root` set to `None` if no header was added. `vote_count` counts the
+    votes as the SMC does, one per committee index, while `voters` holds the
+    distinct notary addresses.
+    """
+    chunk_roots = {}  # type: Dict[int, bytes]
+    vote_counts = collections.Counter()  # type: Dict[int, int]
+    voters = collections.defaultdict(set)  # type: Dict[int, Any]
+    for event in events:
+        if event.event_name == 'AddHeader':
+            chunk_roots[event.period] = event.chunk_root
+        elif event.event_name == 'SubmitVote':
+            vote_counts[event.period] += 1
+            voters[event.period].add(event.notary)
+
+    return {
+        period: PeriodSummary(
+            period=period,
+            is_new_header_added=period in chunk_roots,
+            chunk_root=chunk_roots.get(period),
+            vote_count=vote_counts[period],
+            voters=frozenset(voters.get(period, ())),
+            has_enough_vote=vote_counts[period] >= quorum_size,
+        )
+        for period in range(from_period, to_period + 1)
+    }
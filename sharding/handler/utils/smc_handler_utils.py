@@ -1,11 +1,23 @@
 from typing import (
     Any,
+    Callable,
+    Dict,
     Generator,
+    Sequence,
     Tuple,
+    Union,
 )
 
+from eth_account import (
+    Account,
+)
+from web3.exceptions import (
+    BadFunctionCallOutput,
+)
 from eth_utils import (
+    decode_hex,
     is_address,
+    to_canonical_address,
     to_checksum_address,
     to_dict,
 )
@@ -14,6 +26,36 @@ from eth_typing import (
 )
 
 
+# Fragments of the errors of a transaction sent with a stale nonce
+NONCE_ERROR_MESSAGES = (
+    'nonce too low',
+    'invalid transaction nonce',
+    'replacement transaction underpriced',
+)
+
+# Fragments of the errors of a transaction the node already has, i.e. which
+# was sent before
+KNOWN_TRANSACTION_ERROR_MESSAGES = (
+    'known transaction',
+    'already known',
+    'already imported',
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """Check if a transaction was rejected because its nonce is already used.
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERROR_MESSAGES)
+
+
+def is_known_transaction_error(error: Exception) -> bool:
+    """Check if a transaction was rejected because the node already has it.
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in KNOWN_TRANSACTION_ERROR_MESSAGES)
+
+
 @to_dict
 def make_call_context(sender_address: Address,
                       gas: int=None,
@@ -61,3 +103,128 @@ def make_transaction_context(nonce: int,
         yield 'gasPrice', gas_price
     if data is not None:
         yield 'data', data
+
+
+def sign_transaction(unsigned_transaction: Dict[str, Any], private_key: bytes) -> bytes:
+    """
+    Signs the transaction and returns the raw transaction. It is a module level
+    function taking only picklable arguments so it can run in a process pool.
+    """
+    signed_transaction_dict = Account.signTransaction(unsigned_transaction, private_key)
+    return bytes(signed_transaction_dict['rawTransaction'])
+
+
+def _encode_int128(value: int) -> bytes:
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError('int128 value should be provided as integer')
+    if not -2 ** 127 <= value < 2 ** 127:
+        raise ValueError('int128 value {} is out of range'.format(value))
+    return (value % 2 ** 256).to_bytes(32, byteorder='big')
+
+
+def _encode_bytes32(value: Union[bytes, str]) -> bytes:
+    if isinstance(value, str):
+        value = decode_hex(value)
+    if not isinstance(value, bytes) or len(value) > 32:
+        raise ValueError('bytes32 value should be provided as at most 32 bytes')
+    return bytes(value).ljust(32, b'\x00')
+
+
+def _encode_address(value: Union[bytes, str]) -> bytes:
+    if not is_address(value):
+        raise ValueError('address value provided is not an address')
+    return to_canonical_address(value).rjust(32, b'\x00')
+
+
+def _encode_bool(value: bool) -> bytes:
+    if not isinstance(value, bool):
+        raise ValueError('bool value should be provided as boolean')
+    return int(value).to_bytes(32, byteorder='big')
+
+
+_ARGUMENT_ENCODERS = {
+    'int128': _encode_int128,
+    'bytes32': _encode_bytes32,
+    'address': _encode_address,
+    'bool': _encode_bool,
+}  # type: Dict[str, Callable[[Any], bytes]]
+
+
+def is_calldata_encodable(input_types: Sequence[str]) -> bool:
+    return all(input_type in _ARGUMENT_ENCODERS for input_type in input_types)
+
+
+def make_calldata_encoder(selector: bytes,
+                          input_types: Sequence[str]) -> Callable[[Sequence[Any]], bytes]:
+    """
+    Makes the calldata encoder of a function whose inputs are all fixed-size
+    int128/bytes32/address/bool values, which are packed as 32-byte words
+    after the function selector.
+    """
+    if not is_calldata_encodable(input_types):
+        raise ValueError('Only int128/bytes32/address/bool inputs are supported')
+    encoders = tuple(_ARGUMENT_ENCODERS[input_type] for input_type in input_types)
+    num_inputs = len(encoders)
+
+    def encode_calldata(args: Sequence[Any]) -> bytes:
+        if len(args) != num_inputs:
+            raise ValueError('Expect {} arguments but get {}'.format(num_inputs, len(args)))
+        return selector + b''.join(encode(arg) for (encode, arg) in zip(encoders, args))
+
+    return encode_calldata
+
+
+def _decode_int128(word: bytes) -> int:
+    return int.from_bytes(word, byteorder='big', signed=True)
+
+
+def _decode_bytes32(word: bytes) -> bytes:
+    return bytes(word)
+
+
+def _decode_address(word: bytes) -> bytes:
+    return bytes(word[12:])
+
+
+def _decode_bool(word: bytes) -> bool:
+    return word != b'\x00' * 32
+
+
+_RESULT_DECODERS = {
+    'int128': _decode_int128,
+    'bytes32': _decode_bytes32,
+    'address': _decode_address,
+    'bool': _decode_bool,
+}  # type: Dict[str, Callable[[bytes], Any]]
+
+
+def is_result_decodable(output_types: Sequence[str]) -> bool:
+    return all(output_type in _RESULT_DECODERS for output_type in output_types)
+
+
+def make_result_decoder(output_types: Sequence[str]) -> Callable[[bytes], Any]:
+    """
+    Makes the decoder of the return data of a function whose outputs are all
+    fixed-size int128/bytes32/address/bool values. Addresses are decoded as
+    canonical addresses. A single output is returned as is and multiple
+    outputs as a list, like web3 does.
+    """
+    if not is_result_decodable(output_types):
+        raise ValueError('Only int128/bytes32/address/bool outputs are supported')
+    decoders = tuple(_RESULT_DECODERS[output_type] for output_type in output_types)
+    result_size = 32 * len(decoders)
+
+    def decode_result(data: bytes) -> Any:
+        if len(data) != result_size:
+            raise BadFunctionCallOutput(
+                'Expect {} bytes of return data but get {}'.format(result_size, len(data))
+            )
+        values = [
+            decode(data[index * 32: (index + 1) * 32])
+            for (index, decode) in enumerate(decoders)
+        ]
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    return decode_result
@@ -1,18 +1,52 @@
+import json
+import logging
+
 import rlp
 
 from evm.rlp.transactions import (
     BaseTransaction,
 )
 from web3 import (
+    HTTPProvider,
     Web3,
 )
+from web3.providers.eth_tester import (
+    EthereumTesterProvider,
+)
+from web3.middleware.pythonic import (
+    block_formatter,
+    receipt_formatter,
+)
+try:
+    from web3.datastructures import (
+        AttributeDict,
+    )
+except ImportError:
+    # Older web3 versions keep the datastructures in web3.utils
+    from web3.utils.datastructures import (  # type: ignore
+        AttributeDict,
+    )
+try:
+    from web3._utils.request import (
+        make_post_request,
+    )
+except ImportError:
+    # Older web3 versions have the request utils public
+    from web3.utils.request import (  # type: ignore
+        make_post_request,
+    )
 
 from eth_utils import (
+    encode_hex,
     to_checksum_address,
 )
 
 from typing import (
+    Any,
+    Dict,
     List,
+    Optional,
+    Sequence,
     Tuple,
 )
 from eth_typing import (
@@ -20,6 +54,24 @@ from eth_typing import (
     Hash32,
 )
 
+from sharding.handler.exceptions import (
+    NoCommonAncestorFound,
+)
+from sharding.handler.utils.log_handler_utils import (
+    has_topic_or_lists,
+    is_invalid_params_error,
+    match_topics,
+    sort_logs,
+    split_topic_filter,
+)
+
+
+logger = logging.getLogger("sharding.handler.utils.web3_utils")
+
+# Attribute of the `Web3` instances telling if their node supports OR-lists of
+# topics in `eth_getLogs`, unset until known
+TOPIC_OR_LISTS_SUPPORT_ATTRIBUTE = 'supports_topic_or_lists'
+
 
 def get_code(w3: Web3, address: Address) -> bytes:
     return w3.eth.getCode(to_checksum_address(address))
@@ -48,16 +100,73 @@ def send_raw_transaction(w3: Web3, raw_transaction: BaseTransaction) -> Hash32:
     return transaction_hash
 
 
+def set_topic_or_lists_support(w3: Web3, is_supported: bool) -> None:
+    """Tell `get_logs` if the node of `w3` supports OR-lists of topics.
+
+    Nodes rejecting them are detected by `get_logs`, but some read them
+    differently without an error, e.g. eth-tester, and must be declared.
+    """
+    setattr(w3, TOPIC_OR_LISTS_SUPPORT_ATTRIBUTE, is_supported)
+
+
+def supports_topic_or_lists(w3: Web3) -> bool:
+    return getattr(w3, TOPIC_OR_LISTS_SUPPORT_ATTRIBUTE, True)
+
+
+def get_logs(w3: Web3,
+             filter_params: Dict[str, Any],
+             split_topic_or_lists: bool=False) -> List[Dict[str, Any]]:
+    """Send `eth_getLogs`, as one query even with OR-lists of topics.
+
+    If the node rejects the OR-lists, or is known not to support them, or
+    `split_topic_or_lists` is set, the filter is sent as one request per
+    alternative of the first topic instead, see `split_topic_filter`, and the
+    logs are merged in chain order. The node is only taken as not supporting
+    OR-lists if it rejects the parameters of the query but accepts the split
+    ones.
+    """
+    topics = filter_params.get('topics')
+    if topics is None or not has_topic_or_lists(topics):
+        return w3.eth.getLogs(filter_params)
+    if split_topic_or_lists or not supports_topic_or_lists(w3):
+        return _get_logs_by_split_topics(w3, filter_params)
+
+    try:
+        return w3.eth.getLogs(filter_params)
+    except ValueError as e:
+        if not is_invalid_params_error(e):
+            raise
+        logger.debug("Query parameters rejected, splitting the OR-lists of topics: %s", e)
+    # Raises as well if the rejected parameters are not the OR-lists
+    logs = _get_logs_by_split_topics(w3, filter_params)
+    # The split filter was accepted, so it was the OR-lists the node rejected
+    set_topic_or_lists_support(w3, False)
+    return logs
+
+
+def _get_logs_by_split_topics(w3: Web3, filter_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    topics = filter_params['topics']
+    logs = []  # type: List[Dict[str, Any]]
+    for request_topics in split_topic_filter(topics):
+        logs.extend(w3.eth.getLogs(dict(filter_params, topics=request_topics)))
+    return sort_logs(log for log in logs if match_topics(log, topics))
+
+
 def get_recent_block_hashes(w3: Web3, history_size: int) -> Tuple[Hash32, ...]:
-    block = w3.eth.getBlock('latest')
+    head_block_number = w3.eth.blockNumber
+    blocks = get_blocks(
+        w3,
+        range(max(0, head_block_number - history_size + 1), head_block_number + 1),
+    )
     recent_hashes = []
-
-    for _ in range(history_size):
-        recent_hashes.append(block['hash'])
-        # break the loop if we hit the genesis block.
-        if block['number'] == 0:
+    parent_hash = None
+    # Walk back from the head, stopping at a block of another fork if the
+    # chain was reorged while being fetched
+    for block in reversed(blocks):
+        if block is None or (parent_hash is not None and block['hash'] != parent_hash):
             break
-        block = w3.eth.getBlock(block['parentHash'])
+        recent_hashes.append(block['hash'])
+        parent_hash = block['parentHash']
 
     return tuple(reversed(recent_hashes))
 
@@ -66,18 +175,22 @@ def get_canonical_chain(w3: Web3,
                         recent_block_hashes: List[Hash32],
                         history_size: int) -> Tuple[List[Hash32], Tuple[Hash32, ...]]:
     block = w3.eth.getBlock('latest')
+    recent_block_positions = {
+        block_hash: position
+        for (position, block_hash) in enumerate(recent_block_hashes)
+    }
 
     new_block_hashes = []
 
     for _ in range(history_size):
-        if block['hash'] in recent_block_hashes:
+        if block['hash'] in recent_block_positions:
             break
         new_block_hashes.append(block['hash'])
         block = w3.eth.getBlock(block['parentHash'])
     else:
-        raise Exception('No common ancestor found')
+        raise NoCommonAncestorFound('No common ancestor found')
 
-    first_common_ancestor_idx = recent_block_hashes.index(block['hash'])
+    first_common_ancestor_idx = recent_block_positions[block['hash']]
 
     revoked_hashes = recent_block_hashes[first_common_ancestor_idx + 1:]
 
@@ -85,3 +198,127 @@ def get_canonical_chain(w3: Web3,
     reversed_new_block_hashes = tuple(reversed(new_block_hashes))
 
     return revoked_hashes, reversed_new_block_hashes
+
+
+def has_http_provider(w3: Web3) -> bool:
+    """Tell if `w3` sends its requests to a single HTTP endpoint, i.e.
+    `make_batch_request` sends JSON-RPC batches.
+    """
+    providers = w3.providers
+    return len(providers) == 1 and isinstance(providers[0], HTTPProvider)
+
+
+def has_eth_tester_provider(w3: Web3) -> bool:
+    return any(isinstance(provider, EthereumTesterProvider) for provider in w3.providers)
+
+
+def get_endpoint_key(w3: Web3) -> str:
+    """Get a key identifying the node `w3` sends its requests to.
+    """
+    if has_http_provider(w3):
+        return w3.providers[0].endpoint_uri
+    return '{}:{}'.format(type(w3).__name__, id(w3))
+
+
+def make_batch_request(w3: Web3,
+                       requests: Sequence[Tuple[str, List[Any]]],
+                       return_errors: bool=False) -> List[Any]:
+    """Send the `(method, params)` requests and return their results in order.
+
+    With an HTTP provider, all requests are sent as one JSON-RPC batch and the
+    results are the raw JSON values; the middlewares are bypassed. With any
+    other provider, the requests are sent one by one. Like `request_blocking`,
+    raises `ValueError` with the error of the first failed request, or with
+    `return_errors`, returns the error of each failed request in place of its
+    result, i.e. a `ValueError` with the JSON-RPC error, or the exception the
+    provider raised. Errors of the batch as a whole are always raised.
+    """
+    if not requests:
+        return []
+    if not has_http_provider(w3):
+        if not return_errors:
+            return [w3.manager.request_blocking(method, params) for (method, params) in requests]
+        results = []
+        for (method, params) in requests:
+            try:
+                results.append(w3.manager.request_blocking(method, params))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    provider = w3.providers[0]
+    payload = [
+        {
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params,
+            'id': request_id,
+        }
+        for (request_id, (method, params)) in enumerate(requests)
+    ]
+    raw_response = make_post_request(
+        provider.endpoint_uri,
+        json.dumps(payload).encode('utf-8'),
+        **provider.get_request_kwargs()
+    )
+    response = json.loads(raw_response.decode('utf-8'))
+    if not isinstance(response, list):
+        # Nodes answer a batch they can not handle with a single error object
+        raise ValueError(response.get('error', response))
+
+    responses = {item['id']: item for item in response}
+    results = []
+    for request_id in range(len(requests)):
+        if request_id not in responses:
+            raise ValueError("No response to request {}".format(request_id))
+        item = responses[request_id]
+        if 'error' not in item:
+            results.append(item['result'])
+        elif return_errors:
+            results.append(ValueError(item['error']))
+        else:
+            raise ValueError(item['error'])
+    return results
+
+
+def get_blocks(w3: Web3, block_numbers: Sequence[int]) -> List[Optional[AttributeDict]]:
+    """Get the blocks, with transaction hashes only, in one batch request.
+
+    Blocks not mined yet are None.
+    """
+    raw_blocks = make_batch_request(
+        w3,
+        [
+            ('eth_getBlockByNumber', [hex(block_number), False])
+            for block_number in block_numbers
+        ],
+    )
+    if not has_http_provider(w3):
+        # Already formatted by the middlewares
+        return raw_blocks
+    return [
+        None if raw_block is None else AttributeDict.recursive(block_formatter(raw_block))
+        for raw_block in raw_blocks
+    ]
+
+
+def get_transaction_receipts(w3: Web3,
+                             tx_hashes: Sequence[Hash32]) -> List[Optional[AttributeDict]]:
+    """Get the receipts of the transactions in one batch request.
+
+    Receipts of transactions not mined yet are None.
+    """
+    raw_receipts = make_batch_request(
+        w3,
+        [
+            ('eth_getTransactionReceipt', [encode_hex(tx_hash)])
+            for tx_hash in tx_hashes
+        ],
+    )
+    if not has_http_provider(w3):
+        # Already formatted by the middlewares
+        return raw_receipts
+    return [
+        None if raw_receipt is None else AttributeDict.recursive(receipt_formatter(raw_receipt))
+        for raw_receipt in raw_receipts
+    ]
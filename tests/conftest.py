@@ -21,6 +21,7 @@ from sharding.handler.smc_handler import (
 )
 from sharding.handler.utils.web3_utils import (
     get_code,
+    set_topic_or_lists_support,
 )
 from tests.handler.utils.config import (
     get_sharding_testing_config,
@@ -42,6 +43,8 @@ def smc_handler(smc_testing_config):
     w3 = Web3(provider)
     if hasattr(w3.eth, "enable_unaudited_features"):
         w3.eth.enable_unaudited_features()
+    # eth-tester reads a nested topic list as a list of whole filters
+    set_topic_or_lists_support(w3, False)
 
     private_key = get_default_account_keys()[0]
 
@@ -68,4 +71,5 @@ def smc_handler(smc_testing_config):
         config=smc_testing_config,
     )
 
-    return smc_handler
+    yield smc_handler
+    smc_handler.close()
@@ -0,0 +1,25 @@
+from eth_utils import (
+    event_abi_to_log_topic,
+    function_abi_to_4byte_selector,
+)
+
+from sharding.contracts.utils.smc_utils import (
+    get_smc_artifact,
+    get_smc_json,
+)
+
+
+def test_smc_artifact_indexes():
+    smc_artifact = get_smc_artifact()
+    assert smc_artifact is get_smc_artifact()
+
+    for entry in get_smc_json()['abi']:
+        if entry['type'] == 'event':
+            topic = event_abi_to_log_topic(entry)
+            assert smc_artifact.get_event_abi(entry['name']) == entry
+            assert smc_artifact.get_event_topic(entry['name']) == topic
+            assert smc_artifact.get_event_abi_by_topic(topic) == entry
+        elif entry['type'] == 'function':
+            selector = function_abi_to_4byte_selector(entry)
+            assert smc_artifact.get_function_selector(entry['name']) == selector
+            assert smc_artifact.get_function_gas(entry['name']) == entry['gas']
@@ -356,6 +356,7 @@ def test_submit_vote_then_deregister(smc_handler):  # noqa: F811
 
     # Notary 9 registers and takes retired notary's place in pool
     smc_handler.register_notary(private_key=NotaryAccount(9).private_key)
+    mine(w3, 1)
     # Attempt to vote
     tx_hash = smc_handler.submit_vote(
         shard_id=shard_id,
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from sharding.handler.async_handler import (
+    AsyncShardTracker,
+    AsyncSMC,
+    EndpointLimiter,
+)
+from sharding.handler.shard_tracker import (
+    ShardTracker,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+@pytest.fixture
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_async_smc(smc_handler, event_loop):  # noqa: F811
+    batch_register(smc_handler, 0, 4)
+    # eth-tester is not thread-safe, so calls are run one at a time
+    limiter = EndpointLimiter(max_concurrency=1)
+    async_smc = AsyncSMC(smc_handler, limiter=limiter)
+    assert async_smc.address == smc_handler.address
+
+    async def get_notary_pool():
+        return await asyncio.gather(*(
+            async_smc.notary_pool(pool_index)
+            for pool_index in range(5)
+        ))
+
+    notary_pool = event_loop.run_until_complete(get_notary_pool())
+    assert notary_pool == [NotaryAccount(i).canonical_address for i in range(5)]
+
+    batch = async_smc.batch()
+    batch.notary_pool_len()
+    batch.does_notary_exist(NotaryAccount(0).checksum_address)
+    assert event_loop.run_until_complete(async_smc.execute_batch(batch)) == [5, True]
+
+
+def test_async_shard_tracker(smc_handler, smc_testing_config, event_loop):  # noqa: F811
+    shard_tracker = ShardTracker(
+        w3=smc_handler.web3,
+        config=smc_testing_config,
+        shard_id=0,
+        smc_handler_address=smc_handler.address,
+    )
+    async_shard_tracker = AsyncShardTracker(
+        shard_tracker,
+        limiter=EndpointLimiter(max_concurrency=1),
+    )
+    batch_register(smc_handler, 0, 2)
+
+    is_registered = event_loop.run_until_complete(
+        async_shard_tracker.is_notary_registered(NotaryAccount(2).checksum_address, from_period=0)
+    )
+    assert is_registered
+
+    # Generators can not be run in the executor
+    with pytest.raises(AttributeError):
+        async_shard_tracker.follow_events
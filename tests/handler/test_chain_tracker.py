@@ -0,0 +1,102 @@
+import pytest
+
+from sharding.handler.chain_tracker import (
+    ChainTracker,
+)
+from sharding.handler.exceptions import (
+    NoCommonAncestorFound,
+)
+from sharding.handler.utils.web3_utils import (
+    get_canonical_chain,
+    get_recent_block_hashes,
+    mine,
+    revert_to_snapshot,
+    take_snapshot,
+)
+
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def get_block_hashes(w3, from_block, to_block):
+    return tuple(
+        w3.eth.getBlock(block_number)['hash']
+        for block_number in range(from_block, to_block + 1)
+    )
+
+
+def test_chain_tracker(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    mine(w3, 20)
+    head_block_number = w3.eth.blockNumber
+    chain_tracker = ChainTracker(w3, history_size=16)
+
+    revoked_hashes, added_hashes = chain_tracker.update()
+    assert revoked_hashes == ()
+    assert added_hashes == get_block_hashes(w3, head_block_number - 15, head_block_number)
+    assert added_hashes == get_recent_block_hashes(w3, 16)
+    assert len(chain_tracker) == 16
+    assert chain_tracker.head_hash == added_hashes[-1]
+    assert chain_tracker.get_block_number(added_hashes[0]) == head_block_number - 15
+    assert chain_tracker.get_hash(head_block_number - 16) is None
+
+    # Only the new blocks are added, the oldest ones are dropped
+    mine(w3, 3)
+    revoked_hashes, added_hashes = chain_tracker.update()
+    assert revoked_hashes == ()
+    assert added_hashes == get_block_hashes(w3, head_block_number + 1, head_block_number + 3)
+    assert len(chain_tracker) == 16
+    assert chain_tracker.get_hash(head_block_number - 13) is None
+    assert chain_tracker.update() == ((), ())
+
+    # Reorg of the last 2 blocks
+    snapshot_id = take_snapshot(w3)
+    recent_block_hashes = list(get_recent_block_hashes(w3, 16))
+    head_block_number = w3.eth.blockNumber
+    mine(w3, 2)
+    _, revoked_block_hashes = chain_tracker.update()
+    revert_to_snapshot(w3, snapshot_id)
+    deep_snapshot_id = take_snapshot(w3)
+    # A transaction makes sure the new blocks differ from the revoked ones
+    smc_handler.register_notary(private_key=NotaryAccount(0).private_key)
+    mine(w3, 3)
+    new_block_hashes = get_block_hashes(w3, head_block_number + 1, head_block_number + 3)
+
+    revoked_hashes, added_hashes = chain_tracker.update()
+    assert revoked_hashes == revoked_block_hashes
+    assert added_hashes == new_block_hashes
+    assert all(block_hash not in chain_tracker for block_hash in revoked_hashes)
+    assert chain_tracker.get_block_number(new_block_hashes[0]) == head_block_number + 1
+    assert get_canonical_chain(w3, recent_block_hashes, 16) == ([], new_block_hashes)
+
+    # Reorg deeper than the history
+    small_chain_tracker = ChainTracker(w3, history_size=2)
+    small_chain_tracker.update()
+    revert_to_snapshot(w3, deep_snapshot_id)
+    smc_handler.register_notary(private_key=NotaryAccount(1).private_key)
+    mine(w3, 4)
+    with pytest.raises(NoCommonAncestorFound):
+        small_chain_tracker.update()
+
+
+def test_chain_tracker_with_lower_head(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    mine(w3, 5)
+    head_block_number = w3.eth.blockNumber
+    chain_tracker = ChainTracker(w3, history_size=16)
+    chain_tracker.update()
+    head_hash = chain_tracker.head_hash
+
+    # A node behind on the same chain, e.g. another node behind a load balancer
+    refresh = chain_tracker.head_tracker.refresh
+    monkeypatch.setattr(chain_tracker.head_tracker, 'refresh', lambda: head_block_number - 2)
+    assert chain_tracker.update() == ((), ())
+    assert chain_tracker.head_number == head_block_number
+    assert chain_tracker.head_hash == head_hash
+
+    # Once it catches up, only the new blocks are added
+    monkeypatch.setattr(chain_tracker.head_tracker, 'refresh', refresh)
+    mine(w3, 1)
+    new_block_hashes = get_block_hashes(w3, head_block_number + 1, head_block_number + 1)
+    assert chain_tracker.update() == ((), new_block_hashes)
@@ -0,0 +1,97 @@
+import pytest
+
+from eth_utils import (
+    keccak,
+)
+
+from sharding.handler.committee_sampler import (
+    CommitteeSampler,
+)
+from sharding.handler.notary_registry import (
+    NotaryRegistry,
+)
+from sharding.handler.utils.committee_sampler_utils import (
+    get_committee,
+    get_committee_index,
+    get_committees,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_get_committees():
+    entropy_block_hash = keccak(b'entropy')
+    committees = get_committees(entropy_block_hash, 7, 3, 5)
+    assert len(committees) == 3
+    for (shard_id, committee) in enumerate(committees):
+        assert committee == get_committee(entropy_block_hash, shard_id, 7, 5)
+        assert all(0 <= pool_index < 7 for pool_index in committee)
+
+    with pytest.raises(ValueError):
+        get_committees(entropy_block_hash, 0, 3, 5)
+
+
+def test_get_committee_index():
+    committees = ((1, 0, 1), (2, 1, 2))
+    assert get_committee_index(committees) == {
+        0: [(0, 1)],
+        1: [(0, 0), (0, 2), (1, 1)],
+        2: [(1, 0), (1, 2)],
+    }
+
+
+@pytest.mark.parametrize('use_notary_registry', (False, True))
+def test_committee_sampler(smc_handler, smc_testing_config, use_notary_registry):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    if use_notary_registry:
+        notary_registry = NotaryRegistry(
+            w3=w3,
+            config=config,
+            smc_handler_address=smc_handler.address,
+        )
+    else:
+        notary_registry = None
+    committee_sampler = CommitteeSampler(smc_handler, notary_registry=notary_registry)
+
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    # Registration in this period does not change the sample size of this period
+    smc_handler.register_notary(private_key=NotaryAccount(9).private_key)
+    mine(w3, 1)
+    if notary_registry is not None:
+        notary_registry.sync()
+
+    committees = committee_sampler.get_committees()
+    assert len(committees) == config['SHARD_COUNT']
+    for shard_id in range(config['SHARD_COUNT']):
+        assert len(committees[shard_id]) == config['COMMITTEE_SIZE']
+        for index in range(config['COMMITTEE_SIZE']):
+            pool_index = committees[shard_id][index]
+            member = smc_handler.get_member_of_committee(shard_id, index)
+            assert smc_handler.notary_pool(pool_index) == member
+            assert committee_sampler.get_member_of_committee(shard_id, index) == pool_index
+    # Committees of a period are sampled once
+    assert committee_sampler.get_committees() is committees
+
+    committee_index = committee_sampler.get_committee_index()
+    assert committee_sampler.get_committee_index() is committee_index
+    for pool_index in range(10):
+        assert committee_sampler.get_assignments(pool_index) == [
+            (shard_id, index)
+            for shard_id in range(config['SHARD_COUNT'])
+            for index in range(config['COMMITTEE_SIZE'])
+            if committees[shard_id][index] == pool_index
+        ]
+    assignments = committee_sampler.get_assignments_of_notaries([0, 1, 100])
+    assert assignments[0] == committee_sampler.get_assignments(0)
+    assert assignments[100] == []
@@ -0,0 +1,63 @@
+from sharding.handler.chain_tracker import (
+    ChainTracker,
+)
+from sharding.handler.event_stream import (
+    SMCEventStream,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+    revert_to_snapshot,
+    take_snapshot,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_smc_event_stream(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    batch_register(smc_handler, 0, 1)
+    # Only the events from `from_block` on are emitted
+    event_stream = SMCEventStream(
+        w3=w3,
+        config=smc_testing_config,
+        smc_handler_address=smc_handler.address,
+        from_block=w3.eth.blockNumber + 1,
+        chain_tracker=ChainTracker(w3, history_size=16),
+    )
+    assert event_stream.update() == ((), ())
+
+    batch_register(smc_handler, 2, 3)
+    removed, added = event_stream.update()
+    assert removed == ()
+    assert [stream_event.event.event_name for stream_event in added] == ['RegisterNotary'] * 2
+    assert [stream_event.event.notary for stream_event in added] == [
+        NotaryAccount(2).canonical_address,
+        NotaryAccount(3).canonical_address,
+    ]
+    assert added[0].block_number == w3.eth.blockNumber
+    assert added[0].block_hash == w3.eth.getBlock('latest')['hash']
+    assert [stream_event.transaction_index for stream_event in added] == [0, 1]
+    assert event_stream.update() == ((), ())
+
+    # Events of revoked blocks are removed, in reverse order
+    snapshot_id = take_snapshot(w3)
+    batch_register(smc_handler, 4, 4)
+    mine(w3, 1)
+    batch_register(smc_handler, 5, 6)
+    _, revoked_events = event_stream.update()
+    assert len(revoked_events) == 3
+
+    revert_to_snapshot(w3, snapshot_id)
+    mine(w3, 1)
+    batch_register(smc_handler, 7, 7)
+    removed, added = event_stream.update()
+    assert removed == tuple(reversed(revoked_events))
+    assert [stream_event.event.notary for stream_event in added] == [
+        NotaryAccount(7).canonical_address,
+    ]
+    assert event_stream.update() == ((), ())
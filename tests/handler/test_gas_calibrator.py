@@ -0,0 +1,193 @@
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+
+from sharding.handler.gas_calibrator import (
+    GasCalibrator,
+)
+from sharding.handler.utils.gas_calibrator_utils import (
+    DEFAULT_CODE_PATH,
+    FIRST_IN_PERIOD_CODE_PATH,
+    QUORUM_VOTE_CODE_PATH,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+from tests.contract.utils.sample_helper import (
+    sampling,
+)
+
+
+def test_gas_calibrator(tmpdir):
+    static_gas = {'register_notary': 100000}
+    path = str(tmpdir.join('gas.json'))
+    gas_calibrator = GasCalibrator(static_gas, margin=1.5, max_samples=2, path=path)
+    # No samples yet, fall back to the static estimate
+    assert gas_calibrator.get_gas('register_notary') == 100000
+
+    gas_calibrator.record('register_notary', DEFAULT_CODE_PATH, 40000)
+    assert gas_calibrator.has_samples('register_notary')
+    assert gas_calibrator.get_gas('register_notary') == 60000
+    assert not gas_calibrator.has_samples('register_notary', FIRST_IN_PERIOD_CODE_PATH)
+    assert gas_calibrator.get_gas('register_notary', FIRST_IN_PERIOD_CODE_PATH) == 100000
+
+    gas_calibrator.record('register_notary', DEFAULT_CODE_PATH, 50000)
+    assert gas_calibrator.get_gas('register_notary') == 75000
+    # Only the latest `max_samples` samples are kept
+    gas_calibrator.record('register_notary', DEFAULT_CODE_PATH, 30000)
+    gas_calibrator.record('register_notary', DEFAULT_CODE_PATH, 20000)
+    assert gas_calibrator.get_gas('register_notary') == 45000
+    # Capped by the static estimate
+    gas_calibrator.record('register_notary', FIRST_IN_PERIOD_CODE_PATH, 90000)
+    assert gas_calibrator.get_gas('register_notary', FIRST_IN_PERIOD_CODE_PATH) == 100000
+
+    # Samples are kept across restarts
+    reloaded_gas_calibrator = GasCalibrator(static_gas, margin=1.5, max_samples=2, path=path)
+    assert reloaded_gas_calibrator.get_gas('register_notary') == 45000
+    assert reloaded_gas_calibrator.has_samples('register_notary', FIRST_IN_PERIOD_CODE_PATH)
+
+
+def test_gas_calibrator_shared_by_threads(tmpdir):
+    path = str(tmpdir.join('gas.json'))
+    gas_calibrator = GasCalibrator({'submit_vote': 100000}, max_samples=4, path=path)
+
+    def record(code_path):
+        for gas_needed in range(1000, 1100):
+            gas_calibrator.record('submit_vote', code_path, gas_needed)
+
+    def get_gas(code_path):
+        for _ in range(100):
+            gas_calibrator.get_gas('submit_vote', code_path)
+            gas_calibrator.needs_samples('submit_vote', code_path)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        jobs = [
+            executor.submit(job, code_path)
+            for code_path in (DEFAULT_CODE_PATH, QUORUM_VOTE_CODE_PATH)
+            for job in (record, get_gas)
+        ]
+    for job in jobs:
+        job.result()
+    assert gas_calibrator.get_gas('submit_vote', QUORUM_VOTE_CODE_PATH) == int(1099 * 1.25)
+    reloaded_gas_calibrator = GasCalibrator({'submit_vote': 100000}, max_samples=4, path=path)
+    assert reloaded_gas_calibrator.get_gas('submit_vote') == int(1099 * 1.25)
+
+
+def test_record_gas_used(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    gas_calibrator = smc_handler.gas_calibrator
+    shard_id = 0
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // smc_handler.config['PERIOD_LENGTH']
+
+    # Only the first header of the period updates the notary sample size
+    tx_hashes = [
+        smc_handler.add_header(
+            shard_id=header_shard_id,
+            period=current_period,
+            chunk_root=b'\x10' * 32,
+            private_key=NotaryAccount(header_shard_id).private_key,
+        )
+        for header_shard_id in range(2)
+    ]
+    # Not mined yet
+    assert smc_handler.record_gas_used(w3.eth.getTransactionReceipt(tx_hashes[0])) is None
+    mine(w3, 1)
+    receipts = [w3.eth.getTransactionReceipt(tx_hash) for tx_hash in tx_hashes]
+    assert smc_handler.record_gas_used(receipts[0]) == ('add_header', FIRST_IN_PERIOD_CODE_PATH)
+    assert smc_handler.record_gas_used(receipts[1]) == ('add_header', DEFAULT_CODE_PATH)
+    # The gas needed before the refunds is recorded, not the gasUsed
+    assert gas_calibrator.has_samples('add_header', FIRST_IN_PERIOD_CODE_PATH)
+    first_header_gas = smc_handler._get_gas('add_header')
+    assert receipts[0]['gasUsed'] < first_header_gas < smc_handler._estimate_gas_dict['add_header']
+
+    # Only the vote reaching the quorum elects the collation
+    tx_hashes = []
+    for (sample_index, pool_index) in enumerate(sampling(smc_handler, shard_id)):
+        tx_hashes.append(smc_handler.submit_vote(
+            shard_id=shard_id,
+            period=current_period,
+            chunk_root=b'\x10' * 32,
+            index=sample_index,
+            private_key=NotaryAccount(pool_index).private_key,
+        ))
+        # A notary may be sampled more than once
+        mine(w3, 1)
+    assert smc_handler.get_collation_is_elected(shard_id, current_period)
+    code_paths = [
+        smc_handler.record_gas_used(w3.eth.getTransactionReceipt(tx_hash))
+        for tx_hash in tx_hashes
+    ]
+    quorum_size = smc_handler.config['QUORUM_SIZE']
+    assert code_paths[quorum_size - 1] == ('submit_vote', QUORUM_VOTE_CODE_PATH)
+    assert all(
+        code_path == ('submit_vote', DEFAULT_CODE_PATH)
+        for (vote_index, code_path) in enumerate(code_paths)
+        if vote_index != quorum_size - 1
+    )
+    assert gas_calibrator.has_samples('submit_vote', DEFAULT_CODE_PATH)
+    assert gas_calibrator.has_samples('submit_vote', QUORUM_VOTE_CODE_PATH)
+    # The gas limit is looked up for the code path the transaction is sent for,
+    # the most expensive one if not known
+    assert smc_handler._get_gas('submit_vote', DEFAULT_CODE_PATH) == gas_calibrator.get_gas(
+        'submit_vote',
+        DEFAULT_CODE_PATH,
+    )
+    assert smc_handler._get_gas('submit_vote') == gas_calibrator.get_gas(
+        'submit_vote',
+        QUORUM_VOTE_CODE_PATH,
+    )
+
+    # A failed transaction emits no log
+    tx_hash = smc_handler.release_notary(private_key=NotaryAccount(0).private_key)
+    mine(w3, 1)
+    assert smc_handler.record_gas_used(w3.eth.getTransactionReceipt(tx_hash)) is None
+    assert not gas_calibrator.has_samples('release_notary')
+
+
+def test_estimate_gas_in_bulk(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    transactions = [
+        (NotaryAccount(0), 'register_notary', smc_handler.config['NOTARY_DEPOSIT']),
+        # Not registered, so it would fail
+        (NotaryAccount(1), 'release_notary', 0),
+    ]
+    unsigned_transactions = [
+        smc_handler._build_transaction(
+            func_name=func_name,
+            args=[],
+            nonce=0,
+            gas=smc_handler._get_gas(func_name),
+            value=value,
+            gas_price=smc_handler.config['GAS_PRICE'],
+        )
+        for (_, func_name, value) in transactions
+    ]
+    gas_estimates = smc_handler._estimate_gas_in_bulk(
+        unsigned_transactions,
+        {
+            index: (func_name, notary.checksum_address)
+            for (index, (notary, func_name, _)) in enumerate(transactions)
+        },
+    )
+    # The failed estimate leaves the other one
+    assert list(gas_estimates) == [0]
+    (gas_needed, block_number) = gas_estimates[0]
+    assert 0 < gas_needed <= smc_handler._get_gas('register_notary')
+    assert block_number == w3.eth.blockNumber
+
+    # An estimate made once the transaction was mined is not recorded
+    tx_hash = smc_handler.register_notary(private_key=NotaryAccount(0).private_key)
+    mine(w3, 1)
+    receipt = w3.eth.getTransactionReceipt(tx_hash)
+    smc_handler._keep_gas_needed(tx_hash, gas_needed, receipt['blockNumber'])
+    assert smc_handler.record_gas_used(receipt) is None
@@ -0,0 +1,100 @@
+import time
+
+from sharding.handler.head_tracker import (
+    HeadTracker,
+)
+from sharding.handler.log_handler import (
+    LogHandler,
+)
+from sharding.handler.shard_tracker import (
+    ShardTracker,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+
+def test_head_tracker_staleness(smc_handler):
+    w3 = smc_handler.web3
+
+    # By default the node is asked every time
+    head_tracker = HeadTracker(w3)
+    block_number = head_tracker.block_number
+    mine(w3, 1)
+    assert head_tracker.block_number == block_number + 1
+
+    # Within the staleness bound the cached value is used
+    head_tracker = HeadTracker(w3, max_staleness=60)
+    block_number = head_tracker.block_number
+    mine(w3, 1)
+    assert head_tracker.block_number == block_number
+    assert head_tracker.refresh() == block_number + 1
+    head_tracker.update(block_number + 5)
+    assert head_tracker.block_number == block_number + 5
+    # A mined block only moves the cached head forward
+    head_tracker.observe(block_number + 3)
+    assert head_tracker.cached_block_number == block_number + 5
+    head_tracker.observe(block_number + 6)
+    assert head_tracker.block_number == block_number + 6
+
+
+def test_head_tracker_background_poll(smc_handler):
+    w3 = smc_handler.web3
+    head_tracker = HeadTracker(w3, max_staleness=60)
+    block_number = head_tracker.block_number
+    mine(w3, 1)
+    head_tracker.start(poll_interval=0.01)
+    try:
+        for _ in range(100):
+            if head_tracker.block_number == block_number + 1:
+                break
+            time.sleep(0.01)
+        assert head_tracker.block_number == block_number + 1
+    finally:
+        head_tracker.stop()
+
+
+def test_shared_head_tracker(smc_handler, smc_testing_config):
+    w3 = smc_handler.web3
+    head_tracker = HeadTracker(w3, max_staleness=60)
+    shard_tracker = ShardTracker(
+        w3=w3,
+        config=smc_testing_config,
+        shard_id=0,
+        smc_handler_address=smc_handler.address,
+        head_tracker=head_tracker,
+    )
+    assert shard_tracker.log_handler.head_tracker is head_tracker
+    log_handler = LogHandler(w3, smc_testing_config['PERIOD_LENGTH'], head_tracker=head_tracker)
+
+    mine(w3, smc_testing_config['PERIOD_LENGTH'])
+    period_length = smc_testing_config['PERIOD_LENGTH']
+    assert shard_tracker.current_period == head_tracker.block_number // period_length
+    # Searching from a block beyond the cached head refreshes it
+    log_handler.get_logs(from_block=w3.eth.blockNumber)
+    assert head_tracker.block_number == w3.eth.blockNumber
+    assert shard_tracker.current_period == w3.eth.blockNumber // period_length
+
+
+def test_head_passed_on(smc_handler, smc_testing_config, monkeypatch):
+    w3 = smc_handler.web3
+    head_tracker = HeadTracker(w3)
+    log_handler = LogHandler(w3, smc_testing_config['PERIOD_LENGTH'], head_tracker=head_tracker)
+    refresh = head_tracker.refresh
+    refreshed_block_numbers = []
+
+    def counted_refresh():
+        refreshed_block_numbers.append(refresh())
+        return refreshed_block_numbers[-1]
+
+    monkeypatch.setattr(head_tracker, 'refresh', counted_refresh)
+    mine(w3, 1)
+    head_block_number = head_tracker.refresh()
+    # A range below the head already fetched does not ask the node again
+    log_handler.get_logs(from_block=0, to_block=head_block_number)
+    log_handler.get_logs_in_chunks(from_block=0, to_block=head_block_number)
+    assert refreshed_block_numbers == [head_block_number]
+    # Beyond it, the node is asked
+    mine(w3, 1)
+    log_handler.get_logs(from_block=0, to_block=head_block_number + 1)
+    assert refreshed_block_numbers == [head_block_number, head_block_number + 1]
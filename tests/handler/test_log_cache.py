@@ -0,0 +1,58 @@
+from hexbytes import (
+    HexBytes,
+)
+
+from sharding.handler.log_cache import (
+    LogCache,
+    get_filter_key,
+)
+
+
+def make_log(block_number, log_index, transaction_index=0):
+    return {
+        'blockNumber': block_number,
+        'transactionIndex': transaction_index,
+        'logIndex': log_index,
+        'blockHash': HexBytes(block_number.to_bytes(32, 'big')),
+        'topics': [HexBytes(b'\x01' * 32)],
+        'data': '0x',
+    }
+
+
+def test_filter_key():
+    topic = b'\x01' * 32
+    assert get_filter_key(None, [topic]) == get_filter_key(None, ['0x' + '01' * 32])
+    assert get_filter_key(None, [topic]) != get_filter_key(None, [[topic]])
+    assert get_filter_key(b'\x01' * 20, None) == get_filter_key('0x' + '01' * 20, [])
+
+
+def test_log_cache_spans(tmpdir):
+    path = str(tmpdir.join('logs.sqlite'))
+    log_cache = LogCache(path)
+    filter_key = get_filter_key(None, None)
+    assert log_cache.get_uncovered_ranges(filter_key, 0, 100) == [(0, 100)]
+
+    log_cache.add_span(filter_key, 0, 10, b'\x10' * 32, [make_log(3, 0), make_log(3, 1)])
+    # Logs of different transactions can have the same log index
+    log_cache.add_span(filter_key, 20, 30, b'\x30' * 32, [make_log(25, 0, 1), make_log(25, 0)])
+    assert log_cache.get_uncovered_ranges(filter_key, 0, 100) == [(11, 19), (31, 100)]
+    assert log_cache.get_uncovered_ranges(filter_key, 5, 25) == [(11, 19)]
+    assert log_cache.get_uncovered_ranges(filter_key, 20, 30) == []
+    assert log_cache.get_logs(filter_key, 0, 100) == [
+        make_log(3, 0),
+        make_log(3, 1),
+        make_log(25, 0),
+        make_log(25, 0, 1),
+    ]
+    assert log_cache.get_logs(filter_key, 4, 100) == [make_log(25, 0), make_log(25, 0, 1)]
+    log_cache.close()
+
+    # The cache is persisted
+    log_cache = LogCache(path)
+    assert log_cache.get_latest_span(filter_key) == (20, 30, b'\x30' * 32)
+
+    # Spans are dropped from the latest one down to the first canonical one
+    canonical_hashes = {10: b'\x10' * 32, 30: b'\xff' * 32}
+    log_cache.invalidate(filter_key, canonical_hashes.get)
+    assert log_cache.get_uncovered_ranges(filter_key, 0, 100) == [(11, 100)]
+    assert log_cache.get_logs(filter_key, 0, 100) == [make_log(3, 0), make_log(3, 1)]
@@ -15,6 +15,7 @@ from web3.providers.eth_tester import (
 )
 
 from eth_utils import (
+    encode_hex,
     event_signature_to_log_topic,
 )
 
@@ -26,11 +27,23 @@ from eth_tester.backends.pyevm.main import (
     get_default_account_keys,
 )
 
+from sharding.handler.log_cache import (
+    LogCache,
+)
 from sharding.handler.log_handler import (
+    LogCursor,
     LogHandler,
 )
+from sharding.handler.utils.log_handler_utils import (
+    has_topic_or_lists,
+    match_topics,
+    split_topic_filter,
+)
 from sharding.handler.utils.web3_utils import (
+    get_logs,
     mine,
+    set_topic_or_lists_support,
+    supports_topic_or_lists,
     take_snapshot,
     revert_to_snapshot,
 )
@@ -57,21 +70,49 @@ test_event_signature = event_signature_to_log_topic("Test(int128)")
 HISTORY_SIZE = 256
 
 
-@pytest.fixture
-def contract():
+def test_split_topic_filter():
+    a, b, c = ('0x' + (str(i) * 64) for i in range(3))
+    assert split_topic_filter([a, None]) == [[a, None]]
+    assert split_topic_filter([[a, b, a], c]) == [[a, c], [b, c]]
+    assert split_topic_filter([a, [b, c]]) == [[a, None]]
+    assert split_topic_filter([[a, None], [b, c]]) == [[None, None]]
+
+    log = {'topics': [bytes.fromhex(a[2:]), bytes.fromhex(c[2:])]}
+    assert match_topics(log, None)
+    assert match_topics(log, [[a, b], None])
+    assert match_topics(log, [a, [b, c]])
+    assert not match_topics(log, [a, [a, b]])
+    assert not match_topics(log, [b])
+    assert not match_topics(log, [a, c, None])
+
+
+def deploy_contract(auto_mine_transactions):
     eth_tester = EthereumTester(
         backend=PyEVMBackend(),
-        auto_mine_transactions=False,
+        auto_mine_transactions=auto_mine_transactions,
     )
     provider = EthereumTesterProvider(eth_tester)
     w3 = Web3(provider)
     tx_hash = w3.eth.sendTransaction(assoc(default_tx_detail, 'data', bytecode))
-    mine(w3, 1)
+    if not auto_mine_transactions:
+        mine(w3, 1)
     receipt = w3.eth.getTransactionReceipt(tx_hash)
     contract_address = receipt['contractAddress']
     return w3.eth.contract(contract_address, abi=abi, bytecode=bytecode)
 
 
+@pytest.fixture
+def contract():
+    return deploy_contract(auto_mine_transactions=False)
+
+
+@pytest.fixture
+def auto_mining_contract():
+    # Without auto mining, eth-tester reverts a snapshot on every transaction,
+    # which fails once an installed log filter holds logs
+    return deploy_contract(auto_mine_transactions=True)
+
+
 def test_get_logs_without_forks(contract, smc_testing_config):
     period_length = smc_testing_config['PERIOD_LENGTH']
     w3 = contract.web3
@@ -121,3 +162,208 @@ def test_get_logs_with_forks(contract, smc_testing_config):
     # assert len(logs) == 2
     assert int(logs[0]['data'], 16) == 1
     assert int(logs[1]['data'], 16) == 2
+
+
+def test_get_logs_in_chunks(contract, smc_testing_config, monkeypatch):
+    period_length = smc_testing_config['PERIOD_LENGTH']
+    w3 = contract.web3
+    log_handler = LogHandler(w3, period_length)
+    counter = itertools.count()
+
+    for _ in range(5):
+        contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+        mine(w3, 1)
+        contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+        mine(w3, period_length // 2)
+    expected_logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert len(expected_logs) == 10
+
+    logs = log_handler.get_logs_in_chunks(
+        address=contract.address,
+        from_block=0,
+        periods_per_chunk=1,
+        max_workers=3,
+    )
+    assert logs == expected_logs
+
+    # Node rejecting ranges that span more than one period
+    get_logs = w3.eth.getLogs
+    requested_ranges = []
+
+    def get_logs_with_limit(filter_params):
+        requested_ranges.append((filter_params['fromBlock'], filter_params['toBlock']))
+        if filter_params['toBlock'] - filter_params['fromBlock'] >= period_length:
+            raise ValueError({'code': -32005, 'message': 'query returned more than 10000 results'})
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3.eth, 'getLogs', get_logs_with_limit)
+    logs = log_handler.get_logs_in_chunks(
+        address=contract.address,
+        from_block=0,
+        periods_per_chunk=4,
+    )
+    assert logs == expected_logs
+    assert any(end - start >= period_length for (start, end) in requested_ranges)
+
+    # Other errors are not retried
+    for message in ('internal error', 'too many requests', 'rate limit exceeded'):
+        def get_logs_with_error(filter_params):
+            raise ValueError({'code': -32000, 'message': message})
+
+        monkeypatch.setattr(w3.eth, 'getLogs', get_logs_with_error)
+        with pytest.raises(ValueError):
+            log_handler.get_logs_in_chunks(address=contract.address, from_block=0)
+
+
+def test_get_logs_with_topic_or_lists(contract, monkeypatch):
+    w3 = contract.web3
+    contract.functions.emit_log(0).transact(default_tx_detail)
+    mine(w3, 1)
+    filter_params = {
+        'address': contract.address,
+        'topics': [[
+            encode_hex(test_event_signature),
+            encode_hex(event_signature_to_log_topic("Other(int128)")),
+        ]],
+        'fromBlock': 0,
+        'toBlock': 'latest',
+    }
+    node_get_logs = w3.eth.getLogs
+    requested_topics = []
+
+    # Node supporting OR-lists: one query
+    def get_logs_with_or_lists(filter_params):
+        requested_topics.append(filter_params['topics'])
+        return node_get_logs(dict(filter_params, topics=[encode_hex(test_event_signature)]))
+
+    monkeypatch.setattr(w3.eth, 'getLogs', get_logs_with_or_lists)
+    assert len(get_logs(w3, filter_params)) == 1
+    assert requested_topics == [filter_params['topics']]
+
+    # Node rejecting OR-lists: one query per event signature from then on
+    def get_logs_without_or_lists(filter_params):
+        requested_topics.append(filter_params['topics'])
+        if has_topic_or_lists(filter_params['topics']):
+            raise ValueError({'code': -32602, 'message': 'invalid argument 0'})
+        return node_get_logs(filter_params)
+
+    monkeypatch.setattr(w3.eth, 'getLogs', get_logs_without_or_lists)
+    requested_topics.clear()
+    assert len(get_logs(w3, filter_params)) == 1
+    assert len(requested_topics) == 3
+    assert not supports_topic_or_lists(w3)
+    requested_topics.clear()
+    assert len(get_logs(w3, filter_params)) == 1
+    assert len(requested_topics) == 2
+    set_topic_or_lists_support(w3, True)
+    # The support is known per Web3 instance
+    assert supports_topic_or_lists(Web3(w3.providers[0]))
+
+    # Other errors do not turn the OR-lists off
+    def fail_transiently(filter_params):
+        raise ValueError({'code': -32000, 'message': 'header not found'})
+
+    monkeypatch.setattr(w3.eth, 'getLogs', fail_transiently)
+    with pytest.raises(ValueError):
+        get_logs(w3, filter_params)
+    assert supports_topic_or_lists(w3)
+
+    # Neither do rejected parameters which are still rejected once split
+    def reject_address(filter_params):
+        raise ValueError({'code': -32602, 'message': 'invalid argument 0: hex string too short'})
+
+    monkeypatch.setattr(w3.eth, 'getLogs', reject_address)
+    with pytest.raises(ValueError):
+        get_logs(w3, filter_params)
+    assert supports_topic_or_lists(w3)
+
+
+def test_get_logs_with_cache(contract, smc_testing_config, monkeypatch):
+    w3 = contract.web3
+    log_handler = LogHandler(w3, smc_testing_config['PERIOD_LENGTH'], log_cache=LogCache())
+    counter = itertools.count()
+
+    get_logs = w3.eth.getLogs
+    requested_ranges = []
+
+    def get_logs_and_record_range(filter_params):
+        requested_ranges.append((filter_params['fromBlock'], filter_params['toBlock']))
+        return get_logs(filter_params)
+
+    monkeypatch.setattr(w3.eth, 'getLogs', get_logs_and_record_range)
+
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    mine(w3, 1)
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    mine(w3, 1)
+    logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert [int(log['data'], 16) for log in logs] == [0, 1]
+    cached_block_number = w3.eth.blockNumber
+    assert requested_ranges == [(0, cached_block_number)]
+
+    # Only the uncovered tail is fetched from the node
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    mine(w3, 1)
+    logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert [int(log['data'], 16) for log in logs] == [0, 1, 2]
+    assert requested_ranges[1:] == [(cached_block_number + 1, w3.eth.blockNumber)]
+
+    # A fully covered range is served locally
+    logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert [int(log['data'], 16) for log in logs] == [0, 1, 2]
+    assert len(requested_ranges) == 2
+
+    # Logs of blocks which are no longer canonical are dropped
+    snapshot_id = take_snapshot(w3)
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    mine(w3, 1)
+    logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert [int(log['data'], 16) for log in logs] == [0, 1, 2, 3]
+    revert_to_snapshot(w3, snapshot_id)
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    mine(w3, 2)
+    logs = log_handler.get_logs(address=contract.address, from_block=0)
+    assert [int(log['data'], 16) for log in logs] == [0, 1, 2, 4]
+
+
+@pytest.mark.parametrize('use_filter', (True, False))
+def test_follow(auto_mining_contract, smc_testing_config, tmpdir, use_filter):
+    contract = auto_mining_contract
+    w3 = contract.web3
+    log_handler = LogHandler(w3, smc_testing_config['PERIOD_LENGTH'])
+    counter = itertools.count()
+    cursor_path = str(tmpdir.join('cursor.json'))
+
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    cursor = LogCursor(path=cursor_path)
+    logs = log_handler.follow(
+        address=contract.address,
+        from_block=0,
+        cursor=cursor,
+        poll_interval=0,
+        use_filter=use_filter,
+    )
+    assert int(next(logs)['data'], 16) == 0
+
+    # Logs of new blocks are yielded as they arrive
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    assert [int(log['data'], 16) for log in itertools.islice(logs, 2)] == [1, 2]
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    assert int(next(logs)['data'], 16) == 3
+    # The blocks of the new logs keep the head tracker fresh
+    assert log_handler.head_tracker.cached_block_number == w3.eth.blockNumber
+    logs.close()
+
+    # Following resumes from the persisted cursor: the logs of the batch being
+    # yielded when the generator was closed are yielded again, older ones are not
+    assert LogCursor(path=cursor_path).next_block > 0
+    contract.functions.emit_log(next(counter)).transact(default_tx_detail)
+    logs = log_handler.follow(
+        address=contract.address,
+        cursor=LogCursor(path=cursor_path),
+        poll_interval=0,
+        use_filter=use_filter,
+    )
+    assert [int(log['data'], 16) for log in itertools.islice(logs, 2)] == [3, 4]
+    logs.close()
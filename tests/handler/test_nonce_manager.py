@@ -0,0 +1,155 @@
+import pytest
+
+from evm.exceptions import (
+    ValidationError,
+)
+from requests.exceptions import (
+    Timeout,
+)
+
+from sharding.handler.nonce_manager import (
+    NonceManager,
+)
+from sharding.handler.utils.smc_handler_utils import (
+    is_known_transaction_error,
+    is_nonce_error,
+)
+from sharding.handler.utils.web3_utils import (
+    get_nonce,
+    mine,
+)
+
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_nonce_manager(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    nonce_manager = NonceManager(w3)
+    notary_0 = NotaryAccount(0)
+    chain_nonce = get_nonce(w3, notary_0.canonical_address)
+
+    assert nonce_manager.allocate(notary_0.checksum_address) == chain_nonce
+    assert nonce_manager.allocate(notary_0.canonical_address) == chain_nonce + 1
+    # The latest nonce is given back without a gap
+    nonce_manager.release(notary_0.checksum_address, chain_nonce + 1)
+    assert nonce_manager.allocate(notary_0.checksum_address) == chain_nonce + 1
+    # An earlier nonce is handed out again before the next ones
+    nonce_manager.allocate(notary_0.checksum_address)
+    nonce_manager.release(notary_0.checksum_address, chain_nonce)
+    assert nonce_manager.allocate(notary_0.checksum_address) == chain_nonce
+    assert nonce_manager.allocate(notary_0.checksum_address) == chain_nonce + 3
+
+    # Resyncing never moves the local nonce back to a possibly pending one
+    assert nonce_manager.resync(notary_0.checksum_address) == chain_nonce
+    assert nonce_manager.allocate(notary_0.checksum_address) == chain_nonce + 4
+
+
+def test_send_transactions_with_local_nonces(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    notary_0 = NotaryAccount(0)
+
+    smc_handler.register_notary(private_key=notary_0.private_key)
+    mine(w3, 1)
+    smc_handler.deregister_notary(private_key=notary_0.private_key)
+    mine(w3, 1)
+    assert smc_handler.does_notary_exist(notary_0.checksum_address)
+    deregistered_period, _ = smc_handler.get_notary_info(notary_0.checksum_address)
+    assert deregistered_period == w3.eth.blockNumber // smc_handler.config['PERIOD_LENGTH']
+
+    # A transaction sent without the nonce manager makes the local nonce stale,
+    # the transaction is sent again after resyncing from the chain
+    nonce = get_nonce(w3, notary_0.canonical_address)
+    smc_handler._send_transaction(
+        func_name='update_notary_sample_size',
+        args=[],
+        private_key=notary_0.private_key,
+        nonce=nonce,
+        gas=100000,
+    )
+    mine(w3, 1)
+    smc_handler.release_notary(private_key=notary_0.private_key)
+    mine(w3, 1)
+    assert get_nonce(w3, notary_0.canonical_address) == nonce + 2
+
+
+def test_send_transaction_with_unknown_outcome(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    notary_0 = NotaryAccount(0)
+    nonce_manager = smc_handler.nonce_manager
+    send_raw_transaction = w3.eth.sendRawTransaction
+    nonce = get_nonce(w3, notary_0.canonical_address)
+
+    # The node already has the transaction: it is sent, not sent again
+    sent_transactions = []
+
+    def send_known_transaction(raw_transaction):
+        sent_transactions.append(send_raw_transaction(raw_transaction))
+        raise ValueError({'code': -32000, 'message': 'already known'})
+
+    monkeypatch.setattr(w3.eth, 'sendRawTransaction', send_known_transaction)
+    tx_hash = smc_handler.register_notary(private_key=notary_0.private_key)
+    assert sent_transactions == [tx_hash]
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce + 1
+    nonce_manager.release(notary_0.checksum_address, nonce + 1)
+
+    # The node rejects the transaction: its nonce is given back
+    def reject_transaction(raw_transaction):
+        raise ValueError({'code': -32000, 'message': 'insufficient funds for gas * price + value'})
+
+    monkeypatch.setattr(w3.eth, 'sendRawTransaction', reject_transaction)
+    with pytest.raises(ValueError):
+        smc_handler.deregister_notary(private_key=notary_0.private_key)
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce + 1
+    nonce_manager.release(notary_0.checksum_address, nonce + 1)
+
+    # The sending times out: the node may have the transaction, its nonce is kept
+    def time_out(raw_transaction):
+        raise Timeout()
+
+    monkeypatch.setattr(w3.eth, 'sendRawTransaction', time_out)
+    with pytest.raises(Timeout):
+        smc_handler.deregister_notary(private_key=notary_0.private_key)
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce + 2
+
+
+def test_send_transaction_lost(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    notary_0 = NotaryAccount(0)
+    nonce_manager = NonceManager(w3, gap_timeout=0)
+    monkeypatch.setattr(smc_handler, 'nonce_manager', nonce_manager)
+    send_raw_transaction = w3.eth.sendRawTransaction
+    nonce = get_nonce(w3, notary_0.canonical_address)
+
+    # A nonce handed out and never sent is rolled back once it is overdue
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce
+
+    # The sending times out before the transaction reaches the node
+    def time_out(raw_transaction):
+        raise Timeout()
+
+    monkeypatch.setattr(w3.eth, 'sendRawTransaction', time_out)
+    with pytest.raises(Timeout):
+        smc_handler.register_notary(private_key=notary_0.private_key)
+
+    # The next transaction fills the gap instead of waiting behind it
+    monkeypatch.setattr(w3.eth, 'sendRawTransaction', send_raw_transaction)
+    smc_handler.register_notary(private_key=notary_0.private_key)
+    mine(w3, 1)
+    assert get_nonce(w3, notary_0.canonical_address) == nonce + 1
+    assert smc_handler.does_notary_exist(notary_0.checksum_address)
+    # Nonces counted by the chain are not rolled back
+    assert nonce_manager.allocate(notary_0.checksum_address) == nonce + 1
+
+
+def test_is_nonce_error():
+    assert is_nonce_error(ValueError({'code': -32000, 'message': 'nonce too low'}))
+    assert is_nonce_error(ValueError('replacement transaction underpriced'))
+    assert not is_nonce_error(ValueError('insufficient funds for gas * price + value'))
+    assert not is_nonce_error(ValueError('already known'))
+    assert is_nonce_error(ValidationError('Invalid transaction nonce'))
+    assert is_known_transaction_error(ValueError({'code': -32000, 'message': 'already known'}))
+    assert is_known_transaction_error(ValueError('known transaction: 0x01'))
+    assert not is_known_transaction_error(ValueError('nonce too low'))
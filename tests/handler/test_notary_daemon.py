@@ -0,0 +1,130 @@
+from sharding.handler.notary_daemon import (
+    NotaryDaemon,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_notary_daemon(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    notary_daemon = NotaryDaemon(
+        smc_handler,
+        [NotaryAccount(i).private_key for i in range(9)],
+        shard_ids=[0, 1],
+        max_workers=2,
+    )
+
+    notary_daemon.run_once()
+    period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+    # The committees are sampled from the registry, synced up to the head
+    notary_registry = notary_daemon.notary_registry
+    assert notary_registry.next_block == w3.eth.blockNumber + 1
+    assert notary_registry.notary_pool_len() == smc_handler.notary_pool_len()
+    timings = notary_daemon.get_period_timings(period)
+    assert timings.assigned_at is not None
+    assert timings.started_at is not None
+
+    # Headers of a watched shard and of a shard not watched
+    chunk_root = b'\x10' * 32
+    # eth-tester only accepts one pending transaction per sender
+    for shard_id in (0, 2):
+        smc_handler.add_header(
+            shard_id=shard_id,
+            period=period,
+            chunk_root=chunk_root,
+            private_key=NotaryAccount(shard_id).private_key,
+        )
+    mine(w3, 1)
+    # A notary may have many seats, and eth-tester only accepts one pending
+    # transaction per sender, so the votes are mined as they are sent
+    eth_tester = w3.providers[0].ethereum_tester
+    eth_tester.enable_auto_mine_transactions()
+    notary_daemon.run_once()
+    notary_daemon.wait_for_votes()
+    eth_tester.disable_auto_mine_transactions()
+    mine(w3, 1)
+    notary_daemon.run_once()
+
+    # Every notary is managed, so every seat of the committee votes
+    assert smc_handler.get_vote_count(0) == config['COMMITTEE_SIZE']
+    assert smc_handler.get_collation_is_elected(0, period)
+    assert smc_handler.get_vote_count(2) == 0
+    timings = notary_daemon.get_period_timings(period)
+    assert list(timings.header_seen_at) == [0]
+    assert list(timings.votes_sent_at) == [0]
+    assert set(timings.votes_mined_at) == set(
+        (0, index) for index in range(config['COMMITTEE_SIZE'])
+    )
+    assert timings.failed_votes == []
+    # The mined votes calibrate the vote gas
+    assert smc_handler.gas_calibrator.has_samples('submit_vote')
+    notary_daemon.close()
+
+
+def test_notary_daemon_rejected_vote(smc_handler, smc_testing_config, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    notary_daemon = NotaryDaemon(
+        smc_handler,
+        [NotaryAccount(i).private_key for i in range(9)],
+        shard_ids=[0],
+        signing_workers=2,
+    )
+    notary_daemon.run_once()
+    period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+    smc_handler.add_header(
+        shard_id=0,
+        period=period,
+        chunk_root=b'\x10' * 32,
+        private_key=NotaryAccount(0).private_key,
+    )
+    mine(w3, 1)
+
+    # The node rejects the last vote only, as the votes sent after a rejected
+    # one by the same notary would fail on the nonce gap
+    request_blocking = w3.manager.request_blocking
+    sent_transactions = []
+
+    def reject_last_transaction(method, params):
+        if method == 'eth_sendRawTransaction':
+            sent_transactions.append(params)
+            if len(sent_transactions) == config['COMMITTEE_SIZE']:
+                raise ValueError({
+                    'code': -32000,
+                    'message': 'insufficient funds for gas * price + value',
+                })
+        return request_blocking(method, params)
+
+    monkeypatch.setattr(w3.manager, 'request_blocking', reject_last_transaction)
+    eth_tester = w3.providers[0].ethereum_tester
+    eth_tester.enable_auto_mine_transactions()
+    notary_daemon.run_once()
+    notary_daemon.wait_for_votes()
+    eth_tester.disable_auto_mine_transactions()
+    monkeypatch.setattr(w3.manager, 'request_blocking', request_blocking)
+    mine(w3, 1)
+    notary_daemon.run_once()
+
+    # Only the rejected vote failed, the accepted ones are followed until mined
+    timings = notary_daemon.get_period_timings(period)
+    assert len(timings.failed_votes) == 1
+    assert set(timings.votes_mined_at) | set(timings.failed_votes) == set(
+        (0, index) for index in range(config['COMMITTEE_SIZE'])
+    )
+    assert not set(timings.votes_mined_at) & set(timings.failed_votes)
+    assert smc_handler.get_vote_count(0) == config['COMMITTEE_SIZE'] - 1
+    notary_daemon.close()
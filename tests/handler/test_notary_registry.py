@@ -0,0 +1,153 @@
+from sharding.handler.chain_tracker import (
+    ChainTracker,
+)
+from sharding.handler.event_stream import (
+    SMCEventStream,
+)
+from sharding.handler.notary_registry import (
+    NotaryRegistry,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+    revert_to_snapshot,
+    take_snapshot,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def assert_registry_mirrored(notary_registry, smc_handler, num_notaries):
+    for getter in (
+        'notary_pool_len',
+        'empty_slots_stack_top',
+        'current_period_notary_sample_size',
+        'next_period_notary_sample_size',
+        'notary_sample_size_updated_period',
+    ):
+        assert getattr(notary_registry, getter)() == getattr(smc_handler, getter)()
+    for i in range(num_notaries):
+        assert notary_registry.notary_pool(i) == smc_handler.notary_pool(i)
+        assert notary_registry.empty_slots_stack(i) == smc_handler.empty_slots_stack(i)
+        address = NotaryAccount(i).checksum_address
+        does_notary_exist = smc_handler.does_notary_exist(address)
+        assert notary_registry.does_notary_exist(address) == does_notary_exist
+        notary_info = tuple(smc_handler.get_notary_info(address))
+        assert notary_registry.get_notary_info(address) == notary_info
+
+
+def test_notary_registry(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    notary_registry = NotaryRegistry(
+        w3=w3,
+        config=config,
+        smc_handler_address=smc_handler.address,
+    )
+
+    batch_register(smc_handler, 0, 5)
+    notary_registry.sync()
+    assert_registry_mirrored(notary_registry, smc_handler, 8)
+    assert notary_registry.notary_pool_len() == 6
+
+    fast_forward(smc_handler, 1)
+    # Deregister notary 1 and 3, then register notary 6 in the slot of notary 3
+    smc_handler.deregister_notary(private_key=NotaryAccount(1).private_key)
+    smc_handler.deregister_notary(private_key=NotaryAccount(3).private_key)
+    mine(w3, 1)
+    smc_handler.register_notary(private_key=NotaryAccount(6).private_key)
+    mine(w3, 1)
+    next_block = notary_registry.next_block
+    notary_registry.sync()
+    assert notary_registry.next_block > next_block
+    assert_registry_mirrored(notary_registry, smc_handler, 8)
+    assert notary_registry.get_notary_info(NotaryAccount(6).canonical_address)[1] == 3
+
+    current_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+    assert notary_registry.get_notary_sample_size(current_period) == 6
+
+    # Release notary 1 after the lockup period
+    fast_forward(smc_handler, config['NOTARY_LOCKUP_LENGTH'] + 1)
+    smc_handler.release_notary(private_key=NotaryAccount(1).private_key)
+    mine(w3, 1)
+    notary_registry.sync()
+    assert_registry_mirrored(notary_registry, smc_handler, 8)
+    assert not notary_registry.does_notary_exist(NotaryAccount(1).checksum_address)
+
+
+def test_notary_registry_sample_size(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    notary_registry = NotaryRegistry(
+        w3=w3,
+        config=config,
+        smc_handler_address=smc_handler.address,
+    )
+
+    batch_register(smc_handler, 0, 2)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+    # Registration in this period only takes effect in the next period
+    smc_handler.register_notary(private_key=NotaryAccount(3).private_key)
+    mine(w3, 1)
+    notary_registry.sync()
+    assert_registry_mirrored(notary_registry, smc_handler, 4)
+    assert notary_registry.get_notary_sample_size(current_period) == 3
+    assert notary_registry.get_notary_sample_size(current_period + 1) == 4
+
+    # Adding a header also updates the sample size
+    fast_forward(smc_handler, 1)
+    smc_handler.add_header(
+        shard_id=0,
+        period=current_period + 1,
+        chunk_root=b'\x10' * 32,
+        private_key=NotaryAccount(0).private_key,
+    )
+    mine(w3, 1)
+    notary_registry.sync()
+    assert_registry_mirrored(notary_registry, smc_handler, 4)
+
+
+def test_notary_registry_follow_reorgs(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    notary_registry = NotaryRegistry(
+        w3=w3,
+        config=config,
+        smc_handler_address=smc_handler.address,
+    )
+    event_stream = SMCEventStream(
+        w3=w3,
+        config=config,
+        smc_handler_address=smc_handler.address,
+        from_block=0,
+        chain_tracker=ChainTracker(w3, history_size=16),
+    )
+
+    batch_register(smc_handler, 0, 2)
+    notary_registry.apply_event_batch(event_stream.update())
+    assert_registry_mirrored(notary_registry, smc_handler, 6)
+
+    # Deregister notary 1 and register notary 3 in its slot, then reorg them out
+    snapshot_id = take_snapshot(w3)
+    smc_handler.deregister_notary(private_key=NotaryAccount(1).private_key)
+    batch_register(smc_handler, 3, 3)
+    notary_registry.apply_event_batch(event_stream.update())
+    assert_registry_mirrored(notary_registry, smc_handler, 6)
+    assert notary_registry.notary_pool(1) == NotaryAccount(3).canonical_address
+
+    revert_to_snapshot(w3, snapshot_id)
+    batch_register(smc_handler, 4, 4)
+    mine(w3, 1)
+    event_batch = event_stream.update()
+    assert len(event_batch.removed) == 2
+    notary_registry.apply_event_batch(event_batch)
+    assert_registry_mirrored(notary_registry, smc_handler, 6)
+    assert notary_registry.notary_pool(1) == NotaryAccount(1).canonical_address
+    assert notary_registry.notary_pool(3) == NotaryAccount(4).canonical_address
+    assert not notary_registry.does_notary_exist(NotaryAccount(3).checksum_address)
@@ -0,0 +1,104 @@
+import pytest
+
+from sharding.handler import (
+    smc_handler as smc_handler_module,
+)
+from sharding.handler.committee_sampler import (
+    CommitteeSampler,
+)
+from sharding.handler.period_clock import (
+    PeriodClock,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_period_clock(smc_handler, smc_testing_config, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    period_length = config['PERIOD_LENGTH']
+    committee_sampler = CommitteeSampler(smc_handler)
+    notary_addresses = [NotaryAccount(i).checksum_address for i in range(10)]
+    period_clock = PeriodClock(
+        w3,
+        config,
+        committee_sampler=committee_sampler,
+        notary_addresses=notary_addresses,
+    )
+    fired = []
+    period_clock.add_period_start_hook(lambda period: fired.append(('start', period)))
+    period_clock.add_entropy_block_hook(lambda period: fired.append(('entropy', period)))
+    period_clock.add_assignment_hook(lambda period, _: fired.append(('assignments', period)))
+
+    # Notary 9 is not registered
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // period_length
+    period_clock.tick()
+    assert period_clock.block_number == w3.eth.blockNumber
+    assert fired == [
+        ('assignments', current_period),
+        ('entropy', current_period),
+        ('start', current_period),
+    ]
+
+    # Nothing fired within the period
+    del fired[:]
+    mine(w3, period_length - 2)
+    period_clock.tick()
+    assert fired == []
+    with pytest.raises(KeyError):
+        period_clock.get_assignments(current_period + 1)
+
+    # Assignments of the next period are computed on its entropy block
+    mine(w3, 1)
+    period_clock.tick()
+    assert fired == [
+        ('assignments', current_period + 1),
+        ('entropy', current_period + 1),
+    ]
+    assignments = period_clock.get_assignments(current_period + 1)
+    for i in range(9):
+        assert assignments[NotaryAccount(i).canonical_address] == (
+            committee_sampler.get_assignments(i, current_period + 1)
+        )
+    assert assignments[NotaryAccount(9).canonical_address] == []
+
+    del fired[:]
+    mine(w3, 1)
+    period_clock.tick()
+    assert fired == [('start', current_period + 1)]
+
+    # Skipped periods are not fired
+    del fired[:]
+    mine(w3, 3 * period_length)
+    period_clock.tick()
+    assert fired == [
+        ('assignments', current_period + 4),
+        ('entropy', current_period + 4),
+        ('start', current_period + 4),
+    ]
+
+    # Without a notary registry, the notaries are looked up in two batch requests
+    make_batch_request = smc_handler_module.make_batch_request
+    batch_sizes = []
+
+    def make_counted_batch_request(w3, requests):
+        batch_sizes.append(len(requests))
+        return make_batch_request(w3, requests)
+
+    monkeypatch.setattr(smc_handler_module, 'make_batch_request', make_counted_batch_request)
+    mine(w3, period_length - 1)
+    period_clock.tick()
+    assert ('assignments', current_period + 5) in fired
+    # Existence and info of the 10 notaries, then the pool slots of the 9 registered
+    assert batch_sizes == [20, 9]
@@ -0,0 +1,109 @@
+from sharding.handler import (
+    receipt_watcher as receipt_watcher_module,
+)
+from sharding.handler.receipt_watcher import (
+    ReceiptWatcher,
+    is_successful,
+)
+from sharding.handler.utils.web3_utils import (
+    mine,
+)
+
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
+
+
+def test_receipt_watcher(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    receipt_watcher = ReceiptWatcher(w3, smc_handler.address)
+
+    # Mined before being watched
+    first_tx_hash = smc_handler.register_notary(private_key=NotaryAccount(0).private_key)
+    mine(w3, 1)
+    first_future = receipt_watcher.watch(first_tx_hash)
+
+    mined_transactions = []
+    tx_hashes = [
+        smc_handler.register_notary(private_key=NotaryAccount(i).private_key)
+        for i in range(1, 4)
+    ]
+    futures = [
+        receipt_watcher.watch(tx_hash, callback=mined_transactions.append)
+        for tx_hash in tx_hashes
+    ]
+    assert len(receipt_watcher) == 4
+
+    assert receipt_watcher.poll() == 1
+    assert first_future.done()
+    mined_transaction = first_future.result()
+    assert mined_transaction.receipt['transactionHash'] == first_tx_hash
+    assert is_successful(mined_transaction)
+    assert len(mined_transaction.events) == 1
+    assert mined_transaction.events[0].event_name == 'RegisterNotary'
+    assert mined_transaction.events[0].index_in_notary_pool == 0
+    assert mined_transaction.events[0].notary == NotaryAccount(0).canonical_address
+
+    # Nothing mined since the last poll
+    assert receipt_watcher.poll() == 0
+    assert not any(future.done() for future in futures)
+
+    mine(w3, 2)
+    assert receipt_watcher.poll() == 3
+    assert len(receipt_watcher) == 0
+    assert all(future.done() for future in futures)
+    assert [
+        mined_transaction.events[0].notary
+        for mined_transaction in mined_transactions
+    ] == [
+        NotaryAccount(i).canonical_address
+        for i in range(1, 4)
+    ]
+
+    # Watching the same transaction twice
+    tx_hash = smc_handler.deregister_notary(private_key=NotaryAccount(0).private_key)
+    futures = [receipt_watcher.watch(tx_hash), receipt_watcher.watch(tx_hash)]
+    assert len(receipt_watcher) == 1
+    mine(w3, 1)
+    assert receipt_watcher.poll() == 1
+    assert futures[0].result() == futures[1].result()
+    assert futures[0].result().events[0].event_name == 'DeregisterNotary'
+
+    # A failed transaction emits no log
+    tx_hash = smc_handler.release_notary(private_key=NotaryAccount(1).private_key)
+    future = receipt_watcher.watch(tx_hash)
+    mine(w3, 1)
+    assert receipt_watcher.poll() == 1
+    assert not is_successful(future.result())
+
+
+def test_receipt_watcher_with_missing_receipt(smc_handler, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    receipt_watcher = ReceiptWatcher(w3, smc_handler.address)
+    assert receipt_watcher.poll() == 0
+
+    tx_hash = smc_handler.register_notary(private_key=NotaryAccount(0).private_key)
+    future = receipt_watcher.watch(tx_hash)
+    assert receipt_watcher.poll() == 0
+    mine(w3, 1)
+
+    # The block is served, but not the receipt of its transaction yet
+    get_transaction_receipts = receipt_watcher_module.get_transaction_receipts
+    monkeypatch.setattr(
+        receipt_watcher_module,
+        'get_transaction_receipts',
+        lambda w3, tx_hashes: [None] * len(tx_hashes),
+    )
+    assert receipt_watcher.poll() == 0
+    assert receipt_watcher.next_block == w3.eth.blockNumber + 1
+    assert not future.done()
+
+    # Fetched again in the next poll, though its block is already checked
+    monkeypatch.setattr(
+        receipt_watcher_module,
+        'get_transaction_receipts',
+        get_transaction_receipts,
+    )
+    assert receipt_watcher.poll() == 1
+    assert future.result().receipt['transactionHash'] == tx_hash
+    assert len(receipt_watcher) == 0
@@ -2,17 +2,29 @@ import logging
 
 import pytest
 
+from cytoolz.dicttoolz import (
+    assoc,
+)
+
 from sharding.handler.exceptions import (
     LogParsingError,
 )
 from sharding.handler.utils.log_parser import (
     LogParser,
+    decode_log_columns,
+    get_event_log_decoder,
 )
 from sharding.handler.shard_tracker import (  # noqa: F401
+    MultiShardTracker,
     ShardTracker,
 )
+from sharding.handler.utils.log_handler_utils import (
+    match_topics,
+    split_topic_filter,
+)
 from sharding.handler.utils.web3_utils import (
     mine,
+    set_topic_or_lists_support,
 )
 
 from tests.contract.utils.common_utils import (
@@ -148,6 +160,67 @@ def test_log_parser_with_wrong_log_content(raw_log, event_name):
         LogParser(event_name=event_name, log=raw_log)
 
 
+def test_event_log_decoder():
+    raw_log = {'type': 'mined', 'logIndex': 0, 'transactionIndex': 0, 'transactionHash': b'\x16\xc2\x0b\xadZ|\x92l@@\xb1\x15\x93nh\xd6]p\x16\xae\xd5\xe7\x9crKl\x8c\xcf\x06\x9a\xd4\x05', 'blockHash': b'\x94\\\xce\x19\x01:j\xbb\xf8\xba\x19\xcfv\xc3z3}^\xb6>\xa0\x0e\xf74\xe8A\t\x12p\x9a\xf6V', 'blockNumber': 30, 'address': '0xf4F1600B0a65995833854738764b50A4DA8d6BE1', 'data': '0x000000000000000000000000000000000000000000000000000000000000002121632163216321632163216321632163216321632163216321632163216321630000000000000000000000007e5f4552091a69125d5dfcb7b8c2659029395bdf', 'topics': [b'$\xa5\x146ipE\xb9:y\xa2\xbd\xa9\x00\xb0PU\xf1\xe1\xe9\x1b\x02\x1bL/\xb6\xf6|\xbb\x0b.\x95', b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x63']}  # noqa: E501
+    decoder = get_event_log_decoder('SubmitVote')
+    assert decoder is get_event_log_decoder('SubmitVote')
+
+    record = decoder(raw_log)
+    assert record.event_name == 'SubmitVote'
+    assert record == (
+        33,
+        99,
+        b'!c!c!c!c!c!c!c!c!c!c!c!c!c!c!c!c',
+        b'~_ER\t\x1ai\x12]]\xfc\xb7\xb8\xc2e\x90)9[\xdf',
+    )
+    assert record.shard_id == 99
+    # Records are immutable and carry no per-instance dict
+    with pytest.raises(AttributeError):
+        record.shard_id = 0
+    assert not hasattr(record, '__dict__')
+
+    with pytest.raises(LogParsingError):
+        get_event_log_decoder('WrongEventName')
+
+
+def test_decode_log_columns():
+    decoder = get_event_log_decoder('SubmitVote')
+    logs = [
+        {
+            'topics': [b'\x00' * 32, shard_id.to_bytes(32, 'big')],
+            'data': '0x' + b''.join((
+                period.to_bytes(32, 'big'),
+                chunk_root,
+                b'\x00' * 12 + notary,
+            )).hex(),
+        }
+        for (period, shard_id, chunk_root, notary) in (
+            (1, 0, b'\x10' * 32, b'\x01' * 20),
+            (1, 9, b'\x19' * 32, b'\x02' * 20),
+            (2 ** 70, 3, b'\x23' * 32, b'\x03' * 20),
+        )
+    ]
+    records = [decoder(log) for log in logs]
+
+    # Integer columns are packed into arrays
+    columns = decode_log_columns('SubmitVote', logs[:2])
+    assert set(columns.keys()) == set(decoder.record_type._fields)
+    for name in decoder.record_type._fields:
+        assert list(columns[name]) == [getattr(record, name) for record in records[:2]]
+    assert columns['shard_id'].tolist() == [0, 9]
+    assert columns['notary'] == [b'\x01' * 20, b'\x02' * 20]
+
+    # Values larger than 64 bits can only be decoded into lists
+    with pytest.raises(LogParsingError):
+        decode_log_columns('SubmitVote', logs)
+    columns = decode_log_columns('SubmitVote', logs, packed=False)
+    for name in decoder.record_type._fields:
+        assert columns[name] == [getattr(record, name) for record in records]
+
+    with pytest.raises(LogParsingError):
+        decode_log_columns('SubmitVote', [logs[0], assoc(logs[1], 'data', '0x')])
+
+
 def test_status_checking_functions(smc_handler, smc_testing_config):  # noqa: F811
     w3 = smc_handler.web3
     config = smc_testing_config
@@ -256,3 +329,191 @@ def test_status_checking_functions(smc_handler, smc_testing_config):  # noqa: F8
     mine(w3, 1)
     # Check that log was successfully emitted
     assert shard_tracker.is_notary_released(NotaryAccount(0).checksum_address)
+
+
+def test_get_all_events(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    shard_tracker = ShardTracker(
+        w3=w3,
+        config=config,
+        shard_id=0,
+        smc_handler_address=smc_handler.address,
+    )
+
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+
+    CHUNK_ROOT_1_0 = b'\x10' * 32
+    smc_handler.add_header(
+        shard_id=0,
+        period=current_period,
+        chunk_root=CHUNK_ROOT_1_0,
+        private_key=NotaryAccount(0).private_key,
+    )
+    smc_handler.add_header(
+        shard_id=3,
+        period=current_period,
+        chunk_root=b'\x13' * 32,
+        private_key=NotaryAccount(3).private_key,
+    )
+    mine(w3, 1)
+    pool_index = sampling(smc_handler, 0)[0]
+    smc_handler.submit_vote(
+        shard_id=0,
+        period=current_period,
+        chunk_root=CHUNK_ROOT_1_0,
+        index=0,
+        private_key=NotaryAccount(pool_index).private_key,
+    )
+    mine(w3, 1)
+
+    events = shard_tracker.get_all_events(from_period=0, to_period=current_period)
+    # Header and vote in shard 3 are not included
+    assert [event.event_name for event in events] == ['RegisterNotary'] * 9 + [
+        'AddHeader',
+        'SubmitVote',
+    ]
+    assert [event.index_in_notary_pool for event in events[:9]] == list(range(9))
+    assert events[9] == (current_period, 0, CHUNK_ROOT_1_0)
+    assert events[10].notary == NotaryAccount(pool_index).canonical_address
+
+    # Only events within the given periods are returned
+    assert shard_tracker.get_all_events(from_period=current_period) == events[9:]
+
+
+def test_multi_shard_tracker(smc_handler, smc_testing_config):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    multi_shard_tracker = MultiShardTracker(
+        w3=w3,
+        config=config,
+        shard_ids=[3, 0, 3],
+        smc_handler_address=smc_handler.address,
+    )
+    assert multi_shard_tracker.shard_ids == (0, 3)
+
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+
+    for shard_id in (0, 3, 5):
+        smc_handler.add_header(
+            shard_id=shard_id,
+            period=current_period,
+            chunk_root=bytes([shard_id]) * 32,
+            private_key=NotaryAccount(shard_id).private_key,
+        )
+    mine(w3, 1)
+    pool_index = sampling(smc_handler, 3)[0]
+    smc_handler.submit_vote(
+        shard_id=3,
+        period=current_period,
+        chunk_root=b'\x03' * 32,
+        index=0,
+        private_key=NotaryAccount(pool_index).private_key,
+    )
+    mine(w3, 1)
+
+    # Header in shard 5 is not tracked
+    headers = multi_shard_tracker.get_add_header_logs(from_period=current_period)
+    assert set(headers.keys()) == {0, 3}
+    assert headers[0] == [(current_period, 0, b'\x00' * 32)]
+    assert headers[3] == [(current_period, 3, b'\x03' * 32)]
+
+    votes = multi_shard_tracker.get_submit_vote_logs(from_period=current_period)
+    assert votes[0] == []
+    assert len(votes[3]) == 1
+    assert votes[3][0].notary == NotaryAccount(pool_index).canonical_address
+
+    assert multi_shard_tracker.is_new_header_added(current_period) == {0: True, 3: True}
+    assert multi_shard_tracker.is_new_header_added(current_period - 1) == {0: False, 3: False}
+    assert multi_shard_tracker.has_enough_vote(current_period) == {0: False, 3: False}
+
+
+def test_get_period_summaries(smc_handler, smc_testing_config, monkeypatch):  # noqa: F811
+    w3 = smc_handler.web3
+    config = smc_testing_config
+    shard_tracker = ShardTracker(
+        w3=w3,
+        config=config,
+        shard_id=0,
+        smc_handler_address=smc_handler.address,
+    )
+    multi_shard_tracker = MultiShardTracker(
+        w3=w3,
+        config=config,
+        shard_ids=[0, 1],
+        smc_handler_address=smc_handler.address,
+    )
+
+    batch_register(smc_handler, 0, 8)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // config['PERIOD_LENGTH']
+
+    CHUNK_ROOT = b'\x10' * 32
+    smc_handler.add_header(
+        shard_id=0,
+        period=current_period,
+        chunk_root=CHUNK_ROOT,
+        private_key=NotaryAccount(0).private_key,
+    )
+    mine(w3, 1)
+    sampled_index = sampling(smc_handler, 0)
+    for (index, pool_index) in enumerate(sampled_index[:config['QUORUM_SIZE']]):
+        smc_handler.submit_vote(
+            shard_id=0,
+            period=current_period,
+            chunk_root=CHUNK_ROOT,
+            index=index,
+            private_key=NotaryAccount(pool_index).private_key,
+        )
+        mine(w3, 1)
+
+    summaries = shard_tracker.get_period_summaries(from_period=current_period - 1)
+    assert set(summaries.keys()) == {current_period - 1, current_period}
+    assert not summaries[current_period - 1].is_new_header_added
+    assert summaries[current_period - 1].vote_count == 0
+
+    summary = summaries[current_period]
+    assert summary.is_new_header_added
+    assert summary.chunk_root == CHUNK_ROOT
+    assert summary.vote_count == config['QUORUM_SIZE']
+    assert summary.voters == {
+        NotaryAccount(pool_index).canonical_address
+        for pool_index in sampled_index[:config['QUORUM_SIZE']]
+    }
+    assert summary.has_enough_vote
+    assert summary.is_new_header_added == shard_tracker.is_new_header_added(current_period)
+    assert summary.has_enough_vote == shard_tracker.has_enough_vote(current_period)
+
+    multi_summaries = multi_shard_tracker.get_period_summaries(
+        from_period=current_period - 1,
+        to_period=current_period,
+    )
+    assert multi_summaries[0] == summaries
+    assert not multi_summaries[1][current_period].is_new_header_added
+
+    # A node supporting OR-lists of topics is sent one query per summary
+    node_get_logs = w3.eth.getLogs
+    requested_filters = []
+
+    def get_logs_with_or_lists(filter_params):
+        requested_filters.append(filter_params)
+        topics = filter_params['topics']
+        logs = []
+        for split_topics in split_topic_filter(topics):
+            logs.extend(node_get_logs(dict(filter_params, topics=split_topics)))
+        return [log for log in logs if match_topics(log, topics)]
+
+    set_topic_or_lists_support(w3, True)
+    monkeypatch.setattr(w3.eth, 'getLogs', get_logs_with_or_lists)
+    assert shard_tracker.get_period_summaries(from_period=current_period - 1) == summaries
+    assert len(requested_filters) == 1
+    requested_filters.clear()
+    assert multi_shard_tracker.get_period_summaries(
+        from_period=current_period - 1,
+        to_period=current_period,
+    ) == multi_summaries
+    assert len(requested_filters) == 1
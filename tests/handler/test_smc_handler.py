@@ -1,11 +1,42 @@
+import json
 import logging
 
 import pytest
 
+from web3 import (
+    HTTPProvider,
+    Web3,
+)
+
+from web3.exceptions import (
+    BadFunctionCallOutput,
+)
+
+from eth_utils import (
+    decode_hex,
+    to_canonical_address,
+)
+
 from sharding.handler.utils.smc_handler_utils import (
     make_call_context,
+    make_calldata_encoder,
+    make_result_decoder,
     make_transaction_context,
 )
+from sharding.handler.utils import web3_utils
+from sharding.handler.utils.web3_utils import (
+    get_nonce,
+    make_batch_request,
+    mine,
+)
+
+from tests.contract.utils.common_utils import (
+    batch_register,
+    fast_forward,
+)
+from tests.contract.utils.notary_account import (
+    NotaryAccount,
+)
 
 
 ZERO_ADDR = b'\x00' * 20
@@ -45,3 +76,264 @@ def test_make_call_context():
             sender_address=None,
             gas=1000,
         )
+
+
+def test_smc_batch(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    batch_register(smc_handler, 0, 2)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // smc_handler.config['PERIOD_LENGTH']
+    smc_handler.add_header(
+        shard_id=1,
+        period=current_period,
+        chunk_root=b'\x10' * 32,
+        private_key=NotaryAccount(0).private_key,
+    )
+    mine(w3, 1)
+
+    with smc_handler.batch() as batch:
+        batch.notary_pool_len()
+        batch.notary_pool(1)
+        batch.does_notary_exist(NotaryAccount(2).checksum_address)
+        batch.get_notary_info(NotaryAccount(2).checksum_address)
+        batch.get_member_of_committee(1, 0)
+        for shard_id in range(smc_handler.config['SHARD_COUNT']):
+            batch.records_updated_period(shard_id)
+        batch.get_collation_chunk_root(1, current_period)
+        batch.get_collation_is_elected(1, current_period)
+        assert len(batch) == 7 + smc_handler.config['SHARD_COUNT']
+
+    assert batch.results == [
+        smc_handler.notary_pool_len(),
+        smc_handler.notary_pool(1),
+        smc_handler.does_notary_exist(NotaryAccount(2).checksum_address),
+        smc_handler.get_notary_info(NotaryAccount(2).checksum_address),
+        smc_handler.get_member_of_committee(1, 0),
+    ] + [
+        smc_handler.records_updated_period(shard_id)
+        for shard_id in range(smc_handler.config['SHARD_COUNT'])
+    ] + [
+        smc_handler.get_collation_chunk_root(1, current_period),
+        smc_handler.get_collation_is_elected(1, current_period),
+    ]
+    assert batch.results[5 + 1] == current_period
+
+    with pytest.raises(AttributeError):
+        smc_handler.batch().register_notary()
+
+
+def test_make_batch_request(monkeypatch):
+    w3 = Web3(HTTPProvider('http://127.0.0.1:8545'))
+    posted = []
+
+    def make_post_request(endpoint_uri, data, **kwargs):
+        payload = json.loads(data.decode('utf-8'))
+        posted.append(payload)
+        # Answer in reverse order, as nodes may reorder batch responses
+        return json.dumps([
+            {'jsonrpc': '2.0', 'id': item['id'], 'result': item['params'][0]}
+            for item in reversed(payload)
+        ]).encode('utf-8')
+
+    monkeypatch.setattr(web3_utils, 'make_post_request', make_post_request)
+    results = make_batch_request(w3, [('eth_getBalance', [str(i), 'latest']) for i in range(3)])
+    assert results == ['0', '1', '2']
+    # All requests are sent in one round trip
+    assert len(posted) == 1
+    assert [item['method'] for item in posted[0]] == ['eth_getBalance'] * 3
+
+    def make_post_request_with_error(endpoint_uri, data, **kwargs):
+        return json.dumps([
+            {'jsonrpc': '2.0', 'id': 0, 'result': '0x0'},
+            {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'failed'}},
+        ]).encode('utf-8')
+
+    monkeypatch.setattr(web3_utils, 'make_post_request', make_post_request_with_error)
+    with pytest.raises(ValueError):
+        make_batch_request(w3, [('eth_blockNumber', []), ('eth_blockNumber', [])])
+    # The failed requests only
+    results = make_batch_request(
+        w3,
+        [('eth_blockNumber', []), ('eth_blockNumber', [])],
+        return_errors=True,
+    )
+    assert results[0] == '0x0'
+    assert isinstance(results[1], ValueError)
+    assert results[1].args[0]['message'] == 'failed'
+
+
+@pytest.mark.parametrize('max_workers', (1, 2))
+def test_send_transactions_in_bulk(smc_handler, monkeypatch, max_workers):  # noqa: F811
+    w3 = smc_handler.web3
+    fast_forward(smc_handler, 1)
+    notaries = [NotaryAccount(i) for i in range(5)]
+    nonces = [get_nonce(w3, notary.canonical_address) for notary in notaries]
+    # eth-tester only accepts one pending transaction per sender
+    tx_hashes = smc_handler.send_transactions_in_bulk(
+        [(notary.private_key, 'register_notary', []) for notary in notaries],
+        max_workers=max_workers,
+    )
+    assert len(tx_hashes) == len(notaries)
+    assert len(set(tx_hashes)) == len(tx_hashes)
+    mine(w3, 1)
+
+    for (i, notary) in enumerate(notaries):
+        assert w3.eth.getTransaction(tx_hashes[i])['nonce'] == nonces[i]
+        assert w3.eth.getTransactionReceipt(tx_hashes[i]) is not None
+        assert smc_handler.does_notary_exist(notary.checksum_address)
+    assert smc_handler.notary_pool_len() == len(notaries)
+
+    # The next transaction of a key gets the next nonce
+    tx_hashes = smc_handler.send_transactions_in_bulk(
+        [(notaries[0].private_key, 'deregister_notary', [])],
+        max_workers=max_workers,
+    )
+    mine(w3, 1)
+    assert w3.eth.getTransaction(tx_hashes[0])['nonce'] == nonces[0] + 1
+    assert smc_handler.notary_pool_len() == len(notaries) - 1
+    deregistered_period, _ = smc_handler.get_notary_info(notaries[0].checksum_address)
+    assert deregistered_period == w3.eth.blockNumber // smc_handler.config['PERIOD_LENGTH']
+
+    # Nonces allocated before a failure are given back
+    with pytest.raises(KeyError):
+        smc_handler.send_transactions_in_bulk(
+            [
+                (notaries[1].private_key, 'deregister_notary', []),
+                (notaries[2].private_key, 'no_such_function', []),
+            ],
+            max_workers=max_workers,
+        )
+    for i in (1, 2):
+        nonce = smc_handler.nonce_manager.allocate(notaries[i].checksum_address)
+        assert nonce == nonces[i] + 1
+        smc_handler.nonce_manager.release(notaries[i].checksum_address, nonce)
+    signing_pools = dict(smc_handler._signing_pools)
+
+    # The transactions the node rejects are reported, the others are sent
+    request_blocking = w3.manager.request_blocking
+    sent_transactions = []
+
+    def reject_second_transaction(method, params):
+        if method == 'eth_sendRawTransaction':
+            sent_transactions.append(params)
+            if len(sent_transactions) == 2:
+                raise ValueError({
+                    'code': -32000,
+                    'message': 'insufficient funds for gas * price + value',
+                })
+        return request_blocking(method, params)
+
+    monkeypatch.setattr(w3.manager, 'request_blocking', reject_second_transaction)
+    results = smc_handler.send_transactions_in_bulk(
+        [
+            (notaries[1].private_key, 'deregister_notary', []),
+            (notaries[2].private_key, 'deregister_notary', []),
+        ],
+        max_workers=max_workers,
+    )
+    monkeypatch.setattr(w3.manager, 'request_blocking', request_blocking)
+    mine(w3, 1)
+    assert w3.eth.getTransactionReceipt(results[0]) is not None
+    assert isinstance(results[1], ValueError)
+    # The nonce of the rejected transaction is given back
+    assert smc_handler.nonce_manager.allocate(notaries[2].checksum_address) == nonces[2] + 1
+    # The signing processes are kept for the next transactions
+    assert all(
+        smc_handler._signing_pools[num_workers] is signing_pool
+        for (num_workers, signing_pool) in signing_pools.items()
+    )
+    assert len(smc_handler._signing_pools) == (0 if max_workers == 1 else 1)
+
+
+def test_make_calldata_encoder():
+    encode_calldata = make_calldata_encoder(b'\x01\x02\x03\x04', ['int128', 'bytes32', 'bool'])
+    assert encode_calldata([-1, b'\x10', True]) == (
+        b'\x01\x02\x03\x04' + b'\xff' * 32 + b'\x10' + b'\x00' * 31 + b'\x00' * 31 + b'\x01'
+    )
+    with pytest.raises(ValueError):
+        encode_calldata([2 ** 127, b'\x10', True])
+    with pytest.raises(ValueError):
+        encode_calldata([0, b'\x10' * 33, True])
+    with pytest.raises(ValueError):
+        encode_calldata([0, b'\x10'])
+    with pytest.raises(ValueError):
+        make_calldata_encoder(b'\x01\x02\x03\x04', ['bytes'])
+
+
+@pytest.mark.parametrize(
+    'func_name, args',
+    (
+        ('register_notary', []),
+        ('add_header', [1, 2, b'\x10' * 32]),
+        ('submit_vote', [1, 2, b'\x10' * 32, 3]),
+    )
+)
+def test_build_transaction_fast_path(smc_handler, func_name, args):  # noqa: F811
+    assert func_name in smc_handler._calldata_encoders
+    transaction_context = make_transaction_context(
+        nonce=1,
+        gas=100000,
+        value=0,
+        gas_price=1,
+    )
+    expected_transaction = getattr(smc_handler.functions, func_name)(*args).buildTransaction(
+        transaction=transaction_context,
+    )
+    transaction = smc_handler._build_transaction(
+        func_name=func_name,
+        args=args,
+        nonce=1,
+        gas=100000,
+        value=0,
+        gas_price=1,
+    )
+    assert decode_hex(transaction.pop('data')) == decode_hex(expected_transaction.pop('data'))
+    assert transaction == expected_transaction
+
+
+def test_make_result_decoder():
+    decode_result = make_result_decoder(['int128', 'bool', 'address', 'bytes32'])
+    assert decode_result(
+        b'\xff' * 32 + b'\x00' * 31 + b'\x01' + b'\x00' * 12 + b'\x10' * 20 + b'\x20' * 32
+    ) == [-1, True, b'\x10' * 20, b'\x20' * 32]
+    assert make_result_decoder(['int128'])(b'\x00' * 31 + b'\x02') == 2
+    with pytest.raises(BadFunctionCallOutput):
+        decode_result(b'')
+    with pytest.raises(ValueError):
+        make_result_decoder(['bytes'])
+
+
+def test_getters_fast_path(smc_handler):  # noqa: F811
+    w3 = smc_handler.web3
+    batch_register(smc_handler, 0, 2)
+    fast_forward(smc_handler, 1)
+    current_period = w3.eth.blockNumber // smc_handler.config['PERIOD_LENGTH']
+    smc_handler.add_header(
+        shard_id=1,
+        period=current_period,
+        chunk_root=b'\x10' * 32,
+        private_key=NotaryAccount(0).private_key,
+    )
+    mine(w3, 1)
+
+    call_context = smc_handler.basic_call_context
+    notary_address = NotaryAccount(2).checksum_address
+    functions = smc_handler.functions
+    assert smc_handler.does_notary_exist(notary_address) is True
+    assert smc_handler.get_notary_info(notary_address) == (
+        functions.get_notary_info(notary_address).call(call_context)
+    )
+    assert smc_handler.notary_pool_len() == 3
+    assert smc_handler.notary_pool(1) == to_canonical_address(
+        functions.notary_pool(1).call(call_context)
+    )
+    assert smc_handler.get_member_of_committee(1, 0) == to_canonical_address(
+        functions.get_member_of_committee(1, 0).call(call_context)
+    )
+    assert smc_handler.get_collation_proposer(1, current_period) == (
+        NotaryAccount(0).canonical_address
+    )
+    assert smc_handler.get_collation_chunk_root(1, current_period) == b'\x10' * 32
+    assert smc_handler.records_updated_period(1) == current_period
+    assert smc_handler.get_collation_is_elected(1, current_period) is False
+    assert smc_handler.has_notary_voted(1, 0) is False